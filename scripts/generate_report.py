@@ -2,39 +2,102 @@
 Script per la generazione automatica del report Quarto.
 """
 import subprocess
+import shutil
 import sys
 import os
 import re
 import time
+import selectors
+import queue
+import hashlib
+import json
+import stat
+import argparse
+import threading
+from collections import deque
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Tuple, Iterator, IO, Deque, Iterable, Dict
+
+# Variabile d'ambiente che segnala che il file .env è già stato caricato
+# (es. da un processo padre): in quel caso evitiamo la ricerca su filesystem.
+DOTENV_LOADED_FLAG = "REPORT_AI_DOTENV_LOADED"
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
 # Carica variabili d'ambiente da file env (es. .env) prima di lanciare Quarto,
 # così il processo `quarto render` eredita le API keys.
-try:
-    from dotenv import load_dotenv, find_dotenv
-
-    _PROJECT_ROOT = Path(__file__).resolve().parents[1]
-    for _name in [".env", "-env"]:
-        _p = _PROJECT_ROOT / _name
-        if _p.exists():
-            load_dotenv(dotenv_path=_p, override=False)
-
-    _found = find_dotenv(usecwd=True)
-    if _found:
-        load_dotenv(dotenv_path=_found, override=False)
-except Exception:
-    # Se python-dotenv non è disponibile o qualcosa va storto, continuiamo comunque:
-    # il report può essere renderizzato anche senza AI.
-    pass
+if os.getenv(DOTENV_LOADED_FLAG) != "1":
+    try:
+        from dotenv import load_dotenv, find_dotenv
+
+        for _name in [".env", "-env"]:
+            _p = _PROJECT_ROOT / _name
+            if _p.exists():
+                load_dotenv(dotenv_path=_p, override=False)
+
+        _found = find_dotenv(usecwd=True)
+        if _found:
+            load_dotenv(dotenv_path=_found, override=False)
+        os.environ[DOTENV_LOADED_FLAG] = "1"
+    except Exception:
+        # Se python-dotenv non è disponibile o qualcosa va storto, continuiamo comunque:
+        # il report può essere renderizzato anche senza AI.
+        pass
+
+# Ambiente dei processi Quarto, costruito una sola volta dopo il caricamento del .env
+_CHILD_ENV = os.environ.copy()
+
+# Percorso assoluto dell'eseguibile Quarto, risolto una sola volta (None se non nel PATH)
+_QUARTO = shutil.which('quarto', path=_CHILD_ENV.get('PATH'))
 
 # Costanti
 SUPPORTED_FORMATS = ['html', 'pdf', 'revealjs', 'all']
 DEFAULT_FORMAT = 'html'
 DEFAULT_INPUT = 'reports/report_lucy.qmd'
+# Secondi per cui Quarto mantiene attivo il kernel Jupyter dopo il render che esegue il codice
+EXECUTE_DAEMON_SECONDS = 300
+# Dimensione dei blocchi letti dalla pipe di Quarto
+READ_CHUNK_SIZE = 65536
+# Numero massimo di righe di output di Quarto conservate per i messaggi di errore
+OUTPUT_TAIL_LINES = 500
+# Intervallo minimo (secondi) tra due aggiornamenti della barra di progresso (~20 Hz)
+PROGRESS_MIN_INTERVAL = 0.05
 
-# Pattern per estrarre informazioni sulle celle da Quarto
-CELL_PATTERN = re.compile(r'Cell\s+(\d+)/(\d+):\s*(.+?)(?:\s+\.\.\.\s+Done)?$', re.IGNORECASE)
+# Cartella (nella directory di output) con gli hash degli input dei render riusciti
+CACHE_DIR_NAME = '.report_ai_cache'
+# Estensione del file prodotto da ciascun formato
+FORMAT_EXTENSIONS = {'html': '.html', 'pdf': '.pdf', 'revealjs': '.html'}
+# File e cartelle del progetto (oltre al .qmd) che influenzano il contenuto del report
+CACHE_DEPENDENCIES = ('_quarto.yml', 'styles.css', 'src', 'data', 'context')
+
+# Riga di separazione dei banner
+_BANNER = "=" * 60
+
+# Pattern per estrarre informazioni sulle celle da Quarto, applicato con finditer a
+# interi blocchi di righe in bytes (MULTILINE: `$` è la fine di ogni riga; gli spazi
+# non attraversano le righe). Case-sensitive: Quarto emette sempre "Cell N/M:"
+CELL_PATTERN = re.compile(rb'Cell[ \t]+(\d+)/(\d+):[ \t]*(.+?)(?:[ \t]+\.\.\.[ \t]+Done)?$', re.MULTILINE)
+# Parole chiave delle righe da mostrare anche durante la barra di progresso
+KEYWORD_PATTERN = re.compile(rb'error|warning|done|complete', re.IGNORECASE)
+
+# Istante dell'ultimo aggiornamento della barra di progresso
+_last_paint = 0.0
+
+
+@lru_cache(maxsize=256)
+def _bar_core(filled: int, width: int) -> str:
+    """
+    Costruisce il corpo della barra di progresso (memoizzato).
+    
+    Args:
+        filled: Numero di caratteri pieni
+        width: Larghezza della barra in caratteri
+        
+    Returns:
+        Stringa con '#' per la parte completata e '-' per il resto
+    """
+    return '#' * filled + '-' * (width - filled)
 
 
 def format_progress_bar(current: int, total: int, label: str = "", width: int = 50) -> str:
@@ -56,22 +119,38 @@ def format_progress_bar(current: int, total: int, label: str = "", width: int =
         percent = min(100, int((current / total) * 100))
     
     filled = int((current / total) * width) if total > 0 else 0
-    bar = '#' * filled + '-' * (width - filled)
+    bar = _bar_core(filled, width)
     
     label_str = f" | {label}" if label else ""
     return f"[{bar}] {percent:3d}% ({current}/{total}){label_str}"
 
 
-def update_progress(current: int, total: int, label: str = "", start_time: Optional[float] = None):
+def update_progress(
+    current: int,
+    total: int,
+    label: str = "",
+    start_time: Optional[float] = None,
+    force: bool = False
+):
     """
     Aggiorna e mostra la barra di progresso.
     
+    Gli aggiornamenti sono limitati a uno ogni PROGRESS_MIN_INTERVAL secondi;
+    il frame finale (current >= total) viene sempre mostrato.
+    
     Args:
         current: Valore corrente
         total: Valore totale
         label: Etichetta opzionale
         start_time: Timestamp di inizio per calcolare tempo trascorso
+        force: Se True, ridisegna la barra ignorando il limite di frequenza
     """
+    global _last_paint
+    now = time.monotonic()
+    if not force and current < total and now - _last_paint < PROGRESS_MIN_INTERVAL:
+        return
+    _last_paint = now
+    
     bar = format_progress_bar(current, total, label)
     
     if start_time:
@@ -93,20 +172,448 @@ def update_progress(current: int, total: int, label: str = "", start_time: Optio
         print()
 
 
+def _decode_line(raw_line: bytes) -> str:
+    """
+    Decodifica una riga di output di Quarto.
+    
+    Args:
+        raw_line: Riga in bytes (senza terminatore)
+        
+    Returns:
+        Riga decodificata in UTF-8 (caratteri non validi sostituiti)
+    """
+    return raw_line.decode('utf-8', errors='replace')
+
+
+def _drain_to_queue(index: int, stream: IO[bytes], chunks: "queue.Queue[Tuple[int, bytes]]") -> None:
+    """
+    Legge una pipe fino alla chiusura inoltrando i blocchi letti a una coda.
+    
+    Usata su Windows, dove i selector non supportano le pipe.
+    
+    Args:
+        index: Indice dello stream (restituito insieme ai dati)
+        stream: Pipe binaria del processo
+        chunks: Coda condivisa; un blocco vuoto segnala la fine dello stream
+    """
+    fd = stream.fileno()
+    while True:
+        chunk = os.read(fd, READ_CHUNK_SIZE)
+        chunks.put((index, chunk))
+        if not chunk:
+            break
+
+
+def _iter_output_chunks(streams: List[IO[bytes]]) -> Iterator[Tuple[int, bytes]]:
+    """
+    Legge in parallelo più pipe di un processo, a blocchi di READ_CHUNK_SIZE bytes.
+    
+    Args:
+        streams: Pipe binarie del processo (es. `[process.stdout, process.stderr]`)
+        
+    Yields:
+        Tuple (indice dello stream, blocco letto); un blocco vuoto segnala la fine dello stream
+    """
+    if os.name == 'nt':
+        # Su Windows i selector supportano solo socket: un thread per pipe
+        chunks: "queue.Queue[Tuple[int, bytes]]" = queue.Queue()
+        for index, stream in enumerate(streams):
+            threading.Thread(target=_drain_to_queue, args=(index, stream, chunks), daemon=True).start()
+        open_streams = len(streams)
+        while open_streams:
+            index, chunk = chunks.get()
+            if not chunk:
+                open_streams -= 1
+            yield index, chunk
+        return
+    
+    selector = selectors.DefaultSelector()
+    for index, stream in enumerate(streams):
+        selector.register(stream.fileno(), selectors.EVENT_READ, index)
+    
+    try:
+        open_streams = len(streams)
+        while open_streams:
+            for key, _ in selector.select():
+                chunk = os.read(key.fd, READ_CHUNK_SIZE)
+                if not chunk:
+                    selector.unregister(key.fd)
+                    open_streams -= 1
+                yield key.data, chunk
+    finally:
+        selector.close()
+
+
+def _iter_output_blocks(streams: List[IO[bytes]]) -> Iterator[Tuple[int, bytes]]:
+    """
+    Legge l'output di un processo a blocchi e restituisce blocchi di righe complete.
+    
+    Invece di una `readline()` bloccante per ogni riga, attende i dati su tutte
+    le pipe e legge fino a READ_CHUNK_SIZE bytes per volta. Ogni blocco restituito
+    termina sull'ultima andata a capo ricevuta: il resto resta nel buffer dello
+    stream fino alla lettura successiva. I fine riga CRLF sono normalizzati in LF.
+    
+    Args:
+        streams: Pipe binarie del processo (es. `[process.stdout, process.stderr]`)
+        
+    Yields:
+        Tuple (indice dello stream, righe complete separate da LF, senza LF finale)
+    """
+    buffers = [bytearray() for _ in streams]
+    
+    for index, chunk in _iter_output_chunks(streams):
+        buffer = buffers[index]
+        if not chunk:
+            # Ultima riga senza terminatore
+            if buffer:
+                yield index, bytes(buffer.rstrip(b'\r'))
+                buffer.clear()
+            continue
+        
+        buffer += chunk
+        last_newline = buffer.rfind(b'\n')
+        if last_newline < 0:
+            continue
+        
+        block = bytes(buffer[:last_newline]).replace(b'\r\n', b'\n').rstrip(b'\r')
+        del buffer[:last_newline + 1]
+        yield index, block
+
+
+def _collect_dependency_files(input_file: str) -> List[Tuple[Path, os.stat_result]]:
+    """
+    Elenca in ordine deterministico i file che determinano il contenuto del report.
+    
+    Ogni file viene interrogato con una sola `stat()`, riusata sia per il controllo
+    rapido (mtime + dimensione) sia per l'hash del contenuto.
+    
+    Args:
+        input_file: File .qmd da renderizzare
+        
+    Returns:
+        Lista di tuple (percorso, stat) del file .qmd e delle dipendenze (CACHE_DEPENDENCIES)
+    """
+    candidates = [Path(input_file)]
+    for name in CACHE_DEPENDENCIES:
+        dep = _PROJECT_ROOT / name
+        if dep.is_dir():
+            candidates.extend(
+                path for path in sorted(dep.rglob('*'))
+                if '__pycache__' not in path.parts
+            )
+        else:
+            candidates.append(dep)
+    
+    files = []
+    for path in candidates:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            files.append((path, st))
+    return files
+
+
+def _compute_input_stamp(files: List[Tuple[Path, os.stat_result]], execute: bool) -> str:
+    """
+    Calcola un'impronta rapida degli input basata solo su mtime e dimensione (stile make).
+    
+    Args:
+        files: File di input con le relative stat (da `_collect_dependency_files`)
+        execute: Se True, il codice Python viene eseguito (output diverso da --no-execute)
+        
+    Returns:
+        Digest esadecimale BLAKE2b
+    """
+    digest = hashlib.blake2b()
+    digest.update(f"execute={execute}".encode())
+    for path, st in files:
+        digest.update(f"{path}\0{st.st_mtime_ns}\0{st.st_size}\n".encode())
+    return digest.hexdigest()
+
+
+def _compute_input_hash(files: List[Tuple[Path, os.stat_result]], execute: bool) -> str:
+    """
+    Calcola l'hash del contenuto di tutti gli input del report.
+    
+    Args:
+        files: File di input con le relative stat (da `_collect_dependency_files`)
+        execute: Se True, il codice Python viene eseguito (output diverso da --no-execute)
+        
+    Returns:
+        Digest esadecimale BLAKE2b
+    """
+    digest = hashlib.blake2b()
+    digest.update(f"execute={execute}".encode())
+    for path, _ in files:
+        digest.update(str(path).encode())
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _output_path(input_file: str, fmt: str, output_dir: Optional[str]) -> Path:
+    """
+    Restituisce il percorso del file generato da Quarto per un formato.
+    
+    Args:
+        input_file: File .qmd da renderizzare
+        fmt: Formato di output
+        output_dir: Directory di output (None = accanto al file .qmd)
+        
+    Returns:
+        Percorso atteso del file generato
+    """
+    input_path = Path(input_file)
+    base_dir = Path(output_dir) if output_dir else input_path.parent
+    return base_dir / f"{input_path.stem}{FORMAT_EXTENSIONS[fmt]}"
+
+
+def _cache_file(input_file: str, fmt: str, output_dir: Optional[str]) -> Path:
+    """
+    Restituisce il percorso del file sidecar con l'hash dell'ultimo render riuscito.
+    
+    Args:
+        input_file: File .qmd da renderizzare
+        fmt: Formato di output
+        output_dir: Directory di output (None = accanto al file .qmd)
+        
+    Returns:
+        Percorso del file `<stem>.<fmt>.hash`
+    """
+    output_path = _output_path(input_file, fmt, output_dir)
+    return output_path.parent / CACHE_DIR_NAME / f"{Path(input_file).stem}.{fmt}.hash"
+
+
+def _read_cache_entry(input_file: str, fmt: str, output_dir: Optional[str]) -> Optional[Dict[str, object]]:
+    """
+    Legge l'impronta dell'ultimo render riuscito per un formato.
+    
+    Oltre agli hash degli input viene registrato lo stato del file generato, così un
+    output sovrascritto (es. HTML e RevealJS condividono lo stesso nome) invalida la cache.
+    
+    Args:
+        input_file: File .qmd da renderizzare
+        fmt: Formato di output
+        output_dir: Directory di output
+        
+    Returns:
+        Dizionario con 'hash' e 'stamp' degli input, oppure None se la cache manca
+        o il file generato non corrisponde più
+    """
+    try:
+        entry = json.loads(_cache_file(input_file, fmt, output_dir).read_text(encoding='utf-8'))
+        output_stat = _output_path(input_file, fmt, output_dir).stat()
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(entry, dict)
+        or entry.get('output_mtime_ns') != output_stat.st_mtime_ns
+        or entry.get('output_size') != output_stat.st_size
+    ):
+        return None
+    return entry
+
+
+def _write_cache(
+    input_file: str,
+    fmt: str,
+    output_dir: Optional[str],
+    input_hash: str,
+    input_stamp: str
+) -> None:
+    """
+    Registra gli hash degli input dopo un render riuscito.
+    
+    Args:
+        input_file: File .qmd renderizzato
+        fmt: Formato di output
+        output_dir: Directory di output
+        input_hash: Hash del contenuto degli input usati per il render
+        input_stamp: Impronta rapida (mtime + dimensione) degli stessi input
+    """
+    try:
+        output_stat = _output_path(input_file, fmt, output_dir).stat()
+        cache_file = _cache_file(input_file, fmt, output_dir)
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        cache_file.write_text(json.dumps({
+            'hash': input_hash,
+            'stamp': input_stamp,
+            'output_mtime_ns': output_stat.st_mtime_ns,
+            'output_size': output_stat.st_size
+        }), encoding='utf-8')
+    except OSError:
+        # La cache è solo un'ottimizzazione: se non è scrivibile si renderizza sempre
+        pass
+
+
+def _print_quarto_not_found() -> None:
+    """Mostra il messaggio di errore per Quarto non installato."""
+    print("ERRORE: Quarto non trovato. Assicurati che sia installato e nel PATH.")
+    print("   Installa Quarto da: https://quarto.org/docs/get-started/")
+
+
+def _render_one(
+    fmt: str,
+    input_file: str,
+    output_dir: Optional[str],
+    execute: bool,
+    extra_args: Optional[List[str]] = None
+) -> Tuple[bool, Deque[bytes]]:
+    """
+    Renderizza il report in un singolo formato.
+    
+    Args:
+        fmt: Formato di output ('html', 'pdf', 'revealjs')
+        input_file: File .qmd (o directory di un progetto Quarto) da renderizzare
+        output_dir: Directory di output (None = default)
+        execute: Se True, esegue il codice Python
+        extra_args: Argomenti aggiuntivi per `quarto render` (es. ['--use-freezer'])
+        
+    Returns:
+        Tupla (successo, ultime OUTPUT_TAIL_LINES righe di output di Quarto in bytes;
+        in caso di errore le righe di stderr, se presenti)
+    """
+    print(f"\n{_BANNER}\nRendering in formato: {fmt.upper()}\n{_BANNER}\n")
+    
+    cmd = [_QUARTO or 'quarto', 'render', input_file, '--to', fmt]
+    
+    if output_dir:
+        cmd.extend(['--output-dir', output_dir])
+    
+    if not execute:
+        cmd.append('--no-execute')
+    
+    if extra_args:
+        cmd.extend(extra_args)
+    
+    # Conserva solo la coda dell'output: la memoria resta limitata anche per render lunghi.
+    # stdout e stderr restano separati, così in caso di errore si mostra lo stderr.
+    output_lines: Deque[bytes] = deque(maxlen=OUTPUT_TAIL_LINES)
+    error_lines: Deque[bytes] = deque(maxlen=OUTPUT_TAIL_LINES)
+    tails = (output_lines, error_lines)
+    try:
+        # Usa Popen per leggere output in streaming (binario, letto a blocchi).
+        # close_fds=False (senza preexec_fn né nuova sessione) permette a CPython di usare
+        # posix_spawn invece di fork+exec su Linux. È sicuro perché i descrittori aperti da
+        # Python non sono ereditabili (PEP 446): il figlio riceve solo le proprie pipe.
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+            env=_CHILD_ENV,
+            close_fds=False,
+            start_new_session=False
+        )
+        
+        # Variabili per tracciare il progresso
+        current_cell = 0
+        total_cells = 0
+        current_label = ""
+        start_time = time.time()
+        
+        # Leggi output in streaming: i pattern vengono cercati sull'intero blocco,
+        # senza un ciclo Python per ogni riga
+        for index, block in _iter_output_blocks([process.stdout, process.stderr]):
+            lines = block.split(b'\n')
+            tails[index].extend(lines)
+            
+            # Righe importanti (errori, warning, etc.): scansione per riga solo se il
+            # blocco contiene almeno una parola chiave
+            if KEYWORD_PATTERN.search(block):
+                messages = [
+                    line for line in lines
+                    if KEYWORD_PATTERN.search(line) and not CELL_PATTERN.search(line)
+                ]
+                if messages:
+                    # Vai a nuova riga per mostrare i messaggi
+                    print()
+                    for line in messages:
+                        print(_decode_line(line).rstrip())
+                    # Riprendi la barra di progresso se abbiamo ancora celle
+                    if total_cells > 0:
+                        update_progress(current_cell, total_cells, current_label, start_time, force=True)
+            
+            # Pattern "Cell X/Y: label": conta solo l'ultima cella del blocco
+            match = None
+            for match in CELL_PATTERN.finditer(block):
+                pass
+            if match:
+                current_cell = int(match.group(1))
+                total_cells = int(match.group(2))
+                current_label = _decode_line(match.group(3)).strip()
+                update_progress(current_cell, total_cells, current_label, start_time)
+        
+        # Attendi che il processo termini
+        return_code = process.wait()
+        
+        # Mostra progresso finale
+        if total_cells > 0:
+            update_progress(total_cells, total_cells, "Completato", start_time)
+        else:
+            # Se non abbiamo trovato pattern di celle, mostra output completo
+            print("\n" + _decode_line(b"\n".join(output_lines)))
+            if error_lines:
+                print(_decode_line(b"\n".join(error_lines)))
+        
+        if return_code == 0:
+            elapsed = time.time() - start_time
+            print(f"\n[OK] Report {fmt} generato con successo! (Tempo totale: {int(elapsed)}s)")
+            return True, output_lines
+        
+        print(f"\n[ERRORE] Errore durante il rendering in {fmt} (codice: {return_code})")
+        return False, error_lines or output_lines
+            
+    except FileNotFoundError:
+        _print_quarto_not_found()
+        return False, output_lines
+
+
+def _print_failure_output(fmt: str, output_lines: Iterable[bytes]) -> None:
+    """
+    Mostra l'output di Quarto raccolto per un formato il cui render è fallito.
+    
+    Args:
+        fmt: Formato renderizzato
+        output_lines: Ultime righe di output raccolte durante il render
+    """
+    if not output_lines:
+        return
+    print(f"\nOutput ({fmt}, ultime {OUTPUT_TAIL_LINES} righe):")
+    print(_decode_line(b"\n".join(output_lines)))
+
+
 def render_quarto_report(
     input_file: str = DEFAULT_INPUT,
     output_format: str = DEFAULT_FORMAT,
     output_dir: Optional[str] = None,
-    execute: bool = True
+    execute: bool = True,
+    cache_refresh: bool = False
 ) -> bool:
     """
     Genera il report Quarto in uno o più formati.
     
+    Con più formati (es. 'all') il codice viene eseguito una sola volta: il primo
+    render (HTML se richiesto) popola `_freeze/` grazie a `freeze: auto` in
+    `_quarto.yml`, gli altri formati riusano i risultati congelati (`--use-freezer`).
+    I formati vengono renderizzati in sequenza: condividono il nome del file generato
+    o la cartella `<stem>_files/`, quindi non possono essere scritti contemporaneamente.
+    
+    I formati il cui output è già aggiornato (stesso hash di .qmd, codice, dati e
+    contesto dell'ultimo render riuscito) vengono saltati, salvo `cache_refresh`.
+    
+    Se `input_file` è una directory, l'intero progetto Quarto viene renderizzato con
+    un solo `quarto render <dir>` per formato (senza cache degli input).
+    
     Args:
-        input_file: File .qmd da renderizzare
+        input_file: File .qmd o directory di un progetto Quarto da renderizzare
         output_format: Formato output ('html', 'pdf', 'revealjs', 'all')
         output_dir: Directory di output (None = default)
         execute: Se True, esegue il codice Python
+        cache_refresh: Se True, renderizza anche se gli input non sono cambiati
         
     Returns:
         True se il rendering è riuscito
@@ -127,94 +634,79 @@ def render_quarto_report(
     if not isinstance(target_formats, list):
         target_formats = [target_formats]
     
-    success = True
-    for fmt in target_formats:
-        print(f"\n{'='*60}")
-        print(f"Rendering in formato: {fmt.upper()}")
-        print(f"{'='*60}\n")
-        
-        cmd = ['quarto', 'render', input_file, '--to', fmt]
-        
-        if output_dir:
-            cmd.extend(['--output-dir', output_dir])
-        
-        if not execute:
-            cmd.append('--no-execute')
-        
-        try:
-            # Usa Popen per leggere output in streaming
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
-            
-            # Variabili per tracciare il progresso
-            current_cell = 0
-            total_cells = 0
-            current_label = ""
-            start_time = time.time()
-            output_lines = []
-            
-            # Leggi output in streaming
-            while True:
-                line = process.stdout.readline()
-                if not line:
-                    break
-                
-                output_lines.append(line)
-                
-                # Cerca pattern "Cell X/Y: label"
-                match = CELL_PATTERN.search(line)
-                if match:
-                    current_cell = int(match.group(1))
-                    total_cells = int(match.group(2))
-                    current_label = match.group(3).strip()
-                    update_progress(current_cell, total_cells, current_label, start_time)
+    # Salta i formati già aggiornati rispetto agli input: se mtime e dimensione di
+    # tutti i file coincidono non serve nemmeno leggerne il contenuto.
+    # Per un progetto (directory) i file generati non sono noti: niente cache.
+    use_cache = not Path(input_file).is_dir()
+    dependencies = _collect_dependency_files(input_file) if use_cache else []
+    input_stamp = _compute_input_stamp(dependencies, execute)
+    input_hash: Optional[str] = None
+    if use_cache and not cache_refresh:
+        pending_formats = []
+        for fmt in target_formats:
+            entry = _read_cache_entry(input_file, fmt, output_dir)
+            if entry is not None and entry.get('stamp') != input_stamp:
+                # File toccati: confronta il contenuto
+                if input_hash is None:
+                    input_hash = _compute_input_hash(dependencies, execute)
+                if entry.get('hash') == input_hash:
+                    _write_cache(input_file, fmt, output_dir, input_hash, input_stamp)
                 else:
-                    # Stampa altre righe importanti (errori, warning, etc.)
-                    if any(keyword in line.lower() for keyword in ['error', 'warning', 'done', 'complete']):
-                        # Vai a nuova riga per mostrare il messaggio
-                        print()
-                        print(line.rstrip())
-                        # Riprendi la barra di progresso se abbiamo ancora celle
-                        if total_cells > 0:
-                            update_progress(current_cell, total_cells, current_label, start_time)
-            
-            # Attendi che il processo termini
-            return_code = process.wait()
-            
-            # Mostra progresso finale
-            if total_cells > 0:
-                update_progress(total_cells, total_cells, "Completato", start_time)
+                    entry = None
+            if entry is not None:
+                print(f"[CACHE] Report {fmt} già aggiornato: render saltato")
             else:
-                # Se non abbiamo trovato pattern di celle, mostra output completo
-                print("\n" + "".join(output_lines))
-            
-            if return_code == 0:
-                elapsed = time.time() - start_time
-                print(f"\n[OK] Report {fmt} generato con successo! (Tempo totale: {int(elapsed)}s)")
-            else:
-                print(f"\n[ERRORE] Errore durante il rendering in {fmt} (codice: {return_code})")
-                print("Output completo:")
-                print("".join(output_lines))
-                success = False
-                
-        except FileNotFoundError:
-            print("ERRORE: Quarto non trovato. Assicurati che sia installato e nel PATH.")
-            print("   Installa Quarto da: https://quarto.org/docs/get-started/")
+                pending_formats.append(fmt)
+        if not pending_formats:
+            return True
+        target_formats = pending_formats
+    if use_cache and input_hash is None:
+        input_hash = _compute_input_hash(dependencies, execute)
+    
+    def _record(fmt: str) -> None:
+        if use_cache and input_hash is not None:
+            _write_cache(input_file, fmt, output_dir, input_hash, input_stamp)
+    
+    extra_args: List[str] = []
+    if execute and len(target_formats) > 1:
+        # Fase 1: esegui il codice una sola volta (kernel mantenuto attivo dal daemon)
+        first_fmt = 'html' if 'html' in target_formats else target_formats[0]
+        first_success, output_lines = _render_one(
+            first_fmt,
+            input_file,
+            output_dir,
+            execute,
+            ['--execute-daemon', str(EXECUTE_DAEMON_SECONDS)]
+        )
+        if not first_success:
+            _print_failure_output(first_fmt, output_lines)
+            return False
+        _record(first_fmt)
+        
+        # Fase 2: i formati rimanenti riusano i risultati congelati
+        target_formats = [fmt for fmt in target_formats if fmt != first_fmt]
+        extra_args = ['--use-freezer']
+    
+    success = True
+    for fmt in target_formats:
+        fmt_success, output_lines = _render_one(
+            fmt,
+            input_file,
+            output_dir,
+            execute,
+            extra_args
+        )
+        if fmt_success:
+            _record(fmt)
+        else:
             success = False
+            _print_failure_output(fmt, output_lines)
     
     return success
 
 
 def main() -> None:
     """Funzione principale."""
-    import argparse
-    
     parser = argparse.ArgumentParser(
         description="Genera report Quarto automaticamente"
     )
@@ -227,7 +719,7 @@ def main() -> None:
     parser.add_argument(
         '--input',
         default=DEFAULT_INPUT,
-        help=f'File .qmd da renderizzare (default: {DEFAULT_INPUT})'
+        help=f'File .qmd o directory di un progetto Quarto da renderizzare (default: {DEFAULT_INPUT})'
     )
     parser.add_argument(
         '--output-dir',
@@ -238,12 +730,25 @@ def main() -> None:
         action='store_true',
         help='Non eseguire il codice Python (usa cache)'
     )
+    parser.add_argument(
+        '--cache-refresh',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help='Renderizza anche se .qmd, codice, dati e contesto non sono cambiati (default: no)'
+    )
     
     args = parser.parse_args()
     
+    # Verifica subito che Quarto sia disponibile
+    if _QUARTO is None:
+        _print_quarto_not_found()
+        sys.exit(1)
+    
     # Verifica che il file esista
     input_path = Path(args.input)
-    if not input_path.exists():
+    try:
+        input_path.stat()
+    except FileNotFoundError:
         print(f"ERRORE: File non trovato: {args.input}")
         print(f"   Percorso assoluto cercato: {input_path.absolute()}")
         sys.exit(1)
@@ -259,18 +764,19 @@ def main() -> None:
         input_file=args.input,
         output_format=args.format,
         output_dir=args.output_dir,
-        execute=not args.no_execute
+        execute=not args.no_execute,
+        cache_refresh=args.cache_refresh
     )
     
     if success:
-        print("\n" + "="*60)
+        print("\n" + _BANNER)
         print("OK: Generazione report completata!")
-        print("="*60)
+        print(_BANNER)
         sys.exit(0)
     else:
-        print("\n" + "="*60)
+        print("\n" + _BANNER)
         print("ERRORE: Errore durante la generazione del report")
-        print("="*60)
+        print(_BANNER)
         sys.exit(1)
 
 
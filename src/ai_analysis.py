@@ -5,13 +5,24 @@ from dotenv import load_dotenv, find_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 import pandas as pd
+import asyncio
+import atexit
+import hashlib
+import json
 import os
+import sqlite3
+import time
 import sys
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Union, Tuple
-from openai import RateLimitError
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Dict, List, Optional, Any, Union, Tuple, Callable, Hashable, Awaitable, Iterator
+from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError, OpenAIError, BadRequestError
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from functools import lru_cache, wraps
 import logging
+import threading
+import weakref
 
 # Importa funzione helper per calcolo percentuali
 try:
@@ -48,9 +59,32 @@ def _load_env() -> None:
 
 _load_env()
 
-# Tracking modello utilizzato (globale per persistenza tra celle Quarto)
-_last_used_model: Optional[str] = None
-_last_used_provider: Optional[str] = None
+# API key lette una sola volta al caricamento del modulo: il client LLM in cache
+# (chiave inclusa) resta valido tra le chiamate. Usa reload_api_keys() se cambiano.
+_OPENAI_API_KEY: Optional[str] = None
+_GOOGLE_API_KEY: Optional[str] = None
+
+
+def reload_api_keys() -> None:
+    """Rilegge OPENAI_API_KEY e GOOGLE_API_KEY dall'ambiente (es. dopo averle modificate a runtime)."""
+    global _OPENAI_API_KEY, _GOOGLE_API_KEY
+    _OPENAI_API_KEY = (os.getenv("OPENAI_API_KEY") or "").strip() or None
+    _GOOGLE_API_KEY = (os.getenv("GOOGLE_API_KEY") or "").strip() or None
+
+
+reload_api_keys()
+
+# Tracking modello utilizzato (globale per persistenza tra celle Quarto): una sola tupla
+# (modello, provider), sostituita per intero, così chi legge da un altro thread non vede
+# mai il modello di una chiamata con il provider di un'altra
+_last_used: Optional[Tuple[str, Optional[str]]] = None
+
+
+def _set_last_used_model(model_name: str, provider: Optional[str]) -> None:
+    """Registra il modello (e il provider) dell'ultima risposta LLM ottenuta."""
+    global _last_used
+    _last_used = (model_name, provider)
+
 
 # Configurazione logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -71,13 +105,68 @@ if not logger.handlers:
 # Timeout per le chiamate API (in secondi) - configurabile via variabile d'ambiente
 API_TIMEOUT_SECONDS = int(os.getenv("LLM_API_TIMEOUT", "60"))
 
+# Numero massimo di richieste LLM contemporanee in run_all_analyses
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# Retry sugli errori temporanei (429, rete, 5xx) prima di passare ai modelli fallback
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "6"))
+LLM_RETRY_MIN_WAIT = 1
+LLM_RETRY_MAX_WAIT = 60
+
+# Circuit breaker per modello: se nell'ultimo minuto più di metà delle chiamate è fallita,
+# il modello viene saltato per CIRCUIT_OPEN_SECONDS (poi passa una sola richiesta di prova)
+CIRCUIT_WINDOW_SECONDS = 60
+CIRCUIT_FAILURE_RATE = 0.5
+CIRCUIT_MIN_CALLS = 2
+CIRCUIT_OPEN_SECONDS = 30
+
+# Cache su disco (SQLite) delle risposte LLM (stesso modello + stesso prompt = stessa risposta).
+# REPORT_AI_CACHE=0 la disabilita; REPORT_AI_CACHE_DIR ne cambia la posizione.
+LLM_CACHE_ENABLED = os.getenv("REPORT_AI_CACHE", "1") != "0"
+LLM_CACHE_DIR = Path(os.getenv("REPORT_AI_CACHE_DIR", str(Path.home() / ".report_ai_cache"))).expanduser() / "llm"
+LLM_CACHE_FILE = "cache.sqlite3"
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Limiti delle tabelle pandas inserite nei prompt (meno token, stessa informazione utile)
+PROMPT_TABLE_MAX_ROWS = 20
+PROMPT_TABLE_MAX_COLS = 12
+PROMPT_TABLE_DECIMALS = 2
+# Statistiche descrittive nei prompt: solo le righe utili all'analisi, al massimo 8 colonne numeriche
+PROMPT_STATS_ROWS = ('count', 'mean', 'std', 'min', 'max')
+PROMPT_STATS_MAX_COLS = 8
+# Budget in token per ogni blocco inserito nei prompt (tabelle e contesto di dominio)
+PROMPT_BLOCK_MAX_TOKENS = 800
+PROMPT_CONTEXT_MAX_TOKENS = 2000
+# Dimensione massima stimata di un prompt completo: oltre si toglie il contesto di dominio
+# e, se non basta, si tronca (configurabile via LLM_MAX_PROMPT_TOKENS)
+MAX_PROMPT_TOKENS = int(os.getenv("LLM_MAX_PROMPT_TOKENS", "12000"))
+
+# Numero massimo di riassunti pandas (describe/value_counts) memorizzati
+SUMMARY_CACHE_SIZE = 32
+
 # Costanti
 GEMINI_MODEL = "gemini-3-pro-preview"
 GEMINI_FLASH_MODEL = "gemini-2.5-flash"
+_GEMINI_MODELS = frozenset({GEMINI_MODEL, GEMINI_FLASH_MODEL})
 # Default model: usa gpt-5.2 come default
 # Può essere sovrascritto tramite OPENAI_MODEL env var o parametro ai_model nel QMD
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-5.2")
 DEFAULT_TEMPERATURE = 0
+# Routing: i prompt brevi (sotto LLM_ROUTING_MAX_CHARS) usano un modello più piccolo e veloce.
+# LLM_SMALL_MODEL="" disabilita il routing; REPORT_AI_FORCE_MODEL impone un modello a tutti i prompt.
+LLM_SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "gpt-5.2-mini")
+LLM_ROUTING_MAX_CHARS = 4000
+# Timeout per modello (secondi), allineati ai tempi di risposta tipici di ciascun provider.
+# LLM_TIMEOUT_<MODELLO> (es. LLM_TIMEOUT_GEMINI_2_5_FLASH=60) sovrascrive il singolo valore;
+# i modelli non elencati usano API_TIMEOUT_SECONDS.
+_MODEL_TIMEOUTS: Dict[str, int] = {
+    "gpt-5.2": 45,
+    "gpt-5.2-mini": 20,
+    "gpt-4o": 30,
+    "gpt-4o-mini": 20,
+    GEMINI_MODEL: 90,
+    GEMINI_FLASH_MODEL: 45,
+}
 
 # Importa il modulo per caricare il contesto
 # Prova prima import relativo, poi assoluto per compatibilità con notebook Quarto
@@ -98,6 +187,69 @@ except ImportError as e:
         def get_context_for_analysis(analysis_type: str = "general", field_name: Optional[str] = None) -> str:
             return ""
 
+
+@dataclass(frozen=True)
+class ReportContext:
+    """
+    Contesto di dominio di un report, caricato una volta e condiviso tra le sezioni.
+    
+    Ogni attributo contiene il testo già limitato a PROMPT_CONTEXT_MAX_TOKENS per il
+    rispettivo tipo di analisi. Va costruito con ReportContext.load() per lo stesso
+    field_name passato alle funzioni di analisi; `general` (testo delle sezioni) non
+    dipende dal campo.
+    """
+    data_summary: str = ""
+    chart_commentary: str = ""
+    error_patterns: str = ""
+    general: str = ""
+    
+    @classmethod
+    def load(cls, field_name: Optional[str] = None) -> "ReportContext":
+        """
+        Carica il contesto per tutti i tipi di analisi.
+        
+        Args:
+            field_name: Nome del campo specifico (opzionale)
+            
+        Returns:
+            ReportContext (vuoto se context_loader non è disponibile)
+        """
+        if not CONTEXT_LOADER_AVAILABLE:
+            return cls()
+        return cls(
+            data_summary=_cap_tokens(get_context_for_analysis('data_summary', field_name), PROMPT_CONTEXT_MAX_TOKENS),
+            chart_commentary=_cap_tokens(get_context_for_analysis('chart_commentary', field_name), PROMPT_CONTEXT_MAX_TOKENS),
+            error_patterns=_cap_tokens(get_context_for_analysis('error_patterns', field_name), PROMPT_CONTEXT_MAX_TOKENS),
+            general=_cap_tokens(get_context_for_analysis('general'), PROMPT_CONTEXT_MAX_TOKENS)
+        )
+
+
+_CONTEXT_HEADER = "\n\n=== CONTESTO DI DOMINIO E DOCUMENTAZIONE ===\n"
+_CONTEXT_FOOTER = "\n=== FINE CONTESTO ===\n"
+
+
+def _context_block(analysis_type: str, field_name: Optional[str] = None, ctx: Optional[ReportContext] = None) -> str:
+    """
+    Restituisce la sezione di contesto di dominio da inserire in un prompt.
+    
+    Args:
+        analysis_type: Tipo di analisi ('data_summary', 'chart_commentary', 'error_patterns', 'general')
+        field_name: Nome del campo specifico (ignorato se `ctx` è fornito)
+        ctx: Contesto del report già caricato (opzionale)
+        
+    Returns:
+        Blocco di contesto formattato, o stringa vuota se non c'è contesto
+    """
+    if ctx is not None:
+        context_text = getattr(ctx, analysis_type)
+    elif CONTEXT_LOADER_AVAILABLE:
+        context_text = _cap_tokens(get_context_for_analysis(analysis_type, field_name), PROMPT_CONTEXT_MAX_TOKENS)
+    else:
+        context_text = ""
+    if not context_text:
+        return ""
+    return f"{_CONTEXT_HEADER}{context_text}{_CONTEXT_FOOTER}"
+
 # Importa Gemini se disponibile
 try:
     from langchain_google_genai import ChatGoogleGenerativeAI
@@ -106,6 +258,327 @@ except ImportError as e:
     logger.debug(f"langchain-google-genai non disponibile: {e}. Supporto Gemini disabilitato.")
     GEMINI_AVAILABLE = False
 
+# Errori sollevati dai client Gemini (se disponibili), per distinguerli dagli errori di programmazione
+_GEMINI_ERRORS: Tuple[type, ...] = ()
+if GEMINI_AVAILABLE:
+    try:
+        from langchain_google_genai.chat_models import ChatGoogleGenerativeAIError
+        _GEMINI_ERRORS += (ChatGoogleGenerativeAIError,)
+    except ImportError:
+        pass
+    try:
+        from google.genai.errors import APIError as GoogleAPIError
+        _GEMINI_ERRORS += (GoogleAPIError,)
+    except ImportError:
+        pass
+
+# Errori temporanei (rate limit, rete, 5xx, timeout): si passa ai modelli fallback per qualunque provider
+_TRANSIENT_LLM_ERRORS = (RateLimitError, APIConnectionError, InternalServerError, FuturesTimeoutError, asyncio.TimeoutError)
+# Tutti gli errori dei provider LLM; le altre eccezioni (errori di programmazione) vengono propagate
+_LLM_ERRORS = (OpenAIError, FuturesTimeoutError, asyncio.TimeoutError) + _GEMINI_ERRORS
+
+# Importa tenacity (dipendenza di langchain-core) per i retry con backoff
+try:
+    from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+    TENACITY_AVAILABLE = True
+except ImportError as e:
+    logger.debug(f"tenacity non disponibile: {e}. Retry sugli errori temporanei disabilitati.")
+    TENACITY_AVAILABLE = False
+
+
+# Importa tiktoken per contare i token dei blocchi inseriti nei prompt
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError as e:
+    logger.debug(f"tiktoken non disponibile: {e}. Conteggio token stimato dai caratteri.")
+    TIKTOKEN_AVAILABLE = False
+
+
+# Serializza la creazione dei client LLM (le celle/thread concorrenti condividono la cache)
+_client_lock = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def _build_chat_client(provider: str, model_name: str, temperature: float, api_key: str) -> Any:
+    """
+    Crea un client LLM; il risultato viene memorizzato per (provider, modello, temperatura, key).
+    
+    Args:
+        provider: "openai" o "google"
+        model_name: Nome del modello
+        temperature: Temperatura per la generazione
+        api_key: API key del provider
+        
+    Returns:
+        Istanza ChatOpenAI o ChatGoogleGenerativeAI
+    """
+    if provider == "google":
+        return ChatGoogleGenerativeAI(
+            model=model_name,
+            temperature=temperature,
+            google_api_key=api_key
+        )
+    return ChatOpenAI(
+        model=model_name,
+        temperature=temperature,
+        api_key=api_key,
+        timeout=_model_timeout(model_name)
+    )
+
+
+def _get_chat_client(provider: str, model_name: str, temperature: float, api_key: str) -> Any:
+    """
+    Restituisce il client LLM condiviso per la configurazione richiesta.
+    
+    Il client viene creato una sola volta e riusato dalle chiamate successive, così
+    configurazione e pool di connessioni HTTP (keep-alive) non vengono ricreati a ogni analisi.
+    
+    Args:
+        provider: "openai" o "google"
+        model_name: Nome del modello
+        temperature: Temperatura per la generazione
+        api_key: API key del provider
+        
+    Returns:
+        Istanza ChatOpenAI o ChatGoogleGenerativeAI
+    """
+    with _client_lock:
+        return _build_chat_client(provider, model_name, temperature, api_key)
+
+
+# Riassunti pandas già calcolati: chiave (id, shape, colonne, nome) -> (weakref al DataFrame, valore)
+_summary_cache: Dict[Tuple[Any, ...], Tuple[Any, Any]] = {}
+_summary_lock = threading.Lock()
+
+
+def _cached_summary(df: pd.DataFrame, name: Hashable, compute: Callable[[], Any]) -> Any:
+    """
+    Calcola (o riusa) un riassunto derivato da un DataFrame.
+    
+    La chiave combina id, shape e colonne del DataFrame; un riferimento debole verifica
+    che l'oggetto sia ancora lo stesso (un id può essere riusato dopo il garbage collection).
+    Il DataFrame non deve essere modificato in-place tra due chiamate. Oltre
+    SUMMARY_CACHE_SIZE voci vengono eliminate le più vecchie (FIFO).
+    
+    Args:
+        df: DataFrame di origine
+        name: Nome del riassunto (es. 'describe' o ('error_patterns', field_name))
+        compute: Funzione senza argomenti che calcola il riassunto
+        
+    Returns:
+        Valore restituito da `compute` (eventualmente dalla cache)
+    """
+    key = (id(df), df.shape, tuple(df.columns), name)
+    with _summary_lock:
+        entry = _summary_cache.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    
+    value = compute()
+    with _summary_lock:
+        _summary_cache.pop(key, None)
+        _summary_cache[key] = (weakref.ref(df), value)
+        while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+            del _summary_cache[next(iter(_summary_cache))]
+    return value
+
+
+def _field_rows(df: pd.DataFrame, field_name: str) -> pd.DataFrame:
+    """
+    Restituisce le righe di un campo usando un indice dei gruppi per field_name.
+    
+    L'indice (campo -> posizioni delle righe) viene calcolato con un solo groupby per
+    DataFrame e riusato: ogni lookup successivo non riscandisce la colonna.
+    
+    Args:
+        df: DataFrame con colonna 'field_name'
+        field_name: Nome del campo
+        
+    Returns:
+        Righe del campo nell'ordine originale (DataFrame vuoto se il campo non esiste)
+    """
+    indices = _cached_summary(
+        df, 'field_indices',
+        lambda: df.groupby('field_name', sort=False, observed=True).indices
+    )
+    positions = indices.get(field_name)
+    if positions is None:
+        return df.iloc[0:0]
+    return df.iloc[positions]
+
+
+# Caratteri per token usati quando tiktoken (o la sua codifica) non è disponibile
+_CHARS_PER_TOKEN = 4
+_TRUNCATED_MARK = "\n…[troncato]"
+
+
+@lru_cache(maxsize=1)
+def _get_token_encoding() -> Any:
+    """
+    Restituisce la codifica tiktoken del modello di default (caricata una sola volta).
+    
+    Returns:
+        Codifica tiktoken, o None se tiktoken non è installato o la codifica non è
+        scaricabile (es. ambiente offline): in quel caso si usa la stima sui caratteri
+    """
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(DEFAULT_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.debug(f"Codifica tiktoken non disponibile: {_short_err(e)}. Conteggio token stimato.")
+        return None
+
+
+def _cap_tokens(text: str, max_tokens: int = PROMPT_BLOCK_MAX_TOKENS) -> str:
+    """
+    Limita un blocco di testo del prompt a un numero massimo di token.
+    
+    Args:
+        text: Testo da inserire nel prompt
+        max_tokens: Numero massimo di token
+        
+    Returns:
+        Testo invariato se entro il budget, altrimenti troncato con una nota finale
+    """
+    # Ogni token copre almeno un byte: testi brevi non richiedono la tokenizzazione
+    if len(text.encode("utf-8")) <= max_tokens:
+        return text
+    encoding = _get_token_encoding()
+    if encoding is None:
+        max_chars = max_tokens * _CHARS_PER_TOKEN
+        return text if len(text) <= max_chars else text[:max_chars] + _TRUNCATED_MARK
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]) + _TRUNCATED_MARK
+
+
+def _estimate_tokens(text: str) -> int:
+    """Stima veloce (caratteri / 4) dei token di un testo, senza tokenizzarlo."""
+    return len(text) // _CHARS_PER_TOKEN
+
+
+def _shrink_prompt(prompt: str, max_tokens: int) -> str:
+    """
+    Riduce un prompt togliendo il contesto di dominio e, se serve, troncandolo.
+    
+    Args:
+        prompt: Prompt completo
+        max_tokens: Numero massimo di token del prompt ridotto
+        
+    Returns:
+        Prompt senza blocco di contesto, limitato a max_tokens
+    """
+    start = prompt.find(_CONTEXT_HEADER)
+    end = prompt.find(_CONTEXT_FOOTER, start)
+    if start >= 0 and end >= 0:
+        prompt = prompt[:start] + prompt[end + len(_CONTEXT_FOOTER):]
+    return _cap_tokens(prompt, max_tokens)
+
+
+def _fit_prompt(prompt: str, max_tokens: int = MAX_PROMPT_TOKENS) -> str:
+    """
+    Restituisce il prompt invariato se entro MAX_PROMPT_TOKENS, altrimenti ridotto.
+    
+    Un prompt oltre il limite del modello verrebbe rifiutato da tutti i modelli di
+    fallback: meglio inviarne uno ridotto che nessuno.
+    
+    Args:
+        prompt: Prompt completo
+        max_tokens: Numero massimo di token stimati
+        
+    Returns:
+        Prompt da inviare all'LLM
+    """
+    estimated = _estimate_tokens(prompt)
+    if estimated <= max_tokens:
+        return prompt
+    logger.warning(f"Prompt di circa {estimated} token oltre il limite di {max_tokens}: contesto rimosso")
+    return _shrink_prompt(prompt, max_tokens)
+
+
+def _field_stats(df: pd.DataFrame, field_name: str) -> Tuple[int, int]:
+    """
+    Restituisce (record totali, record validati) di un campo.
+    
+    I conteggi di tutti i campi vengono calcolati con un'unica aggregazione per
+    DataFrame e riusati: le richieste per altri campi sono semplici lookup.
+    
+    Args:
+        df: DataFrame con colonna 'field_name' (e opzionalmente 'is_validated')
+        field_name: Nome del campo
+        
+    Returns:
+        Tupla (field_count, field_validated); (0, 0) se il campo non esiste
+    """
+    def _compute() -> Dict[Any, Tuple[int, int]]:
+        if 'is_validated' in df.columns:
+            counts = df.groupby('field_name', sort=False, observed=True)['is_validated'].agg(['size', 'sum'])
+            return {key: (int(size), int(validated)) for key, size, validated in counts.itertuples()}
+        sizes = df.groupby('field_name', sort=False, observed=True).size()
+        return {key: (int(size), 0) for key, size in sizes.items()}
+    
+    return _cached_summary(df, 'field_stats', _compute).get(field_name, (0, 0))
+
+
+def _compact(
+    table: Union[pd.DataFrame, pd.Series],
+    max_rows: int = PROMPT_TABLE_MAX_ROWS,
+    max_cols: int = PROMPT_TABLE_MAX_COLS,
+    decimals: int = PROMPT_TABLE_DECIMALS
+) -> str:
+    """
+    Converte una tabella pandas in testo compatto per un prompt.
+    
+    Limita righe e colonne e arrotonda i numeri prima di `.to_string()`, così la
+    formattazione non produce testo che il modello non userebbe.
+    
+    Args:
+        table: DataFrame o Series da serializzare (es. describe() o value_counts())
+        max_rows: Numero massimo di righe
+        max_cols: Numero massimo di colonne (solo DataFrame)
+        decimals: Cifre decimali
+        
+    Returns:
+        Tabella formattata (entro PROMPT_BLOCK_MAX_TOKENS), con una nota se sono state omesse righe
+    """
+    n_rows = len(table)
+    if isinstance(table, pd.DataFrame):
+        table = table.iloc[:max_rows, :max_cols]
+    else:
+        table = table.iloc[:max_rows]
+    text = table.round(decimals).to_string()
+    if n_rows > max_rows:
+        text += f"\n... ({n_rows - max_rows} righe omesse su {n_rows})"
+    return _cap_tokens(text)
+
+
+def _compact_stats(df: pd.DataFrame, max_cols: int = PROMPT_STATS_MAX_COLS) -> str:
+    """
+    Statistiche descrittive compatte per un prompt.
+    
+    Rispetto a `df.describe()` completo vengono tenute solo le righe PROMPT_STATS_ROWS
+    (i quartili raramente entrano nel commento) e le prime `max_cols` colonne numeriche.
+    
+    Args:
+        df: DataFrame da descrivere
+        max_cols: Numero massimo di colonne numeriche
+        
+    Returns:
+        Tabella formattata con _compact
+    """
+    numeric = df.select_dtypes(include='number')
+    if numeric.shape[1] == 0:
+        # Nessuna colonna numerica: describe() riassume le colonne testuali
+        return _compact(df.describe())
+    described = numeric.iloc[:, :max_cols].describe()
+    return _compact(described.loc[[row for row in PROMPT_STATS_ROWS if row in described.index]])
+
 
 def get_model_display_name(model_name: Optional[str]) -> str:
     """
@@ -144,8 +617,8 @@ def get_llm(model_name: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPER
     Returns:
         Configurazione LLM o None se API key non disponibile
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key or api_key.strip() == "":
+    api_key = _OPENAI_API_KEY
+    if api_key is None:
         return None
     
     # Non inizializzare ChatOpenAI qui - fallo solo quando necessario
@@ -153,6 +626,31 @@ def get_llm(model_name: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPER
     return {"model_name": model_name, "temperature": temperature, "api_key": api_key}
 
 
+def _is_gemini_model(model_name: str) -> bool:
+    """Indica se il modello va invocato tramite Google (Gemini) anziché OpenAI."""
+    return model_name in _GEMINI_MODELS or model_name.startswith("gemini-")
+
+
+@lru_cache(maxsize=16)
+def _fallback_chain(primary_model: str, gemini_enabled: bool) -> Tuple[str, ...]:
+    """
+    Restituisce l'ordine dei modelli da provare, con primary_model in testa.
+    
+    Ordine di fallback: gpt-5.2 -> gemini-3-pro-preview -> gemini-2.5-flash
+    
+    Args:
+        primary_model: Modello principale
+        gemini_enabled: Se includere i modelli Gemini (pacchetto e API key disponibili)
+        
+    Returns:
+        Tupla di nomi di modello senza duplicati
+    """
+    chain = ["gpt-5.2"]
+    if gemini_enabled:
+        chain += [GEMINI_MODEL, GEMINI_FLASH_MODEL]
+    return (primary_model, *(model for model in chain if model != primary_model))
+
+
 def get_llm_with_fallback(primary_model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE) -> Optional[Dict[str, Any]]:
     """
     Inizializza LLM con fallback a modelli alternativi se quota esaurita.
@@ -166,44 +664,28 @@ def get_llm_with_fallback(primary_model: str = DEFAULT_MODEL, temperature: float
     Returns:
         Configurazione LLM con model_name, temperature, api_key, provider, o None se tutti falliscono
     """
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    google_api_key = os.getenv("GOOGLE_API_KEY")
+    openai_api_key = _OPENAI_API_KEY
+    google_api_key = _GOOGLE_API_KEY
     
     # Se non ci sono API keys disponibili, restituisci None
-    if (not openai_api_key or openai_api_key.strip() == "") and (not google_api_key or google_api_key.strip() == ""):
+    if not openai_api_key and not google_api_key:
         return None
     
-    # Ordine di fallback: gpt-5.2 -> gemini-3-pro-preview -> gemini-2.5-flash
-    fallback_models = ["gpt-5.2"]
-    
-    # Aggiungi Gemini se disponibile
-    if GEMINI_AVAILABLE and google_api_key and google_api_key.strip() != "":
-        fallback_models.append(GEMINI_MODEL)
-        fallback_models.append(GEMINI_FLASH_MODEL)
-    
-    # Se il modello primario non è nella lista, aggiungilo all'inizio
-    if primary_model not in fallback_models:
-        fallback_models.insert(0, primary_model)
-    else:
-        # Riordina per avere primary_model come primo
-        fallback_models.remove(primary_model)
-        fallback_models.insert(0, primary_model)
+    # Ordine di fallback calcolato una volta per (modello primario, Gemini disponibile);
+    # copia in lista perché la configurazione restituita è di proprietà del chiamante
+    fallback_models = list(_fallback_chain(primary_model, GEMINI_AVAILABLE and google_api_key is not None))
     
-    # Prova ogni modello nell'ordine specificato
-    for model in fallback_models:
+    # Prova ogni modello nell'ordine specificato, prima quelli con circuit breaker chiuso
+    skipped = [model for model in fallback_models if _circuit_state(model) == "open"]
+    for model in [m for m in fallback_models if m not in skipped] + skipped:
         # Determina se è un modello OpenAI o Gemini
-        is_gemini = model == GEMINI_MODEL or model == GEMINI_FLASH_MODEL
+        is_gemini = _is_gemini_model(model)
         
         # Prova OpenAI
-        if not is_gemini and openai_api_key and openai_api_key.strip() != "":
+        if not is_gemini and openai_api_key:
             try:
-                # Prova a inizializzare il modello OpenAI con timeout
-                llm = ChatOpenAI(
-                    model=model,
-                    temperature=temperature,
-                    api_key=openai_api_key,
-                    timeout=API_TIMEOUT_SECONDS
-                )
+                # Prova a inizializzare il modello OpenAI con timeout (client condiviso)
+                llm = _get_chat_client("openai", model, temperature, openai_api_key)
                 # Se l'inizializzazione riesce, restituisci la configurazione
                 return {
                     "model_name": model, 
@@ -223,14 +705,10 @@ def get_llm_with_fallback(primary_model: str = DEFAULT_MODEL, temperature: float
                 continue
         
         # Prova Gemini
-        elif is_gemini and GEMINI_AVAILABLE and google_api_key and google_api_key.strip() != "":
+        elif is_gemini and GEMINI_AVAILABLE and google_api_key:
             try:
-                # Prova a inizializzare Gemini
-                llm = ChatGoogleGenerativeAI(
-                    model=model,
-                    temperature=temperature,
-                    google_api_key=google_api_key
-                )
+                # Prova a inizializzare Gemini (client condiviso)
+                llm = _get_chat_client("google", model, temperature, google_api_key)
                 return {
                     "model_name": model, 
                     "temperature": temperature, 
@@ -247,6 +725,79 @@ def get_llm_with_fallback(primary_model: str = DEFAULT_MODEL, temperature: float
     return None
 
 
+def _pick_model(prompt: str, model_name: str) -> str:
+    """
+    Sceglie il modello per un prompt in base alla sua lunghezza.
+    
+    Il routing si applica solo al modello di default: un modello scelto esplicitamente
+    (ai_model nel QMD) viene sempre rispettato, salvo REPORT_AI_FORCE_MODEL.
+    
+    Args:
+        prompt: Prompt da inviare all'LLM
+        model_name: Modello della configurazione corrente
+        
+    Returns:
+        Nome del modello da usare
+    """
+    forced = os.getenv("REPORT_AI_FORCE_MODEL")
+    if forced:
+        return forced
+    if LLM_SMALL_MODEL and model_name == DEFAULT_MODEL and len(prompt) < LLM_ROUTING_MAX_CHARS:
+        return LLM_SMALL_MODEL
+    return model_name
+
+
+def _route_llm_config(llm_config: Dict[str, Any], prompt: str) -> Dict[str, Any]:
+    """
+    Restituisce la configurazione LLM con il modello scelto da _pick_model.
+    
+    Il modello originale resta il primo fallback, quindi un modello instradato non
+    disponibile non peggiora il risultato rispetto a prima.
+    
+    Args:
+        llm_config: Configurazione LLM da get_llm_with_fallback()
+        prompt: Prompt da inviare all'LLM
+        
+    Returns:
+        Configurazione (eventualmente nuova) da usare per questo prompt
+    """
+    model_name = llm_config.get("model_name")
+    routed = _pick_model(prompt, model_name)
+    if routed == model_name or _circuit_state(routed) == "open":
+        return llm_config
+    
+    is_gemini = _is_gemini_model(routed)
+    provider = "google" if is_gemini else "openai"
+    api_key = _GOOGLE_API_KEY if is_gemini else _OPENAI_API_KEY
+    if not api_key or (is_gemini and not GEMINI_AVAILABLE):
+        return llm_config
+    try:
+        llm = _get_chat_client(provider, routed, llm_config.get("temperature", DEFAULT_TEMPERATURE), api_key)
+    except Exception as e:
+        logger.debug(f"Impossibile inizializzare il modello {routed}: {e}. Uso {model_name}.")
+        return llm_config
+    
+    fallback_models = [routed] + [m for m in llm_config.get("fallback_models", [model_name]) if m != routed]
+    if model_name not in fallback_models:
+        fallback_models.insert(1, model_name)
+    return {
+        **llm_config,
+        "model_name": routed,
+        "api_key": api_key,
+        "llm": llm,
+        "fallback_models": fallback_models,
+        "provider": provider
+    }
+
+
+def _is_context_length_error(error: BaseException) -> bool:
+    """Indica se il provider ha rifiutato il prompt perché supera la finestra di contesto del modello."""
+    if getattr(error, "code", None) == "context_length_exceeded":
+        return True
+    error_str = str(error).lower()
+    return "context length" in error_str or "maximum number of tokens" in error_str
+
+
 def _classify_llm_error(error: Exception) -> str:
     """
     Classifica un errore LLM per fornire un messaggio diagnostico accurato.
@@ -264,8 +815,12 @@ def _classify_llm_error(error: Exception) -> str:
     if isinstance(error, RateLimitError) or "rate limit" in error_str or "quota" in error_str:
         return "quota_esaurita"
     
+    # Prompt oltre la finestra di contesto del modello
+    if _is_context_length_error(error):
+        return "prompt_troppo_lungo"
+    
     # Timeout
-    if isinstance(error, FuturesTimeoutError) or "timeout" in error_str:
+    if isinstance(error, (FuturesTimeoutError, asyncio.TimeoutError)) or "timeout" in error_str:
         return "timeout"
     
     # Autenticazione / API key
@@ -295,15 +850,123 @@ def get_last_used_model() -> Optional[Dict[str, str]]:
     Returns:
         Dizionario con 'model_name' e 'provider', o None se nessun modello è stato utilizzato
     """
-    global _last_used_model, _last_used_provider
-    if _last_used_model is None:
+    last_used = _last_used
+    if last_used is None or last_used[0] is None:
         return None
     return {
-        "model_name": _last_used_model,
-        "provider": _last_used_provider or "unknown"
+        "model_name": last_used[0],
+        "provider": last_used[1] or "unknown"
     }
 
 
+# Stato dei circuit breaker: modello -> {"events": deque[(istante, successo)], "open_until": istante}
+_circuit: Dict[str, Dict[str, Any]] = {}
+_circuit_lock = threading.Lock()
+
+
+def _circuit_state(model_name: str) -> str:
+    """
+    Restituisce lo stato del circuit breaker di un modello senza modificarlo.
+    
+    A differenza di _circuit_is_open non concede la richiesta di prova: va usata per
+    ordinare o scegliere i modelli, non subito prima di invocarli.
+    
+    Args:
+        model_name: Nome del modello
+        
+    Returns:
+        'closed', 'open' (modello da saltare) o 'half_open' (prova consentita)
+    """
+    with _circuit_lock:
+        state = _circuit.get(model_name)
+        if state is None or not state["open_until"]:
+            return "closed"
+        return "open" if time.monotonic() < state["open_until"] else "half_open"
+
+
+def _circuit_is_open(model_name: str) -> bool:
+    """
+    Indica se il modello va saltato perché il suo circuit breaker è aperto.
+    
+    Scaduto CIRCUIT_OPEN_SECONDS passa una sola richiesta di prova (half-open): le altre
+    continuano a saltare il modello finché la prova non ne registra l'esito. La prova
+    viene consumata, quindi va chiamata solo subito prima di invocare il modello.
+    
+    Args:
+        model_name: Nome del modello
+        
+    Returns:
+        True se il modello va saltato
+    """
+    with _circuit_lock:
+        state = _circuit.get(model_name)
+        if state is None or not state["open_until"]:
+            return False
+        now = time.monotonic()
+        if now < state["open_until"]:
+            return True
+        state["open_until"] = now + CIRCUIT_OPEN_SECONDS
+        return False
+
+
+def _circuit_record(model_name: str, error: Optional[BaseException] = None) -> None:
+    """
+    Registra l'esito di una chiamata al modello e apre/chiude il suo circuit breaker.
+    
+    Le richieste rifiutate per il contenuto del prompt (BadRequestError) non dipendono
+    dal provider e non contano come fallimento.
+    
+    Args:
+        model_name: Nome del modello
+        error: Eccezione sollevata dalla chiamata, None se riuscita
+    """
+    if isinstance(error, BadRequestError):
+        return
+    success = error is None
+    with _circuit_lock:
+        state = _circuit.setdefault(model_name, {"events": deque(), "open_until": 0.0})
+        now = time.monotonic()
+        events = state["events"]
+        if state["open_until"]:
+            # Esito della richiesta di prova: chiude il circuito o lo riapre
+            if success:
+                events.clear()
+                state["open_until"] = 0.0
+                logger.info(f"Modello {model_name} di nuovo disponibile")
+            else:
+                state["open_until"] = now + CIRCUIT_OPEN_SECONDS
+            return
+        events.append((now, success))
+        while events[0][0] < now - CIRCUIT_WINDOW_SECONDS:
+            events.popleft()
+        failures = sum(1 for _, ok in events if not ok)
+        if len(events) >= CIRCUIT_MIN_CALLS and failures / len(events) > CIRCUIT_FAILURE_RATE:
+            state["open_until"] = now + CIRCUIT_OPEN_SECONDS
+            logger.warning(
+                f"Modello {model_name}: {failures}/{len(events)} chiamate fallite, "
+                f"escluso per {CIRCUIT_OPEN_SECONDS}s"
+            )
+
+
+def get_circuit_state() -> Dict[str, Dict[str, Any]]:
+    """
+    Restituisce lo stato dei circuit breaker per modello (es. per i metadati del report).
+    
+    Returns:
+        Dizionario modello -> {'open', 'calls', 'failures'} sulla finestra CIRCUIT_WINDOW_SECONDS
+    """
+    now = time.monotonic()
+    with _circuit_lock:
+        return {
+            model: {
+                "open": now < state["open_until"],
+                "calls": sum(1 for ts, _ in state["events"] if ts >= now - CIRCUIT_WINDOW_SECONDS),
+                "failures": sum(1 for ts, ok in state["events"] if ts >= now - CIRCUIT_WINDOW_SECONDS and not ok)
+            }
+            for model, state in _circuit.items()
+        }
+
+
 def get_ai_unavailable_message(reason: str = "unknown") -> str:
     """
     Restituisce un messaggio diagnostico per AI non disponibile basato sulla ragione.
@@ -317,6 +980,37 @@ def get_ai_unavailable_message(reason: str = "unknown") -> str:
     return _get_ai_unavailable_message(reason)
 
 
+def get_short_error(error: BaseException) -> str:
+    """
+    Restituisce una descrizione breve di un errore, adatta a essere mostrata nel report.
+    
+    Args:
+        error: Eccezione catturata
+        
+    Returns:
+        Stringa "NomeEccezione:codice" (o solo il nome se non c'è un codice)
+    """
+    return _short_err(error)
+
+
+def _short_err(error: BaseException) -> str:
+    """
+    Descrizione breve di un errore: tipo e codice, senza serializzare il messaggio.
+    
+    Gli errori dei client LLM possono includere nel messaggio l'intero corpo della
+    richiesta/risposta: nei log e nel report basta tipo + codice, il dettaglio completo
+    è disponibile a livello DEBUG.
+    
+    Args:
+        error: Eccezione catturata
+        
+    Returns:
+        Stringa "NomeEccezione:codice" (o solo il nome se non c'è un codice)
+    """
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return f"{type(error).__name__}:{code}" if code else type(error).__name__
+
+
 def _get_ai_unavailable_message(reason: str = "unknown") -> str:
     """
     Restituisce un messaggio diagnostico per AI non disponibile basato sulla ragione.
@@ -330,6 +1024,7 @@ def _get_ai_unavailable_message(reason: str = "unknown") -> str:
     messages = {
         "no_config": "Analisi AI non disponibile: API key non configurata. Configura OPENAI_API_KEY nel file .env per abilitare l'analisi AI.",
         "quota_esaurita": "Analisi AI non disponibile: quota esaurita per tutti i modelli disponibili. Riprova più tardi o verifica il tuo piano API.",
+        "prompt_troppo_lungo": "Analisi AI non disponibile: i dati inviati superano la dimensione massima accettata dal modello. Riduci LLM_MAX_PROMPT_TOKENS o il numero di colonne analizzate.",
         "timeout": "Analisi AI non disponibile: timeout durante la chiamata API. Verifica la connessione o aumenta LLM_API_TIMEOUT.",
         "auth_error": "Analisi AI non disponibile: errore di autenticazione. Verifica che OPENAI_API_KEY sia valida e non scaduta.",
         "model_not_found": "Analisi AI non disponibile: modello richiesto non trovato o non disponibile. Verifica il nome del modello configurato.",
@@ -341,20 +1036,150 @@ def _get_ai_unavailable_message(reason: str = "unknown") -> str:
     return messages.get(reason, messages["unknown"])
 
 
-def _extract_text_from_response(response: Any) -> str:
+# Connessione SQLite della cache LLM, aperta alla prima richiesta e condivisa tra i thread
+_llm_cache_db: Optional[sqlite3.Connection] = None
+_llm_cache_lock = threading.Lock()
+
+
+def _llm_cache_key(llm_config: Dict[str, Any], prompt: str) -> str:
     """
-    Estrae il testo da una risposta LLM, gestendo sia OpenAI (.content) che Gemini (.text).
-    
-    Secondo la documentazione LangChain:
-    - Gemini: response.text dovrebbe essere una stringa consolidata, response.content può essere lista di dizionari
-    - OpenAI: response.content è una stringa
+    Calcola la chiave di cache per una coppia (configurazione LLM, prompt).
     
     Args:
-        response: Risposta da LLM (OpenAI o Gemini) - oggetto AIMessage
+        llm_config: Configurazione LLM da get_llm_with_fallback()
+        prompt: Prompt da inviare all'LLM
+        
+    Returns:
+        SHA-256 esadecimale di (modello, temperatura, prompt)
+    """
+    key_source = "\0".join([
+        str(llm_config.get("model_name")),
+        str(llm_config.get("temperature", DEFAULT_TEMPERATURE)),
+        prompt
+    ])
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+
+def _get_llm_cache_db() -> Optional[sqlite3.Connection]:
+    """
+    Apre (una sola volta) il database SQLite della cache LLM.
+    
+    Usa il journal WAL, così più render paralleli possono leggere e scrivere la stessa
+    cache; all'apertura vengono eliminate le voci scadute.
+    
+    Returns:
+        Connessione SQLite, o None se la cache è disabilitata o non apribile
+    """
+    global _llm_cache_db, LLM_CACHE_ENABLED
+    
+    if _llm_cache_db is not None or not LLM_CACHE_ENABLED:
+        return _llm_cache_db
+    try:
+        LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(LLM_CACHE_DIR / LLM_CACHE_FILE, timeout=5, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, model_name TEXT, provider TEXT, created REAL NOT NULL, text TEXT NOT NULL)"
+        )
+        db.execute("DELETE FROM llm_cache WHERE created < ?", (time.time() - LLM_CACHE_TTL_SECONDS,))
+        db.commit()
+    except (OSError, sqlite3.Error) as e:
+        # La cache è solo un'ottimizzazione: se il database non è utilizzabile la si disattiva
+        logger.debug(f"Cache LLM non disponibile: {e}")
+        LLM_CACHE_ENABLED = False
+        return None
+    _llm_cache_db = db
+    return db
+
+
+def _get_cached_llm_response(llm_config: Dict[str, Any], prompt: str) -> Optional[str]:
+    """
+    Cerca nella cache su disco una risposta già ottenuta per lo stesso prompt e modello.
+    
+    Args:
+        llm_config: Configurazione LLM da get_llm_with_fallback()
+        prompt: Prompt da inviare all'LLM
+        
+    Returns:
+        Testo della risposta, o None se assente, scaduta o cache disabilitata
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _llm_cache_lock:
+        db = _get_llm_cache_db()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                "SELECT model_name, provider, text FROM llm_cache WHERE key = ? AND created >= ?",
+                (_llm_cache_key(llm_config, prompt), time.time() - LLM_CACHE_TTL_SECONDS)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.debug(f"Impossibile leggere la cache LLM: {e}")
+            return None
+    if row is None or not row[2]:
+        return None
+    
+    logger.debug(f"Risposta LLM dalla cache (modello: {row[0]})")
+    _set_last_used_model(row[0], row[1])
+    return row[2]
+
+
+def _store_llm_response(
+    llm_config: Dict[str, Any],
+    prompt: str,
+    text: str,
+    model_name: Optional[str],
+    provider: Optional[str]
+) -> None:
+    """
+    Salva una risposta LLM nella cache su disco.
+    
+    Args:
+        llm_config: Configurazione LLM usata per la richiesta
+        prompt: Prompt inviato
+        text: Testo della risposta
+        model_name: Modello che ha prodotto la risposta (può essere un fallback)
+        provider: Provider del modello
+    """
+    if not LLM_CACHE_ENABLED or not text or not text.strip():
+        return
+    with _llm_cache_lock:
+        db = _get_llm_cache_db()
+        if db is None:
+            return
+        try:
+            with db:
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model_name, provider, created, text) VALUES (?, ?, ?, ?, ?)",
+                    (_llm_cache_key(llm_config, prompt), model_name, provider, time.time(), text)
+                )
+        except sqlite3.Error as e:
+            # La cache è solo un'ottimizzazione: un errore di scrittura non blocca il report
+            logger.debug(f"Impossibile scrivere la cache LLM: {e}")
+
+
+def _extract_text_from_response(response: Any) -> str:
+    """
+    Estrae il testo da una risposta LLM, gestendo sia OpenAI (.content) che Gemini (.text).
+    
+    Secondo la documentazione LangChain:
+    - Gemini: response.text dovrebbe essere una stringa consolidata, response.content può essere lista di dizionari
+    - OpenAI: response.content è una stringa
+    
+    Args:
+        response: Risposta da LLM (OpenAI o Gemini) - oggetto AIMessage
         
     Returns:
         Testo estratto dalla risposta
     """
+    # hot path: AIMessage con content stringa (OpenAI, Gemini con risposta solo testo);
+    # in questo caso .text coincide con .content
+    content = getattr(response, 'content', None)
+    if type(content) is str:
+        return content
+    
     # Se la risposta stessa è una lista (caso anomalo)
     if isinstance(response, list):
         extracted = []
@@ -383,9 +1208,7 @@ def _extract_text_from_response(response: Any) -> str:
                     extracted.append(str(item))
             return ' '.join(extracted)
     
-    # Priorità 2: Fallback - usa response.content
-    content = getattr(response, 'content', None)
-    
+    # Priorità 2: Fallback - usa response.content (già letto sopra)
     # Se content è una lista di dizionari (formato Gemini: [{"type": "text", "text": "..."}])
     if isinstance(content, list):
         extracted = []
@@ -420,10 +1243,39 @@ def _extract_text_from_response(response: Any) -> str:
     return str(content) if content is not None else ""
 
 
+def _model_timeout(model_name: Optional[str]) -> int:
+    """
+    Restituisce il timeout (secondi) da usare per le chiamate a un modello.
+    
+    Args:
+        model_name: Nome del modello
+        
+    Returns:
+        Valore di LLM_TIMEOUT_<MODELLO> se impostato, altrimenti _MODEL_TIMEOUTS o API_TIMEOUT_SECONDS
+    """
+    if not model_name:
+        return API_TIMEOUT_SECONDS
+    env_name = "LLM_TIMEOUT_" + "".join(c if c.isalnum() else "_" for c in model_name.upper())
+    try:
+        return int(os.environ[env_name])
+    except (KeyError, ValueError):
+        return _MODEL_TIMEOUTS.get(model_name, API_TIMEOUT_SECONDS)
+
+
+# Thread per le chiamate sincrone con timeout, creati una volta per processo (non uno per chiamata)
+_llm_executor = ThreadPoolExecutor(max_workers=max(1, LLM_MAX_CONCURRENCY), thread_name_prefix="llm")
+atexit.register(_llm_executor.shutdown, wait=False, cancel_futures=True)
+
+
 def _invoke_with_timeout(llm: Any, messages: List[HumanMessage], timeout_seconds: int = API_TIMEOUT_SECONDS) -> Any:
     """
     Invoca LLM con timeout per evitare blocchi indefiniti.
     
+    Il timeout decorre da quando la chiamata parte su un thread di _llm_executor: dopo un
+    timeout il thread resta occupato fino alla fine della richiesta HTTP, e l'attesa in
+    coda che ne deriva non deve consumare il tempo delle chiamate successive. Anche
+    l'attesa in coda è comunque limitata a `timeout_seconds`.
+    
     Args:
         llm: Istanza LLM da invocare
         messages: Lista di messaggi da inviare
@@ -433,16 +1285,202 @@ def _invoke_with_timeout(llm: Any, messages: List[HumanMessage], timeout_seconds
         Risposta LLM
         
     Raises:
-        FuturesTimeoutError: Se la chiamata supera il timeout
+        FuturesTimeoutError: Se la chiamata (o l'attesa di un thread libero) supera il timeout
         Exception: Altri errori dalla chiamata LLM
     """
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        future = executor.submit(llm.invoke, messages)
-        try:
-            return future.result(timeout=timeout_seconds)
-        except FuturesTimeoutError:
-            logger.warning(f"Timeout dopo {timeout_seconds} secondi per la chiamata LLM")
-            raise
+    started = threading.Event()
+    
+    def _call() -> Any:
+        started.set()
+        return llm.invoke(messages)
+    
+    future = _llm_executor.submit(_call)
+    if not started.wait(timeout_seconds) and future.cancel():
+        logger.warning(f"Nessun thread libero per la chiamata LLM dopo {timeout_seconds} secondi")
+        raise FuturesTimeoutError()
+    try:
+        return future.result(timeout=timeout_seconds)
+    except FuturesTimeoutError:
+        # Il thread resta occupato fino alla fine della richiesta HTTP, ma il chiamante
+        # (che prima attendeva la chiusura dell'executor) prosegue subito con il fallback
+        future.cancel()
+        logger.warning(f"Timeout dopo {timeout_seconds} secondi per la chiamata LLM")
+        raise
+
+
+async def _ainvoke_with_timeout(llm: Any, messages: List[HumanMessage], timeout_seconds: int = API_TIMEOUT_SECONDS) -> Any:
+    """
+    Versione asincrona di _invoke_with_timeout: attende `llm.ainvoke` senza occupare thread.
+    
+    Args:
+        llm: Istanza LLM da invocare
+        messages: Lista di messaggi da inviare
+        timeout_seconds: Timeout in secondi (default: API_TIMEOUT_SECONDS)
+        
+    Returns:
+        Risposta LLM
+        
+    Raises:
+        asyncio.TimeoutError: Se la chiamata supera il timeout
+        Exception: Altri errori dalla chiamata LLM
+    """
+    try:
+        return await asyncio.wait_for(llm.ainvoke(messages), timeout=timeout_seconds)
+    except asyncio.TimeoutError:
+        logger.warning(f"Timeout dopo {timeout_seconds} secondi per la chiamata LLM")
+        raise
+
+
+# Limita le chiamate sincrone contemporanee verso il provider (celle/thread concorrenti)
+_llm_gate = threading.BoundedSemaphore(max(1, LLM_MAX_CONCURRENCY))
+
+
+def _is_retryable_error(error: BaseException) -> bool:
+    """
+    Indica se un errore è temporaneo e va ritentato sullo stesso modello.
+    
+    Si ritentano rate limit (429), errori di connessione ed errori 5xx; gli altri 4xx
+    non cambiano ripetendo la richiesta. La quota esaurita (code 'insufficient_quota')
+    arriva anch'essa come 429 ma non si risolve aspettando, così come un timeout già
+    costato il timeout del modello: in questi casi si passa subito ai modelli fallback.
+    """
+    if isinstance(error, RateLimitError):
+        return getattr(error, "code", None) != "insufficient_quota"
+    if isinstance(error, APITimeoutError):
+        return False
+    return isinstance(error, (APIConnectionError, InternalServerError))
+
+
+def _retry_after_seconds(error: BaseException) -> Optional[float]:
+    """
+    Legge l'header retry-after dalla risposta HTTP dell'errore, se presente.
+    
+    Args:
+        error: Eccezione sollevata dal client LLM
+        
+    Returns:
+        Secondi da attendere o None se l'header manca o non è numerico
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+if TENACITY_AVAILABLE:
+    _exponential_wait = wait_random_exponential(min=LLM_RETRY_MIN_WAIT, max=LLM_RETRY_MAX_WAIT)
+
+    def _wait_before_retry(retry_state: Any) -> float:
+        """Attesa tra i tentativi: retry-after del provider se presente, altrimenti backoff esponenziale."""
+        retry_after = _retry_after_seconds(retry_state.outcome.exception())
+        if retry_after is not None:
+            return min(retry_after, LLM_RETRY_MAX_WAIT)
+        return _exponential_wait(retry_state)
+
+    def _log_retry(retry_state: Any) -> None:
+        logger.warning(
+            f"Errore temporaneo {_short_err(retry_state.outcome.exception())} "
+            f"(tentativo {retry_state.attempt_number}/{LLM_RETRY_ATTEMPTS}), "
+            f"nuovo tentativo tra {retry_state.next_action.sleep:.1f}s"
+        )
+
+
+def _invoke_with_retry(llm: Any, messages: List[HumanMessage], timeout_seconds: int = API_TIMEOUT_SECONDS) -> Any:
+    """
+    Invoca LLM con timeout, concorrenza limitata e retry con backoff sugli errori temporanei.
+    
+    Ogni tentativo occupa uno slot di _llm_gate solo durante la chiamata (non durante
+    l'attesa); esauriti i tentativi l'errore viene rilanciato per attivare il fallback.
+    
+    Args:
+        llm: Istanza LLM da invocare
+        messages: Lista di messaggi da inviare
+        timeout_seconds: Timeout in secondi per ogni tentativo (default: API_TIMEOUT_SECONDS)
+        
+    Returns:
+        Risposta LLM
+    """
+    def _attempt() -> Any:
+        with _llm_gate:
+            return _invoke_with_timeout(llm, messages, timeout_seconds)
+
+    if not TENACITY_AVAILABLE or LLM_RETRY_ATTEMPTS <= 1:
+        return _attempt()
+    retrying = Retrying(
+        stop=stop_after_attempt(LLM_RETRY_ATTEMPTS),
+        wait=_wait_before_retry,
+        retry=retry_if_exception(_is_retryable_error),
+        before_sleep=_log_retry,
+        reraise=True
+    )
+    return retrying(_attempt)
+
+
+async def _ainvoke_with_retry(llm: Any, messages: List[HumanMessage], timeout_seconds: int = API_TIMEOUT_SECONDS) -> Any:
+    """
+    Versione asincrona di _invoke_with_retry (stessa politica di retry e backoff).
+    
+    La concorrenza delle chiamate asincrone è limitata da gather_analyses.
+    
+    Args:
+        llm: Istanza LLM da invocare
+        messages: Lista di messaggi da inviare
+        timeout_seconds: Timeout in secondi per ogni tentativo (default: API_TIMEOUT_SECONDS)
+        
+    Returns:
+        Risposta LLM
+    """
+    if not TENACITY_AVAILABLE or LLM_RETRY_ATTEMPTS <= 1:
+        return await _ainvoke_with_timeout(llm, messages, timeout_seconds)
+    retrying = AsyncRetrying(
+        stop=stop_after_attempt(LLM_RETRY_ATTEMPTS),
+        wait=_wait_before_retry,
+        retry=retry_if_exception(_is_retryable_error),
+        before_sleep=_log_retry,
+        reraise=True
+    )
+    return await retrying(_ainvoke_with_timeout, llm, messages, timeout_seconds)
+
+
+# Esito di una chiamata LLM senza cache: (risposta_llm, error_reason, (modello, provider)
+# che ha prodotto la risposta o None)
+_LLMOutcome = Tuple[Optional[str], Optional[str], Optional[Tuple[str, str]]]
+
+
+def _config_model(llm_config: Dict[str, Any]) -> Tuple[str, str]:
+    """Restituisce (modello, provider) di una configurazione LLM."""
+    return llm_config.get("model_name"), llm_config.get("provider", "openai")
+
+
+def _retry_shorter_prompt(llm_config: Dict[str, Any], prompt: str, error: BaseException) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Ripete una volta, sullo stesso modello, una richiesta rifiutata per prompt troppo lungo.
+    
+    I modelli di fallback rifiuterebbero lo stesso prompt: invece di passare a loro si
+    invia un prompt ridotto (senza contesto di dominio, metà dei token).
+    
+    Args:
+        llm_config: Configurazione LLM usata per la richiesta
+        prompt: Prompt rifiutato
+        error: Errore del provider
+        
+    Returns:
+        Tupla (risposta_llm, error_reason) come invoke_llm_with_fallback
+    """
+    model_name = llm_config.get("model_name")
+    shorter = _shrink_prompt(prompt, min(MAX_PROMPT_TOKENS, _estimate_tokens(prompt)) // 2)
+    logger.warning(f"Prompt troppo lungo per {model_name} ({_short_err(error)}): nuovo tentativo con prompt ridotto")
+    try:
+        response = _invoke_with_retry(llm_config["llm"], [HumanMessage(content=shorter)], _model_timeout(model_name))
+    except _LLM_ERRORS as e:
+        logger.warning(f"Errore con prompt ridotto per {model_name}: {_short_err(e)}")
+        logger.debug("Dettaglio errore LLM", exc_info=True)
+        return None, _classify_llm_error(e)
+    _circuit_record(model_name)
+    _set_last_used_model(model_name, llm_config.get("provider", "openai"))
+    return _extract_text_from_response(response), None
 
 
 def _try_fallback_models(
@@ -452,7 +1490,7 @@ def _try_fallback_models(
     temperature: float,
     openai_api_key: Optional[str],
     google_api_key: Optional[str]
-) -> Optional[str]:
+) -> Optional[Tuple[str, str, str]]:
     """
     Prova modelli fallback in sequenza.
     
@@ -465,64 +1503,100 @@ def _try_fallback_models(
         google_api_key: API key Google
         
     Returns:
-        Risposta LLM o None se tutti i modelli falliscono
+        Tupla (risposta_llm, modello, provider) del fallback riuscito, o None se tutti
+        i modelli falliscono
     """
-    global _last_used_model, _last_used_provider
-    
     # Prova modelli successivi nell'ordine specificato
     for model in fallback_models[current_index + 1:]:
+        if _circuit_is_open(model):
+            logger.debug(f"Modello fallback {model} escluso dal circuit breaker. Provo successivo.")
+            continue
         # Determina se è un modello OpenAI o Gemini
-        is_gemini = model == GEMINI_MODEL or model == GEMINI_FLASH_MODEL
+        is_gemini = _is_gemini_model(model)
         
         # Prova OpenAI
-        if not is_gemini and openai_api_key and openai_api_key.strip() != "":
+        if not is_gemini and openai_api_key:
             try:
                 logger.debug(f"Tentativo fallback con modello OpenAI: {model}")
-                llm = ChatOpenAI(
-                    model=model,
-                    temperature=temperature,
-                    api_key=openai_api_key,
-                    timeout=API_TIMEOUT_SECONDS
-                )
-                response = _invoke_with_timeout(llm, [HumanMessage(content=prompt)])
+                llm = _get_chat_client("openai", model, temperature, openai_api_key)
+                response = _invoke_with_retry(llm, [HumanMessage(content=prompt)], _model_timeout(model))
                 logger.info(f"Fallback riuscito con modello: {model}")
+                _circuit_record(model)
                 # Aggiorna tracking modello utilizzato
-                _last_used_model = model
-                _last_used_provider = "openai"
-                return _extract_text_from_response(response)
-            except (RateLimitError, FuturesTimeoutError) as e:
-                logger.debug(f"Errore con modello fallback {model}: {e}. Provo successivo.")
+                _set_last_used_model(model, "openai")
+                return _extract_text_from_response(response), model, "openai"
+            except _TRANSIENT_LLM_ERRORS as e:
+                _circuit_record(model, e)
+                logger.debug(f"Errore con modello fallback {model}: {_short_err(e)}. Provo successivo.")
                 continue
-            except Exception as e:
-                logger.debug(f"Errore generico con modello fallback {model}: {e}. Provo successivo.")
+            except _LLM_ERRORS as e:
+                _circuit_record(model, e)
+                logger.debug(f"Errore generico con modello fallback {model}: {_short_err(e)}. Provo successivo.")
                 continue
         
         # Prova Gemini
-        elif is_gemini and GEMINI_AVAILABLE and google_api_key and google_api_key.strip() != "":
+        elif is_gemini and GEMINI_AVAILABLE and google_api_key:
             try:
                 logger.debug(f"Tentativo fallback con Gemini: {model}")
-                llm = ChatGoogleGenerativeAI(
-                    model=model,
-                    temperature=temperature,
-                    google_api_key=google_api_key
-                )
-                response = _invoke_with_timeout(llm, [HumanMessage(content=prompt)])
+                llm = _get_chat_client("google", model, temperature, google_api_key)
+                response = _invoke_with_retry(llm, [HumanMessage(content=prompt)], _model_timeout(model))
                 logger.info(f"Fallback riuscito con Gemini: {model}")
+                _circuit_record(model)
                 # Aggiorna tracking modello utilizzato
-                _last_used_model = model
-                _last_used_provider = "google"
-                return _extract_text_from_response(response)
-            except Exception as e:
-                logger.debug(f"Errore con Gemini fallback {model}: {e}. Provo successivo.")
+                _set_last_used_model(model, "google")
+                return _extract_text_from_response(response), model, "google"
+            except _LLM_ERRORS as e:
+                _circuit_record(model, e)
+                logger.debug(f"Errore con Gemini fallback {model}: {_short_err(e)}. Provo successivo.")
                 continue
     
     return None
 
 
+# Richieste LLM in corso per chiave di cache: una richiesta identica a una già in corso
+# ne attende la risposta invece di ripetere la chiamata (singleflight)
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def _join_inflight(key: str) -> Tuple[Future, bool]:
+    """
+    Registra una richiesta in corso o si aggancia a quella identica già avviata.
+    
+    Args:
+        key: Chiave di cache della richiesta (vedi _llm_cache_key)
+        
+    Returns:
+        Tupla (future, leader): se leader è True il chiamante esegue la richiesta e
+        ne pubblica l'esito con _finish_inflight, altrimenti attende la future
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future, False
+        future = Future()
+        _inflight[key] = future
+        return future, True
+
+
+def _finish_inflight(key: str, future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+    """Pubblica l'esito di una richiesta in corso ai chiamanti in attesa e la rimuove dal registro."""
+    with _inflight_lock:
+        _inflight.pop(key, None)
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
 def invoke_llm_with_fallback(llm_config: Optional[Dict[str, Any]], prompt: str) -> Tuple[Optional[str], Optional[str]]:
     """
     Invoca LLM con fallback automatico se si verifica RateLimitError o timeout.
     
+    Le risposte vengono salvate in una cache su disco (vedi LLM_CACHE_DIR): rigenerare
+    il report con gli stessi dati non ripete le chiamate. Una richiesta identica a una
+    già in corso (es. da un altro thread) ne attende la risposta.
+    
     Args:
         llm_config: Configurazione LLM da get_llm_with_fallback()
         prompt: Prompt da inviare all'LLM
@@ -532,11 +1606,48 @@ def invoke_llm_with_fallback(llm_config: Optional[Dict[str, Any]], prompt: str)
         - risposta_llm: Risposta dell'LLM se successo, None altrimenti
         - error_reason: None se successo, altrimenti tipo di errore (per messaggi diagnostici)
     """
-    global _last_used_model, _last_used_provider
-    
     if llm_config is None:
         return None, "no_config"
     
+    prompt = _fit_prompt(prompt)
+    llm_config = _route_llm_config(llm_config, prompt)
+    cached = _get_cached_llm_response(llm_config, prompt)
+    if cached is not None:
+        return cached, None
+    
+    key = _llm_cache_key(llm_config, prompt)
+    future, leader = _join_inflight(key)
+    if not leader:
+        logger.debug("Richiesta LLM identica già in corso: attendo la sua risposta")
+        return future.result()
+    try:
+        result, error_reason, used = _invoke_llm_uncached(llm_config, prompt)
+        if result is not None and used is not None:
+            _store_llm_response(llm_config, prompt, result, *used)
+    except BaseException as e:
+        _finish_inflight(key, future, error=e)
+        raise
+    _finish_inflight(key, future, (result, error_reason))
+    return result, error_reason
+
+
+def _invoke_llm_uncached(llm_config: Optional[Dict[str, Any]], prompt: str) -> _LLMOutcome:
+    """
+    Invoca LLM con fallback automatico, senza passare dalla cache su disco.
+    
+    Args:
+        llm_config: Configurazione LLM da get_llm_with_fallback()
+        prompt: Prompt da inviare all'LLM
+        
+    Returns:
+        Tupla (risposta_llm, error_reason, modello_usato):
+        - risposta_llm: Risposta dell'LLM se successo, None altrimenti
+        - error_reason: None se successo, altrimenti tipo di errore (per messaggi diagnostici)
+        - modello_usato: (modello, provider) che ha prodotto la risposta, None se nessuno
+    """
+    if llm_config is None:
+        return None, "no_config", None
+    
     # Ottieni llm e lista di fallback
     llm = llm_config.get("llm")
     fallback_models = llm_config.get("fallback_models", [llm_config["model_name"]])
@@ -558,34 +1669,41 @@ def invoke_llm_with_fallback(llm_config: Optional[Dict[str, Any]], prompt: str)
     last_error_type = None
     try:
         logger.debug(f"Invio richiesta LLM con modello: {model_name}")
-        response = _invoke_with_timeout(llm, [HumanMessage(content=prompt)])
+        response = _invoke_with_retry(llm, [HumanMessage(content=prompt)], _model_timeout(model_name))
         logger.info(f"Chiamata LLM riuscita con modello: {model_name}")
+        _circuit_record(model_name)
         # Aggiorna tracking modello utilizzato
-        _last_used_model = model_name
-        _last_used_provider = provider
-        return _extract_text_from_response(response), None
-    except (RateLimitError, FuturesTimeoutError) as e:
-        # Se quota esaurita o timeout, prova fallback
+        _set_last_used_model(model_name, provider)
+        return _extract_text_from_response(response), None, (model_name, provider)
+    except _TRANSIENT_LLM_ERRORS as e:
+        # Se quota esaurita, errore di rete o timeout, prova fallback
+        _circuit_record(model_name, e)
         last_error = e
         last_error_type = _classify_llm_error(e)
-        logger.warning(f"Errore con modello {model_name}: {e}. Tentativo fallback.")
+        logger.warning(f"Errore con modello {model_name}: {_short_err(e)}. Tentativo fallback.")
+        logger.debug("Dettaglio errore LLM", exc_info=True)
         result = _try_fallback_models(
             fallback_models,
             current_model_index,
             prompt,
             temperature,
-            os.getenv("OPENAI_API_KEY"),
-            os.getenv("GOOGLE_API_KEY")
+            _OPENAI_API_KEY,
+            _GOOGLE_API_KEY
         )
         if result is not None:
-            return result, None
+            return result[0], None, result[1:]
         # Se fallback fallisce, restituisci l'errore originale
-        return None, last_error_type
-    except Exception as e:
-        # Altri errori: se è OpenAI, prova fallback; se è già Gemini, restituisci None
+        return None, last_error_type, None
+    except _LLM_ERRORS as e:
+        if _is_context_length_error(e):
+            text, error_reason = _retry_shorter_prompt(llm_config, prompt, e)
+            return text, error_reason, _config_model(llm_config) if text is not None else None
+        # Altri errori del provider: se è OpenAI, prova fallback; se è già Gemini, restituisci None
+        _circuit_record(model_name, e)
         last_error = e
         last_error_type = _classify_llm_error(e)
-        logger.warning(f"Errore generico con modello {model_name}: {e}")
+        logger.warning(f"Errore generico con modello {model_name}: {_short_err(e)}")
+        logger.debug("Dettaglio errore LLM", exc_info=True)
         if provider == "openai":
             logger.info("Tentativo fallback per errore OpenAI")
             result = _try_fallback_models(
@@ -593,102 +1711,293 @@ def invoke_llm_with_fallback(llm_config: Optional[Dict[str, Any]], prompt: str)
                 current_model_index,
                 prompt,
                 temperature,
-                os.getenv("OPENAI_API_KEY"),
-                os.getenv("GOOGLE_API_KEY")
+                _OPENAI_API_KEY,
+                _GOOGLE_API_KEY
             )
             if result is not None:
-                return result, None
+                return result[0], None, result[1:]
         logger.error(f"Errore con {provider}, nessun fallback disponibile")
-        return None, last_error_type
+        return None, last_error_type, None
 
 
-def analyze_data_summary(df: pd.DataFrame, field_name: Optional[str] = None) -> str:
+async def ainvoke_llm_with_fallback(llm_config: Optional[Dict[str, Any]], prompt: str) -> Tuple[Optional[str], Optional[str]]:
     """
-    Genera un riassunto analitico dei dati usando AI.
+    Versione asincrona di invoke_llm_with_fallback basata su `llm.ainvoke`.
+    
+    La chiamata al modello principale non occupa thread: più analisi possono attendere
+    la rete contemporaneamente (vedi gather_analyses). I modelli di fallback, usati
+    solo in caso di errore, riusano il percorso sincrono in un thread separato.
     
     Args:
-        df: DataFrame da analizzare
-        field_name: Nome del campo specifico da analizzare (opzionale)
+        llm_config: Configurazione LLM da get_llm_with_fallback()
+        prompt: Prompt da inviare all'LLM
         
     Returns:
-        Riassunto generato dall'AI, o messaggio di errore se AI non disponibile
+        Tupla (risposta_llm, error_reason) come invoke_llm_with_fallback
     """
-    llm_config = get_llm_with_fallback()
     if llm_config is None:
-        return _get_ai_unavailable_message("no_config")
+        return None, "no_config"
     
+    prompt = _fit_prompt(prompt)
+    llm_config = _route_llm_config(llm_config, prompt)
+    cached = _get_cached_llm_response(llm_config, prompt)
+    if cached is not None:
+        return cached, None
+    
+    key = _llm_cache_key(llm_config, prompt)
+    future, leader = _join_inflight(key)
+    if not leader:
+        logger.debug("Richiesta LLM identica già in corso: attendo la sua risposta")
+        return await asyncio.wrap_future(future)
     try:
-        # Prepara statistiche descrittive
-        stats = df.describe().to_string()
-        shape_info = f"Shape: {df.shape}\nColonne: {', '.join(df.columns.tolist())}"
-        
-        # Controlla se sono dati Lucy
-        is_lucy_data = 'datetime_sent' in df.columns or 'method_pred' in df.columns
-        
-        if is_lucy_data:
-            # Analisi specifica per dati Lucy
-            validated_count = df['is_validated'].sum() if 'is_validated' in df.columns else 0
-            total_count = len(df)
-            methods = df['method_pred'].value_counts().to_string() if 'method_pred' in df.columns else "N/A"
-            
-            # Aggiungi informazioni su field_name se specificato
-            field_context = ""
-            if field_name:
-                field_context = f"\n\nAnalisi specifica per il campo: **{field_name}**\n"
-                field_count = len(df[df['field_name'] == field_name]) if 'field_name' in df.columns else 0
-                field_validated = len(df[(df['field_name'] == field_name) & (df['is_validated'])]) if 'field_name' in df.columns else 0
-                field_context += f"Record totali per questo campo: {field_count}\n"
-                pct_validated = calculate_percentage(field_validated, field_count, decimal_places=1)
-                field_context += f"Record validati per questo campo: {field_validated} ({pct_validated:.1f}%)\n"
-            elif 'field_name' in df.columns:
-                field_names = df['field_name'].value_counts().to_string()
-                field_context = f"\n\nDistribuzione campi (field_name):\n{field_names}\n"
-            
-            # Aggiorna il contesto per menzionare tutti i campi, non solo id_subject
-            field_description = f"tutti i campi indicati in field_name" if 'field_name' in df.columns else "informazioni dalle fatture"
-            
-            # Carica contesto rilevante dalla cartella context
-            context_text = ""
-            if CONTEXT_LOADER_AVAILABLE:
-                context_text = get_context_for_analysis('data_summary', field_name)
-                if context_text:
-                    context_text = f"\n\n=== CONTESTO DI DOMINIO E DOCUMENTAZIONE ===\n{context_text}\n"
-            
-            prompt = f"""Analizza i seguenti dati di riconoscimento documentale (fatture) e fornisci un riassunto analitico conciso usando markdown.
+        result, error_reason, used = await _ainvoke_llm_uncached(llm_config, prompt)
+        if result is not None and used is not None:
+            _store_llm_response(llm_config, prompt, result, *used)
+    except BaseException as e:
+        _finish_inflight(key, future, error=e)
+        raise
+    _finish_inflight(key, future, (result, error_reason))
+    return result, error_reason
 
-Contesto: Dati di un sistema di riconoscimento automatico di informazioni da fatture. Il sistema estrae {field_description}. I dati includono predizioni di vari algoritmi e validazioni umane.{field_context}{context_text}
 
-{shape_info}
+async def _ainvoke_llm_uncached(llm_config: Dict[str, Any], prompt: str) -> _LLMOutcome:
+    """
+    Versione asincrona di _invoke_llm_uncached (senza cache su disco).
+    
+    Args:
+        llm_config: Configurazione LLM già instradata da _route_llm_config
+        prompt: Prompt da inviare all'LLM
+        
+    Returns:
+        Tupla (risposta_llm, error_reason) come invoke_llm_with_fallback
+    """
+    llm = llm_config.get("llm")
+    provider = llm_config.get("provider", "openai")
+    model_name = llm_config.get("model_name")
+    fallback_models = list(llm_config.get("fallback_models", [model_name]))
+    if model_name not in fallback_models:
+        fallback_models.insert(0, model_name)
+    current_model_index = fallback_models.index(model_name)
+    
+    try:
+        logger.debug(f"Invio richiesta LLM asincrona con modello: {model_name}")
+        response = await _ainvoke_with_retry(llm, [HumanMessage(content=prompt)], _model_timeout(model_name))
+        logger.info(f"Chiamata LLM riuscita con modello: {model_name}")
+        _circuit_record(model_name)
+        _set_last_used_model(model_name, provider)
+        return _extract_text_from_response(response), None, (model_name, provider)
+    except _LLM_ERRORS as e:
+        if _is_context_length_error(e):
+            text, error_reason = await asyncio.to_thread(_retry_shorter_prompt, llm_config, prompt, e)
+            return text, error_reason, _config_model(llm_config) if text is not None else None
+        _circuit_record(model_name, e)
+        error_type = _classify_llm_error(e)
+        retryable = isinstance(e, _TRANSIENT_LLM_ERRORS)
+        logger.warning(f"Errore con modello {model_name}: {_short_err(e)}. Tentativo fallback.")
+        logger.debug("Dettaglio errore LLM", exc_info=True)
+        if retryable or provider == "openai":
+            result = await asyncio.to_thread(
+                _try_fallback_models,
+                fallback_models,
+                current_model_index,
+                prompt,
+                llm_config.get("temperature", DEFAULT_TEMPERATURE),
+                _OPENAI_API_KEY,
+                _GOOGLE_API_KEY
+            )
+            if result is not None:
+                return result[0], None, result[1:]
+        return None, error_type, None
 
-Statistiche descrittive:
-{stats}
 
-Dati validati: {validated_count} su {total_count} ({calculate_percentage(validated_count, total_count, decimal_places=1):.1f}%)
+def stream_llm_with_fallback(llm_config: Optional[Dict[str, Any]], prompt: str) -> Iterator[str]:
+    """
+    Invoca LLM in streaming, restituendo il testo man mano che arriva.
+    
+    Riduce il tempo al primo token rispetto a invoke_llm_with_fallback. Se il modello
+    principale fallisce prima di aver prodotto testo si passa ai modelli di fallback
+    (risposta restituita in un unico blocco); un errore a metà stream interrompe il testo.
+    
+    Args:
+        llm_config: Configurazione LLM da get_llm_with_fallback()
+        prompt: Prompt da inviare all'LLM
+        
+    Yields:
+        Frammenti di testo della risposta (nessuno se l'LLM non è disponibile)
+    """
+    if llm_config is None:
+        return
+    
+    prompt = _fit_prompt(prompt)
+    llm_config = _route_llm_config(llm_config, prompt)
+    cached = _get_cached_llm_response(llm_config, prompt)
+    if cached is not None:
+        yield cached
+        return
+    
+    model_name = llm_config.get("model_name")
+    parts: List[str] = []
+    try:
+        logger.debug(f"Invio richiesta LLM in streaming con modello: {model_name}")
+        for chunk in llm_config["llm"].stream([HumanMessage(content=prompt)]):
+            text = _extract_text_from_response(chunk)
+            if text:
+                parts.append(text)
+                yield text
+    except _LLM_ERRORS as e:
+        if _is_context_length_error(e) and not parts:
+            result, _ = _retry_shorter_prompt(llm_config, prompt, e)
+            if result:
+                _store_llm_response(llm_config, prompt, result, *_config_model(llm_config))
+                yield result
+            return
+        _circuit_record(model_name, e)
+        if parts:
+            logger.warning(f"Streaming interrotto con modello {model_name}: {_short_err(e)}")
+            logger.debug("Dettaglio errore LLM", exc_info=True)
+            return
+        logger.warning(f"Errore con modello {model_name}: {_short_err(e)}. Tentativo fallback.")
+        logger.debug("Dettaglio errore LLM", exc_info=True)
+        fallback_models = list(llm_config.get("fallback_models", [model_name]))
+        if model_name not in fallback_models:
+            fallback_models.insert(0, model_name)
+        result = _try_fallback_models(
+            fallback_models,
+            fallback_models.index(model_name),
+            prompt,
+            llm_config.get("temperature", DEFAULT_TEMPERATURE),
+            _OPENAI_API_KEY,
+            _GOOGLE_API_KEY
+        )
+        if result is not None and result[0]:
+            text, used_model, used_provider = result
+            _store_llm_response(llm_config, prompt, text, used_model, used_provider)
+            yield text
+        return
+    
+    logger.info(f"Chiamata LLM in streaming riuscita con modello: {model_name}")
+    _circuit_record(model_name)
+    _set_last_used_model(*_config_model(llm_config))
+    _store_llm_response(llm_config, prompt, "".join(parts), *_config_model(llm_config))
 
-Distribuzione metodi:
-{methods}
 
-Fornisci un'analisi strutturata che evidenzi:
-1. Volume e copertura dei dati (quanti record validati vs totali)
-2. Performance generale dei metodi di riconoscimento
-3. Osservazioni rilevanti sul sistema di validazione
+PromptResult = Union[str, Tuple[Optional[str], Optional[str]]]
 
-Formattazione richiesta:
-- Usa *corsivo* per nomi di metodi (es. *azure_model*, *query-vat_number*), termini tecnici (es. *fallback*, *ensemble*), e nomi di sistemi
-- Usa elenchi puntati quando appropriato per organizzare informazioni
-- Mantieni paragrafi brevi e leggibili
-- Evita muri di testo: struttura il contenuto in modo chiaro
 
-IMPORTANTE: Usa markdown per la formattazione (elenchi, corsivo, grassetto quando necessario).
-"""
-        else:
-            prompt = f"""Analizza i seguenti dati e fornisci un riassunto analitico conciso usando markdown.
-        
-{shape_info}
+def _llm_result(result: Optional[str], error_reason: Optional[str], report_errors: bool) -> Optional[str]:
+    """Restituisce il testo dell'LLM o, se vuoto, il messaggio di errore / None."""
+    if result and result.strip():
+        return result
+    return _get_ai_unavailable_message(error_reason or "unknown") if report_errors else None
+
+
+def _with_llm(report_errors: bool = False) -> Callable[[Callable[..., PromptResult]], Callable[..., Optional[str]]]:
+    """
+    Decoratore per le analisi AI: la funzione decorata costruisce solo il prompt.
+    
+    Inizializzazione LLM, invocazione con fallback/cache e gestione del risultato vuoto
+    sono centralizzate qui. La funzione decorata può restituire il prompt oppure una tupla
+    (prompt, messaggio): con prompt None il messaggio viene restituito senza chiamare l'LLM.
+    
+    Args:
+        report_errors: Se True, LLM non configurato, errori e risposte vuote diventano un
+            messaggio diagnostico (_get_ai_unavailable_message); altrimenti None
+            (e le eccezioni vengono propagate)
+        
+    Returns:
+        Decoratore
+    """
+    def decorator(build_prompt: Callable[..., PromptResult]) -> Callable[..., Optional[str]]:
+        @wraps(build_prompt)
+        def wrapper(*args: Any, **kwargs: Any) -> Optional[str]:
+            llm_config = get_llm_with_fallback()
+            if llm_config is None:
+                return _get_ai_unavailable_message("no_config") if report_errors else None
+            try:
+                prompt = build_prompt(*args, **kwargs)
+                if isinstance(prompt, tuple):
+                    prompt, message = prompt
+                    if prompt is None:
+                        return message
+                result, error_reason = invoke_llm_with_fallback(llm_config, prompt)
+                return _llm_result(result, error_reason, report_errors)
+            except Exception as e:
+                if not report_errors:
+                    raise
+                return _get_ai_unavailable_message(_classify_llm_error(e))
+        return wrapper
+    return decorator
+
+
+def _with_llm_async(report_errors: bool = False) -> Callable[[Callable[..., PromptResult]], Callable[..., Awaitable[Optional[str]]]]:
+    """
+    Come _with_llm, ma la funzione risultante è una coroutine basata su ainvoke_llm_with_fallback.
+    
+    Args:
+        report_errors: Vedi _with_llm
+        
+    Returns:
+        Decoratore
+    """
+    def decorator(build_prompt: Callable[..., PromptResult]) -> Callable[..., Awaitable[Optional[str]]]:
+        @wraps(build_prompt)
+        async def wrapper(*args: Any, **kwargs: Any) -> Optional[str]:
+            llm_config = get_llm_with_fallback()
+            if llm_config is None:
+                return _get_ai_unavailable_message("no_config") if report_errors else None
+            try:
+                prompt = build_prompt(*args, **kwargs)
+                if isinstance(prompt, tuple):
+                    prompt, message = prompt
+                    if prompt is None:
+                        return message
+                result, error_reason = await ainvoke_llm_with_fallback(llm_config, prompt)
+                return _llm_result(result, error_reason, report_errors)
+            except Exception as e:
+                if not report_errors:
+                    raise
+                return _get_ai_unavailable_message(_classify_llm_error(e))
+        return wrapper
+    return decorator
+
+
+# Template dei prompt: il testo invariante è definito una sola volta a livello di modulo
+# e ogni chiamata esegue solo la sostituzione dei valori (str.format).
+# Ordine: istruzioni fisse -> contesto di dominio -> dati della chiamata. Il prefisso
+# resta identico byte per byte tra le chiamate dello stesso tipo, così il prompt caching
+# dei provider (OpenAI/Gemini) lo riusa e fattura solo la parte variabile.
+_DATA_SUMMARY_PROMPT_LUCY = """Analizza i dati di riconoscimento documentale (fatture) riportati in fondo e fornisci un riassunto analitico conciso usando markdown.
+
+Fornisci un'analisi strutturata che evidenzi:
+1. Volume e copertura dei dati (quanti record validati vs totali)
+2. Performance generale dei metodi di riconoscimento
+3. Osservazioni rilevanti sul sistema di validazione
+
+Formattazione richiesta:
+- Usa *corsivo* per nomi di metodi (es. *azure_model*, *query-vat_number*), termini tecnici (es. *fallback*, *ensemble*), e nomi di sistemi
+- Usa elenchi puntati quando appropriato per organizzare informazioni
+- Mantieni paragrafi brevi e leggibili
+- Evita muri di testo: struttura il contenuto in modo chiaro
+
+IMPORTANTE: Usa markdown per la formattazione (elenchi, corsivo, grassetto quando necessario).
+
+Contesto: Dati di un sistema di riconoscimento automatico di informazioni da fatture. Il sistema estrae {field_description}. I dati includono predizioni di vari algoritmi e validazioni umane.{context_text}
+
+=== DATI DA ANALIZZARE ==={field_context}
+
+{shape_info}
 
 Statistiche descrittive:
 {stats}
 
+Dati validati: {validated_count} su {total_count} ({validated_pct:.1f}%)
+
+Distribuzione metodi:
+{methods}
+"""
+
+_DATA_SUMMARY_PROMPT = """Analizza i dati riportati in fondo e fornisci un riassunto analitico conciso usando markdown.
+
 Fornisci un'analisi strutturata che evidenzi:
 1. Caratteristiche principali dei dati
 2. Pattern o tendenze evidenti
@@ -701,215 +2010,811 @@ Formattazione richiesta:
 - Evita muri di testo: struttura il contenuto in modo chiaro
 
 IMPORTANTE: Usa markdown per la formattazione (elenchi, corsivo, grassetto quando necessario).
+
+=== DATI DA ANALIZZARE ===
+
+{shape_info}
+
+Statistiche descrittive:
+{stats}
+"""
+
+_CHART_COMMENTARY_PROMPT = """Genera un commento analitico professionale per il grafico descritto in fondo usando markdown.
+
+Il commento deve:
+1. Iniziare con 1-2 paragrafi che descrivono i pattern principali osservati
+2. Includere una sezione "Punti di interesse/anomalie" con elenco puntato quando applicabile
+3. Includere una sezione "Raccomandazioni operative" con elenco puntato quando applicabile
+
+Formattazione richiesta:
+- Usa *corsivo* per nomi di metodi (es. *azure_model*, *query-vat_number*), termini tecnici (es. *fallback*, *ensemble*, *routing*, *A/B test*), e nomi di sistemi/funzionalità
+- Usa elenchi puntati per organizzare informazioni multiple (punti chiave, anomalie, raccomandazioni)
+- Mantieni paragrafi brevi e leggibili
+- Evita muri di testo: struttura il contenuto in sezioni chiare
+- Usa grassetto (**testo**) per enfatizzare concetti importanti quando necessario
+
+IMPORTANTE: Usa markdown per la formattazione (elenchi, corsivo, grassetto quando necessario). Struttura il commento in modo leggibile con paragrafi brevi e elenchi quando appropriato.{domain_context}{context_text}
+
+=== GRAFICO DA COMMENTARE ==={field_context}
+
+Tipo di grafico: {chart_description}
+
+Dati visualizzati:
+{chart_data_summary}
+"""
+
+_ERROR_PATTERNS_PROMPT = """Analizza i pattern di errore riportati in fondo, relativi a un sistema di riconoscimento documentale, e fornisci un'analisi concisa usando markdown.
+
+Fornisci un'analisi strutturata che:
+1. Identifichi quali metodi hanno più problemi (FP o FN)
+2. Analizzi se la confidence è correlata agli errori
+3. Suggerisca possibili miglioramenti o aree di attenzione
+
+Formattazione richiesta:
+- Usa *corsivo* per nomi di metodi (es. *azure_model*, *query-vat_number*), termini tecnici (es. *fallback*, *ensemble*, *routing*), e nomi di sistemi
+- Usa elenchi puntati per organizzare punti chiave, anomalie e raccomandazioni
+- Mantieni paragrafi brevi e leggibili
+- Evita muri di testo: struttura il contenuto in sezioni chiare
+- Usa grassetto (**testo**) per enfatizzare concetti importanti quando necessario
+
+IMPORTANTE: Usa markdown per la formattazione (elenchi, corsivo, grassetto quando necessario). Struttura il commento in modo leggibile con paragrafi brevi e elenchi quando appropriato.
+
+Contesto: Sistema di riconoscimento automatico di informazioni da fatture. False Positive (FP) = predetto positivo ma reale negativo. False Negative (FN) = predetto negativo ma reale positivo.{context_text}
+
+=== ERRORI DA ANALIZZARE ==={field_context}
+
+False Positive per metodo:
+{fp_by_method}
+
+False Negative per metodo:
+{fn_by_method}
+
+Confidence media FP: {fp_conf_str}
+Confidence media FN: {fn_conf_str}
+"""
+
+_SECTION_TEXT_PROMPT = """Scrivi una sezione di report professionale (2-3 paragrafi) sull'argomento indicato in fondo.
+
+Il testo dovrebbe essere:
+- Professionale e chiaro
+- Basato sui dati forniti
+- Strutturato logicamente
+
+IMPORTANTE: Scrivi solo testo normale, senza asterischi, cancelletto o altri simboli di formattazione markdown.{context_text}
+
+Argomento: {section_topic}
+
+Contesto dati:
+{data_context}
 """
+
+
+def _observed_counts(series: pd.Series) -> pd.Series:
+    """
+    Conta i valori di una colonna escludendo quelli assenti.
+    
+    Su un sottoinsieme di una colonna categoriale value_counts() elenca anche le categorie
+    inutilizzate (conteggio 0), che non devono finire nel prompt.
+    
+    Args:
+        series: Colonna da contare
         
-        # Usa la funzione con fallback automatico
-        result, error_reason = invoke_llm_with_fallback(llm_config, prompt)
-        if result is not None and result.strip():
-            return result
-        else:
-            return _get_ai_unavailable_message(error_reason or "unknown")
-    except Exception as e:
-        # Se c'è un errore durante l'inizializzazione, classifica l'errore
-        error_type = _classify_llm_error(e)
-        return _get_ai_unavailable_message(error_type)
+    Returns:
+        Conteggi in ordine decrescente dei soli valori presenti
+    """
+    counts = series.value_counts()
+    return counts[counts > 0]
 
 
-def generate_chart_commentary(
+def _build_data_summary_prompt(df: pd.DataFrame, field_name: Optional[str] = None, ctx: Optional[ReportContext] = None) -> str:
+    """
+    Costruisce il prompt per il riassunto analitico dei dati.
+    
+    Args:
+        df: DataFrame da analizzare
+        field_name: Nome del campo specifico da analizzare (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Returns:
+        Prompt da inviare all'LLM
+    """
+    # Insieme delle colonne costruito una volta: lookup O(1) per i controlli successivi
+    cols = frozenset(df.columns)
+    
+    # Prepara statistiche descrittive
+    stats = _cached_summary(df, 'describe', lambda: _compact_stats(df))
+    shape_info = f"Shape: {df.shape}\nColonne: {', '.join(df.columns.tolist())}"
+    
+    # Controlla se sono dati Lucy
+    is_lucy_data = 'datetime_sent' in cols or 'method_pred' in cols
+    
+    if is_lucy_data:
+        # Analisi specifica per dati Lucy
+        validated_count = _cached_summary(df, 'validated_count', lambda: df['is_validated'].sum()) if 'is_validated' in cols else 0
+        total_count = len(df)
+        methods = _cached_summary(df, 'methods', lambda: _compact(_observed_counts(df['method_pred']))) if 'method_pred' in cols else "N/A"
+        
+        # Aggiungi informazioni su field_name se specificato
+        field_context = ""
+        if field_name:
+            field_context = f"\n\nAnalisi specifica per il campo: **{field_name}**\n"
+            field_count, field_validated = _field_stats(df, field_name) if 'field_name' in cols else (0, 0)
+            field_context += f"Record totali per questo campo: {field_count}\n"
+            pct_validated = calculate_percentage(field_validated, field_count, decimal_places=1)
+            field_context += f"Record validati per questo campo: {field_validated} ({pct_validated:.1f}%)\n"
+        elif 'field_name' in cols:
+            field_names = _cached_summary(df, 'field_names', lambda: _compact(_observed_counts(df['field_name'])))
+            field_context = f"\n\nDistribuzione campi (field_name):\n{field_names}\n"
+        
+        # Aggiorna il contesto per menzionare tutti i campi, non solo id_subject
+        field_description = f"tutti i campi indicati in field_name" if 'field_name' in cols else "informazioni dalle fatture"
+        
+        # Carica contesto rilevante dalla cartella context (o dal contesto del report)
+        context_text = _context_block('data_summary', field_name, ctx)
+        
+        validated_pct = calculate_percentage(validated_count, total_count, decimal_places=1)
+        prompt = _DATA_SUMMARY_PROMPT_LUCY.format(
+            field_description=field_description,
+            field_context=field_context,
+            context_text=context_text,
+            shape_info=shape_info,
+            stats=stats,
+            validated_count=validated_count,
+            total_count=total_count,
+            validated_pct=validated_pct,
+            methods=methods
+        )
+    else:
+        prompt = _DATA_SUMMARY_PROMPT.format(
+            shape_info=shape_info,
+            stats=stats
+        )
+    
+    return prompt
+
+
+@_with_llm(report_errors=True)
+def analyze_data_summary(df: pd.DataFrame, field_name: Optional[str] = None, ctx: Optional[ReportContext] = None) -> str:
+    """
+    Genera un riassunto analitico dei dati usando AI.
+    
+    Args:
+        df: DataFrame da analizzare
+        field_name: Nome del campo specifico da analizzare (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Returns:
+        Riassunto generato dall'AI, o messaggio di errore se AI non disponibile
+    """
+    return _build_data_summary_prompt(df, field_name, ctx)
+
+
+def _build_chart_commentary_prompt(
     chart_description: str,
     chart_data_summary: str,
     domain: str = "general",
-    field_name: Optional[str] = None
-) -> Optional[str]:
+    field_name: Optional[str] = None,
+    ctx: Optional[ReportContext] = None
+) -> str:
     """
-    Genera un commento testuale per un grafico usando AI.
+    Costruisce il prompt per il commento a un grafico.
     
     Args:
         chart_description: Descrizione del tipo di grafico
         chart_data_summary: Riassunto dei dati visualizzati
         domain: Dominio dei dati ("document" per documentale, "general" per generale)
         field_name: Nome del campo specifico analizzato (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
         
     Returns:
-        Commento generato dall'AI in formato markdown, o None se AI non disponibile
+        Prompt da inviare all'LLM
     """
-    llm_config = get_llm_with_fallback()
-    if llm_config is None:
-        return None
-    
     domain_context = ""
     if domain == "document":
-        domain_context = "Contesto: Analisi di performance di algoritmi di riconoscimento documentale per fatture. "
+        domain_context = "\n\nContesto: Analisi di performance di algoritmi di riconoscimento documentale per fatture."
     
     field_context = ""
     if field_name:
         field_context = f"\n\nNota: Questo grafico mostra dati specifici per il campo **{field_name}**. "
     
-    # Carica contesto rilevante dalla cartella context
-    context_text = ""
-    if CONTEXT_LOADER_AVAILABLE:
-        context_text = get_context_for_analysis('chart_commentary', field_name)
-        if context_text:
-            context_text = f"\n\n=== CONTESTO DI DOMINIO E DOCUMENTAZIONE ===\n{context_text}\n"
+    # Carica contesto rilevante dalla cartella context (o dal contesto del report)
+    context_text = _context_block('chart_commentary', field_name, ctx)
     
-    prompt = f"""Genera un commento analitico professionale per il seguente grafico usando markdown.
-
-{domain_context}{field_context}{context_text}Tipo di grafico: {chart_description}
-
-Dati visualizzati:
-{chart_data_summary}
+    prompt = _CHART_COMMENTARY_PROMPT.format(
+        domain_context=domain_context,
+        field_context=field_context,
+        context_text=context_text,
+        chart_description=chart_description,
+        chart_data_summary=chart_data_summary
+    )
+    
+    return prompt
 
-Il commento deve:
-1. Iniziare con 1-2 paragrafi che descrivono i pattern principali osservati
-2. Includere una sezione "Punti di interesse/anomalie" con elenco puntato quando applicabile
-3. Includere una sezione "Raccomandazioni operative" con elenco puntato quando applicabile
 
-Formattazione richiesta:
-- Usa *corsivo* per nomi di metodi (es. *azure_model*, *query-vat_number*), termini tecnici (es. *fallback*, *ensemble*, *routing*, *A/B test*), e nomi di sistemi/funzionalità
-- Usa elenchi puntati per organizzare informazioni multiple (punti chiave, anomalie, raccomandazioni)
-- Mantieni paragrafi brevi e leggibili
-- Evita muri di testo: struttura il contenuto in sezioni chiare
-- Usa grassetto (**testo**) per enfatizzare concetti importanti quando necessario
-
-IMPORTANTE: Usa markdown per la formattazione (elenchi, corsivo, grassetto quando necessario). Struttura il commento in modo leggibile con paragrafi brevi e elenchi quando appropriato.
-"""
+@_with_llm()
+def generate_chart_commentary(
+    chart_description: str,
+    chart_data_summary: str,
+    domain: str = "general",
+    field_name: Optional[str] = None,
+    ctx: Optional[ReportContext] = None
+) -> Optional[str]:
+    """
+    Genera un commento testuale per un grafico usando AI.
     
-    # Usa la funzione con fallback automatico
-    result, _ = invoke_llm_with_fallback(llm_config, prompt)
-    # Verifica che il risultato non sia vuoto
-    if result and result.strip():
-        return result
-    return None
+    Args:
+        chart_description: Descrizione del tipo di grafico
+        chart_data_summary: Riassunto dei dati visualizzati
+        domain: Dominio dei dati ("document" per documentale, "general" per generale)
+        field_name: Nome del campo specifico analizzato (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Returns:
+        Commento generato dall'AI in formato markdown, o None se AI non disponibile
+    """
+    return _build_chart_commentary_prompt(chart_description, chart_data_summary, domain, field_name, ctx)
 
 
-def analyze_error_patterns(df: pd.DataFrame, field_name: Optional[str] = None) -> Optional[str]:
+def _summarize_errors(df: pd.DataFrame, field_name: Optional[str] = None) -> Dict[str, Any]:
     """
-    Analizza i pattern di errore nei dati Lucy.
+    Calcola i riassunti di FP/FN usati da analyze_error_patterns.
     
     Args:
         df: DataFrame con dati validati
         field_name: Nome del campo specifico da analizzare (opzionale)
         
     Returns:
-        Analisi dei pattern di errore, o None se AI non disponibile
+        Dizionario con 'validated_count', 'fp_by_method', 'fn_by_method', 'fp_conf_str', 'fn_conf_str'
     """
-    llm_config = get_llm_with_fallback()
-    if llm_config is None:
-        return None
-    
-    # Filtra per field_name se specificato
-    if field_name and 'field_name' in df.columns:
-        df = df[df['field_name'] == field_name].copy()
+    cols = frozenset(df.columns)
     
-    validated = df[df['is_validated']].copy() if 'is_validated' in df.columns else df
+    # Righe del campo dall'indice dei gruppi, poi filtro validati sulle sole colonne necessarie
+    rows = _field_rows(df, field_name) if field_name and 'field_name' in cols else df
+    has_confidence = 'confidence' in cols
+    columns = ['comparison', 'method_pred'] + (['confidence'] if has_confidence else [])
+    validated = rows.loc[rows['is_validated'], columns] if 'is_validated' in cols else rows[columns]
     
     if len(validated) == 0:
-        field_msg = f" per il campo {field_name}" if field_name else ""
-        return f"Nessun dato validato disponibile{field_msg} per l'analisi degli errori."
-    
-    # Analizza errori
-    fp_data = validated[validated['comparison'] == 'FP']
-    fn_data = validated[validated['comparison'] == 'FN']
-    
-    fp_by_method = fp_data['method_pred'].value_counts().to_string() if len(fp_data) > 0 else "Nessun FP"
-    fn_by_method = fn_data['method_pred'].value_counts().to_string() if len(fn_data) > 0 else "Nessun FN"
-    
-    fp_avg_confidence = fp_data['confidence'].mean() if 'confidence' in fp_data.columns and len(fp_data) > 0 else None
-    fn_avg_confidence = fn_data['confidence'].mean() if 'confidence' in fn_data.columns and len(fn_data) > 0 else None
+        return {'validated_count': 0}
+    
+    # Analizza errori: conteggi e confidence per (esito, metodo) in un'unica passata
+    aggregations = {'n': ('method_pred', 'size')}
+    if has_confidence:
+        aggregations['conf_sum'] = ('confidence', 'sum')
+        aggregations['conf_count'] = ('confidence', 'count')
+    # dropna=False: gli esiti senza metodo (es. FN senza predizione) contano per la confidence
+    grouped = validated.groupby(['comparison', 'method_pred'], sort=False, observed=True, dropna=False).agg(**aggregations)
+    outcomes = set(grouped.index.get_level_values('comparison'))
+    
+    def _outcome_summary(outcome: str, empty_label: str) -> Tuple[str, Optional[float]]:
+        if outcome not in outcomes:
+            return empty_label, None
+        part = grouped.xs(outcome, level='comparison')
+        counts = part['n'][part.index.notna()]
+        by_method = _compact(counts.sort_values(ascending=False, kind='stable').rename('count'))
+        if not has_confidence:
+            return by_method, None
+        conf_count = part['conf_count'].sum()
+        avg_confidence = part['conf_sum'].sum() / conf_count if conf_count > 0 else float('nan')
+        return by_method, avg_confidence
+    
+    fp_by_method, fp_avg_confidence = _outcome_summary('FP', "Nessun FP")
+    fn_by_method, fn_avg_confidence = _outcome_summary('FN', "Nessun FN")
     
     # Formatta confidence per la stringa
     fp_conf_str = f"{fp_avg_confidence:.3f}" if fp_avg_confidence is not None else 'N/A'
     fn_conf_str = f"{fn_avg_confidence:.3f}" if fn_avg_confidence is not None else 'N/A'
     
+    return {
+        'validated_count': len(validated),
+        'fp_by_method': fp_by_method,
+        'fn_by_method': fn_by_method,
+        'fp_conf_str': fp_conf_str,
+        'fn_conf_str': fn_conf_str
+    }
+
+
+def _build_error_patterns_prompt(df: pd.DataFrame, field_name: Optional[str] = None, ctx: Optional[ReportContext] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Costruisce il prompt per l'analisi dei pattern di errore.
+    
+    Args:
+        df: DataFrame con dati validati
+        field_name: Nome del campo specifico da analizzare (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Returns:
+        Tupla (prompt, messaggio): se non ci sono dati validati il prompt è None e il
+        messaggio va restituito direttamente all'utente
+    """
+    summary = _cached_summary(df, ('error_patterns', field_name), lambda: _summarize_errors(df, field_name))
+    
+    if summary['validated_count'] == 0:
+        field_msg = f" per il campo {field_name}" if field_name else ""
+        return None, f"Nessun dato validato disponibile{field_msg} per l'analisi degli errori."
+    
+    fp_by_method = summary['fp_by_method']
+    fn_by_method = summary['fn_by_method']
+    fp_conf_str = summary['fp_conf_str']
+    fn_conf_str = summary['fn_conf_str']
+    
     field_context = ""
     if field_name:
         field_context = f"\n\nAnalisi specifica per il campo: **{field_name}**\n"
-        field_total = len(validated)
+        field_total = summary['validated_count']
         field_context += f"Record validati per questo campo: {field_total}\n"
     
-    # Carica contesto rilevante dalla cartella context
-    context_text = ""
-    if CONTEXT_LOADER_AVAILABLE:
-        context_text = get_context_for_analysis('error_patterns', field_name)
-        if context_text:
-            context_text = f"\n\n=== CONTESTO DI DOMINIO E DOCUMENTAZIONE ===\n{context_text}\n"
+    # Carica contesto rilevante dalla cartella context (o dal contesto del report)
+    context_text = _context_block('error_patterns', field_name, ctx)
     
-    prompt = f"""Analizza i pattern di errore in un sistema di riconoscimento documentale e fornisci un'analisi concisa usando markdown.
+    prompt = _ERROR_PATTERNS_PROMPT.format(
+        field_context=field_context,
+        context_text=context_text,
+        fp_by_method=fp_by_method,
+        fn_by_method=fn_by_method,
+        fp_conf_str=fp_conf_str,
+        fn_conf_str=fn_conf_str
+    )
+    
+    return prompt, None
 
-Contesto: Sistema di riconoscimento automatico di informazioni da fatture. False Positive (FP) = predetto positivo ma reale negativo. False Negative (FN) = predetto negativo ma reale positivo.{field_context}{context_text}
 
-False Positive per metodo:
-{fp_by_method}
+@_with_llm()
+def analyze_error_patterns(df: pd.DataFrame, field_name: Optional[str] = None, ctx: Optional[ReportContext] = None) -> Optional[str]:
+    """
+    Analizza i pattern di errore nei dati Lucy.
+    
+    Args:
+        df: DataFrame con dati validati
+        field_name: Nome del campo specifico da analizzare (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Returns:
+        Analisi dei pattern di errore, o None se AI non disponibile
+    """
+    return _build_error_patterns_prompt(df, field_name, ctx)
 
-False Negative per metodo:
-{fn_by_method}
 
-Confidence media FP: {fp_conf_str}
-Confidence media FN: {fn_conf_str}
+def _build_section_text_prompt(section_topic: str, data_context: str, ctx: Optional[ReportContext] = None) -> str:
+    """
+    Costruisce il prompt per il testo di una sezione del report.
+    
+    Args:
+        section_topic: Argomento della sezione
+        data_context: Contesto dei dati
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Returns:
+        Prompt da inviare all'LLM
+    """
+    # Carica contesto rilevante dalla cartella context (o dal contesto del report)
+    context_text = _context_block('general', None, ctx)
+    
+    prompt = _SECTION_TEXT_PROMPT.format(
+        section_topic=section_topic,
+        data_context=data_context,
+        context_text=context_text
+    )
+    
+    return prompt
 
-Fornisci un'analisi strutturata che:
-1. Identifichi quali metodi hanno più problemi (FP o FN)
-2. Analizzi se la confidence è correlata agli errori
-3. Suggerisca possibili miglioramenti o aree di attenzione
 
-Formattazione richiesta:
-- Usa *corsivo* per nomi di metodi (es. *azure_model*, *query-vat_number*), termini tecnici (es. *fallback*, *ensemble*, *routing*), e nomi di sistemi
-- Usa elenchi puntati per organizzare punti chiave, anomalie e raccomandazioni
-- Mantieni paragrafi brevi e leggibili
-- Evita muri di testo: struttura il contenuto in sezioni chiare
-- Usa grassetto (**testo**) per enfatizzare concetti importanti quando necessario
+@_with_llm()
+def generate_section_text(section_topic: str, data_context: str, ctx: Optional[ReportContext] = None) -> Optional[str]:
+    """
+    Genera testo per una sezione del report usando AI.
+    
+    Args:
+        section_topic: Argomento della sezione
+        data_context: Contesto dei dati
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Returns:
+        Testo generato, o None se AI non disponibile
+    """
+    return _build_section_text_prompt(section_topic, data_context, ctx)
 
-IMPORTANTE: Usa markdown per la formattazione (elenchi, corsivo, grassetto quando necessario). Struttura il commento in modo leggibile con paragrafi brevi e elenchi quando appropriato.
+
+_FIELDS_BATCH_HEADERS = {
+    'data_summary': "=== DATI DA ANALIZZARE ===",
+    'error_patterns': "=== ERRORI DA ANALIZZARE ===",
+}
+
+_FIELDS_BATCH_FORMAT = """
+
+=== FORMATO DELLA RISPOSTA ===
+I dati riportati in fondo sono divisi per campo. Svolgi l'analisi richiesta separatamente per ciascun campo, con la formattazione indicata sopra.
+Restituisci SOLO un oggetto JSON valido, senza testo prima o dopo: una chiave per ogni campo (il nome esatto del campo) e come valore il testo markdown della sua analisi.
 """
+
+
+def _parse_fields_batch(text: str, field_names: List[str]) -> Dict[str, str]:
+    """
+    Estrae dalla risposta JSON di analyze_fields_batch il testo di ciascun campo.
     
-    # Usa la funzione con fallback automatico
-    result, _ = invoke_llm_with_fallback(llm_config, prompt)
-    # Verifica che il risultato non sia vuoto
-    if result and result.strip():
-        return result
-    return None
+    Args:
+        text: Risposta dell'LLM (eventualmente racchiusa in un blocco ```json)
+        field_names: Campi attesi
+        
+    Returns:
+        Dizionario campo -> testo per i campi presenti e non vuoti (vuoto se il JSON non è valido)
+    """
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        data = json.loads(text[start:end + 1]) if start >= 0 else None
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return {}
+    return {
+        field_name: data[field_name]
+        for field_name in field_names
+        if isinstance(data.get(field_name), str) and data[field_name].strip()
+    }
 
 
-def generate_section_text(section_topic: str, data_context: str) -> Optional[str]:
+def analyze_fields_batch(
+    df: pd.DataFrame,
+    field_names: List[str],
+    analysis_type: str = 'data_summary',
+    ctx: Optional[ReportContext] = None
+) -> Dict[str, Optional[str]]:
     """
-    Genera testo per una sezione del report usando AI.
+    Esegue la stessa analisi per più campi con una sola chiamata LLM.
+    
+    Istruzioni e contesto di dominio compaiono una volta sola, seguiti dai dati di ogni
+    campo; l'LLM risponde con un JSON campo -> testo. Se la risposta non è un JSON valido
+    (o manca qualche campo, o il prompt supera MAX_PROMPT_TOKENS) i campi mancanti
+    vengono analizzati con le chiamate singole.
+    
+    Args:
+        df: DataFrame con tutti i campi (colonna 'field_name')
+        field_names: Campi da analizzare
+        analysis_type: 'data_summary' (come analyze_data_summary sulle righe di ogni campo)
+            o 'error_patterns' (come analyze_error_patterns)
+        ctx: Contesto del report da ReportContext.load() (opzionale, se assente si usa
+            il contesto generale, comune a tutti i campi)
+        
+    Returns:
+        Dizionario campo -> testo, con gli stessi valori delle funzioni singole
+        
+    Raises:
+        ValueError: Se analysis_type non è supportato
+    """
+    if analysis_type not in _FIELDS_BATCH_HEADERS:
+        raise ValueError(f"analysis_type non supportato: {analysis_type}")
+    header = _FIELDS_BATCH_HEADERS[analysis_type]
+    report_errors = analysis_type == 'data_summary'
+    
+    def _single(field_name: str) -> Optional[str]:
+        if analysis_type == 'data_summary':
+            return analyze_data_summary(_field_rows(df, field_name), field_name=field_name, ctx=ctx)
+        return analyze_error_patterns(df, field_name=field_name, ctx=ctx)
+    
+    llm_config = get_llm_with_fallback()
+    if llm_config is None:
+        return {field_name: _llm_result(None, "no_config", report_errors) for field_name in field_names}
+    
+    # Stesso contesto per tutti i campi: il prefisso del prompt è comune
+    ctx = ctx or ReportContext.load()
+    results: Dict[str, Optional[str]] = {}
+    prefix = ""
+    sections: List[str] = []
+    for field_name in field_names:
+        if analysis_type == 'data_summary':
+            prompt, message = _build_data_summary_prompt(_field_rows(df, field_name), field_name, ctx), None
+        else:
+            prompt, message = _build_error_patterns_prompt(df, field_name, ctx)
+        if prompt is None:
+            results[field_name] = message
+            continue
+        head, _, data = prompt.partition(header)
+        prefix = prefix or head
+        sections.append(header + data)
+    
+    pending = [field_name for field_name in field_names if field_name not in results]
+    if len(pending) > 1:
+        prompt = (
+            prefix.rstrip("\n") + _FIELDS_BATCH_FORMAT + "\n" + "\n".join(sections)
+            + f"\nCampi da analizzare (chiavi del JSON): {', '.join(pending)}\n"
+        )
+        if _estimate_tokens(prompt) <= MAX_PROMPT_TOKENS:
+            text, error_reason = invoke_llm_with_fallback(llm_config, prompt)
+            if text is None:
+                # Errore dell'LLM (non di formato): le chiamate singole fallirebbero allo stesso modo
+                results.update({field_name: _llm_result(None, error_reason, report_errors) for field_name in pending})
+            else:
+                results.update(_parse_fields_batch(text, pending))
+        else:
+            logger.info(f"Prompt per {len(pending)} campi oltre MAX_PROMPT_TOKENS: analisi per singolo campo")
+    
+    missing = [field_name for field_name in pending if field_name not in results]
+    if missing and len(pending) > 1:
+        logger.warning(f"Risposta batch incompleta, analisi singola per: {', '.join(missing)}")
+    for field_name in missing:
+        results[field_name] = _single(field_name)
+    return {field_name: results[field_name] for field_name in field_names}
+
+
+def run_all_analyses(
+    df: pd.DataFrame,
+    charts: Optional[Dict[str, Dict[str, Any]]] = None,
+    sections: Optional[Dict[str, Dict[str, str]]] = None,
+    field_name: Optional[str] = None,
+    max_concurrency: int = LLM_MAX_CONCURRENCY,
+    ctx: Optional[ReportContext] = None
+) -> Dict[str, Optional[str]]:
+    """
+    Esegue tutte le analisi AI di un report in parallelo.
+    
+    I prompt vengono costruiti tutti prima e inviati contemporaneamente (fino a
+    `max_concurrency`): la latenza complessiva è quella della chiamata più lenta invece
+    della somma. Ogni richiesta passa da `invoke_llm_with_fallback`, quindi con cache,
+    routing, circuit breaker, retry, timeout e limite di _llm_gate come le chiamate singole.
+    
+    Args:
+        df: DataFrame del report (per riassunto dati e pattern di errore)
+        charts: Grafici da commentare: id -> argomenti di generate_chart_commentary
+            (chart_description, chart_data_summary, domain, field_name)
+        sections: Sezioni da scrivere: id -> argomenti di generate_section_text
+            (section_topic, data_context)
+        field_name: Nome del campo specifico per riassunto dati e pattern di errore (opzionale)
+        max_concurrency: Numero massimo di richieste contemporanee
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Returns:
+        Dizionario id -> testo con le chiavi 'data_summary', 'error_patterns' e gli id di
+        `charts` e `sections`; i valori sono quelli che restituirebbero le singole funzioni
+        (None, o il messaggio diagnostico per 'data_summary', se l'analisi non è riuscita)
+    """
+    charts = charts or {}
+    sections = sections or {}
+    
+    llm_config = get_llm_with_fallback()
+    if llm_config is None:
+        results: Dict[str, Optional[str]] = {key: None for key in [*charts, *sections]}
+        results['data_summary'] = _get_ai_unavailable_message("no_config")
+        results['error_patterns'] = None
+        return results
+    
+    results = {}
+    prompts: Dict[str, str] = {}
+    
+    def _add_prompt(key: str, build_prompt: Callable[[], PromptResult]) -> None:
+        # Un errore nella costruzione di un prompt non blocca le altre analisi
+        try:
+            prompt = build_prompt()
+        except Exception as e:
+            logger.warning(f"Errore nella preparazione dell'analisi '{key}': {_short_err(e)}")
+            logger.debug("Dettaglio errore", exc_info=True)
+            results[key] = _llm_result(None, _classify_llm_error(e), key == 'data_summary')
+            return
+        if isinstance(prompt, tuple):
+            prompt, message = prompt
+            if prompt is None:
+                results[key] = message
+                return
+        prompts[key] = prompt
+    
+    _add_prompt('data_summary', lambda: _build_data_summary_prompt(df, field_name, ctx))
+    _add_prompt('error_patterns', lambda: _build_error_patterns_prompt(df, field_name, ctx))
+    for chart_id, chart in charts.items():
+        _add_prompt(chart_id, lambda chart=chart: _build_chart_commentary_prompt(**chart, ctx=ctx))
+    for section_id, section in sections.items():
+        _add_prompt(section_id, lambda section=section: _build_section_text_prompt(**section, ctx=ctx))
+    
+    if not prompts:
+        return results
+    
+    # Pool dedicato: i thread di _llm_executor servono alle chiamate con timeout avviate
+    # da invoke_llm_with_fallback, occuparli qui potrebbe bloccarle
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(prompts))), thread_name_prefix="analysis") as executor:
+        futures = {
+            key: executor.submit(invoke_llm_with_fallback, llm_config, prompt)
+            for key, prompt in prompts.items()
+        }
+    
+    for key, future in futures.items():
+        try:
+            text, error_reason = future.result()
+        except Exception as e:
+            logger.warning(f"Errore LLM per '{key}': {_short_err(e)}")
+            logger.debug("Dettaglio errore LLM", exc_info=True)
+            text, error_reason = None, _classify_llm_error(e)
+        results[key] = _llm_result(text, error_reason, key == 'data_summary')
+    
+    return results
+
+
+@_with_llm_async(report_errors=True)
+def analyze_data_summary_async(df: pd.DataFrame, field_name: Optional[str] = None, ctx: Optional[ReportContext] = None) -> str:
+    """
+    Versione asincrona di analyze_data_summary.
+    
+    Args:
+        df: DataFrame da analizzare
+        field_name: Nome del campo specifico da analizzare (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Returns:
+        Riassunto generato dall'AI, o messaggio di errore se AI non disponibile
+    """
+    return _build_data_summary_prompt(df, field_name, ctx)
+
+
+@_with_llm_async()
+def generate_chart_commentary_async(
+    chart_description: str,
+    chart_data_summary: str,
+    domain: str = "general",
+    field_name: Optional[str] = None,
+    ctx: Optional[ReportContext] = None
+) -> Optional[str]:
+    """
+    Versione asincrona di generate_chart_commentary.
+    
+    Args:
+        chart_description: Descrizione del tipo di grafico
+        chart_data_summary: Riassunto dei dati visualizzati
+        domain: Dominio dei dati ("document" per documentale, "general" per generale)
+        field_name: Nome del campo specifico analizzato (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Returns:
+        Commento generato dall'AI in formato markdown, o None se AI non disponibile
+    """
+    return _build_chart_commentary_prompt(chart_description, chart_data_summary, domain, field_name, ctx)
+
+
+@_with_llm_async()
+def analyze_error_patterns_async(df: pd.DataFrame, field_name: Optional[str] = None, ctx: Optional[ReportContext] = None) -> Optional[str]:
+    """
+    Versione asincrona di analyze_error_patterns.
+    
+    Args:
+        df: DataFrame con dati validati
+        field_name: Nome del campo specifico da analizzare (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Returns:
+        Analisi dei pattern di errore, o None se AI non disponibile
+    """
+    return _build_error_patterns_prompt(df, field_name, ctx)
+
+
+@_with_llm_async()
+def generate_section_text_async(section_topic: str, data_context: str, ctx: Optional[ReportContext] = None) -> Optional[str]:
+    """
+    Versione asincrona di generate_section_text.
     
     Args:
         section_topic: Argomento della sezione
         data_context: Contesto dei dati
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
         
     Returns:
         Testo generato, o None se AI non disponibile
     """
+    return _build_section_text_prompt(section_topic, data_context, ctx)
+
+
+async def gather_analyses(*analyses: Awaitable[Any], max_concurrency: int = LLM_MAX_CONCURRENCY) -> List[Any]:
+    """
+    Esegue in parallelo più analisi asincrone, con al massimo `max_concurrency` richieste attive.
+    
+    Nel kernel Jupyter di Quarto può essere usata direttamente con `await`, es.:
+    `summary, errors = await gather_analyses(analyze_data_summary_async(df), analyze_error_patterns_async(df))`.
+    Fuori da un event loop: `asyncio.run(gather_analyses(...))`.
+    
+    Args:
+        *analyses: Coroutine restituite dalle funzioni `*_async`
+        max_concurrency: Numero massimo di richieste contemporanee
+        
+    Returns:
+        Risultati nello stesso ordine delle analisi
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def _limited(analysis: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await analysis
+    
+    return list(await asyncio.gather(*(_limited(analysis) for analysis in analyses)))
+
+
+def analyze_data_summary_stream(df: pd.DataFrame, field_name: Optional[str] = None, ctx: Optional[ReportContext] = None) -> Iterator[str]:
+    """
+    Versione in streaming di analyze_data_summary.
+    
+    In una cella Quarto/Jupyter: `for text in analyze_data_summary_stream(df): print(text, end="")`.
+    
+    Args:
+        df: DataFrame da analizzare
+        field_name: Nome del campo specifico da analizzare (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Yields:
+        Frammenti del riassunto, o il messaggio di errore se AI non disponibile
+    """
     llm_config = get_llm_with_fallback()
     if llm_config is None:
-        return None
+        yield _get_ai_unavailable_message("no_config")
+        return
     
-    # Carica contesto rilevante dalla cartella context
-    context_text = ""
-    if CONTEXT_LOADER_AVAILABLE:
-        context_text = get_context_for_analysis('general')
-        if context_text:
-            context_text = f"\n\n=== CONTESTO DI DOMINIO E DOCUMENTAZIONE ===\n{context_text}\n"
+    produced = False
+    for text in stream_llm_with_fallback(llm_config, _build_data_summary_prompt(df, field_name, ctx)):
+        produced = produced or bool(text.strip())
+        yield text
+    if not produced:
+        yield _get_ai_unavailable_message("errore_generico")
+
+
+def generate_chart_commentary_stream(
+    chart_description: str,
+    chart_data_summary: str,
+    domain: str = "general",
+    field_name: Optional[str] = None,
+    ctx: Optional[ReportContext] = None
+) -> Iterator[str]:
+    """
+    Versione in streaming di generate_chart_commentary.
     
-    prompt = f"""Scrivi una sezione di report professionale (2-3 paragrafi) su:
+    Args:
+        chart_description: Descrizione del tipo di grafico
+        chart_data_summary: Riassunto dei dati visualizzati
+        domain: Dominio dei dati ("document" per documentale, "general" per generale)
+        field_name: Nome del campo specifico analizzato (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Yields:
+        Frammenti del commento (nessuno se AI non disponibile)
+    """
+    llm_config = get_llm_with_fallback()
+    if llm_config is None:
+        return
+    
+    prompt = _build_chart_commentary_prompt(chart_description, chart_data_summary, domain, field_name, ctx)
+    yield from stream_llm_with_fallback(llm_config, prompt)
 
-Argomento: {section_topic}
 
-Contesto dati:
-{data_context}{context_text}
+def analyze_error_patterns_stream(df: pd.DataFrame, field_name: Optional[str] = None, ctx: Optional[ReportContext] = None) -> Iterator[str]:
+    """
+    Versione in streaming di analyze_error_patterns.
+    
+    Args:
+        df: DataFrame con dati validati
+        field_name: Nome del campo specifico da analizzare (opzionale)
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Yields:
+        Frammenti dell'analisi (nessuno se AI non disponibile)
+    """
+    llm_config = get_llm_with_fallback()
+    if llm_config is None:
+        return
+    
+    prompt, message = _build_error_patterns_prompt(df, field_name, ctx)
+    if prompt is None:
+        if message:
+            yield message
+        return
+    yield from stream_llm_with_fallback(llm_config, prompt)
 
-Il testo dovrebbe essere:
-- Professionale e chiaro
-- Basato sui dati forniti
-- Strutturato logicamente
 
-IMPORTANTE: Scrivi solo testo normale, senza asterischi, cancelletto o altri simboli di formattazione markdown.
-"""
+def generate_section_text_stream(section_topic: str, data_context: str, ctx: Optional[ReportContext] = None) -> Iterator[str]:
+    """
+    Versione in streaming di generate_section_text.
     
-    # Usa la funzione con fallback automatico
-    result, _ = invoke_llm_with_fallback(llm_config, prompt)
-    # Verifica che il risultato non sia vuoto
-    if result and result.strip():
-        return result
-    return None
+    Args:
+        section_topic: Argomento della sezione
+        data_context: Contesto dei dati
+        ctx: Contesto del report da ReportContext.load() (opzionale, evita di ricaricarlo)
+        
+    Yields:
+        Frammenti del testo (nessuno se AI non disponibile)
+    """
+    llm_config = get_llm_with_fallback()
+    if llm_config is None:
+        return
+    
+    yield from stream_llm_with_fallback(llm_config, _build_section_text_prompt(section_topic, data_context, ctx))
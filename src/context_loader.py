@@ -2,12 +2,16 @@
 Modulo per il caricamento e la processazione di file di contesto dalla cartella context.
 Supporta PDF e Markdown, estraendo sezioni rilevanti per il contesto del LLM.
 """
+import hashlib
+import io
 import os
 import re
 import logging
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Any, Iterator, List, Dict, Optional, Tuple
 
 # Configurazione logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -27,15 +31,154 @@ if not logger.handlers:
 
 try:
     from pypdf import PdfReader
-    PDF_AVAILABLE = True
+    PYPDF_AVAILABLE = True
 except ImportError:
-    PDF_AVAILABLE = False
+    PYPDF_AVAILABLE = False
+
+# Backend nativi (più veloci di pypdf) per l'estrazione del testo, se installati
+try:
+    import pypdfium2 as pdfium
+    _PDF_BACKEND = "pdfium"
+except ImportError:
+    try:
+        import fitz
+        _PDF_BACKEND = "mupdf"
+    except ImportError:
+        _PDF_BACKEND = "pypdf"
+
+PDF_AVAILABLE = _PDF_BACKEND != "pypdf" or PYPDF_AVAILABLE
+
+# Ricerca di tutte le keyword in un'unica passata sul testo (opzionale)
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Cache su disco del testo estratto dai PDF (stessa cartella della cache LLM di ai_analysis).
+# REPORT_AI_CACHE=0 la disabilita; REPORT_AI_CACHE_DIR ne cambia la posizione.
+PDF_CACHE_ENABLED = os.getenv("REPORT_AI_CACHE", "1") != "0"
+PDF_CACHE_DIR = Path(os.getenv("REPORT_AI_CACHE_DIR", str(Path.home() / ".report_ai_cache"))).expanduser() / "context"
+
+# Lunghezza massima (caratteri) del contesto restituito da get_context_for_analysis
+MAX_CONTEXT_CHARS = int(os.getenv("MAX_CONTEXT_CHARS", "30000"))
+
+# Estensioni Markdown lette dalla cartella context e file da non includere nel contesto
+_MD_EXTS = frozenset({'.md', '.markdown'})
+_SKIP_NAMES = frozenset({'readme.md', 'readme.markdown'})
+
+# Titoli in maiuscolo (riga già ripulita dagli spazi), da usare con fullmatch
+_CAPS_TITLE_RE = re.compile(r'[A-Z][A-Z\s]{3,}')
+
+
+def _is_title(stripped: str) -> bool:
+    """
+    Indica se una riga (già ripulita dagli spazi) è un titolo di sezione.
+    
+    Titoli: intestazioni Markdown (da # a ######, seguite da spazio e testo) o righe di
+    solo testo in maiuscolo. Le intestazioni Markdown si riconoscono senza regex; la
+    regex viene usata solo per le righe che iniziano con una maiuscola.
+    
+    Args:
+        stripped: Riga senza spazi iniziali e finali
+        
+    Returns:
+        True se la riga è un titolo
+    """
+    if not stripped:
+        return False
+    first = stripped[0]
+    if first == '#':
+        hashes = len(stripped) - len(stripped.lstrip('#'))
+        # La riga non ha spazi finali: se dopo i # c'è uno spazio, segue del testo
+        return hashes <= 6 and hashes < len(stripped) and stripped[hashes].isspace()
+    if 'A' <= first <= 'Z':
+        return _CAPS_TITLE_RE.fullmatch(stripped) is not None
+    return False
+
+
+def _pdf_cache_path(pdf_path: Path) -> Path:
+    """
+    Restituisce il file di cache del testo di un PDF.
+    
+    La chiave dipende da percorso, dimensione e data di modifica (e dal backend di
+    estrazione): un PDF modificato ottiene una nuova voce e la vecchia non viene più letta.
+    
+    Args:
+        pdf_path: Percorso al file PDF
+        
+    Returns:
+        Percorso del file .txt nella cartella PDF_CACHE_DIR
+    """
+    stat = pdf_path.stat()
+    key_source = f"{_PDF_BACKEND}:{pdf_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+    return PDF_CACHE_DIR / f"{hashlib.blake2b(key_source.encode('utf-8'), digest_size=16).hexdigest()}.txt"
+
+
+def _read_cached_pdf_text(pdf_path: Path) -> Optional[str]:
+    """Legge il testo di un PDF dalla cache su disco (None se assente o non leggibile)."""
+    if not PDF_CACHE_ENABLED:
+        return None
+    try:
+        return _pdf_cache_path(pdf_path).read_text(encoding='utf-8')
+    except OSError:
+        return None
+
+
+def _write_cached_pdf_text(pdf_path: Path, text: str) -> None:
+    """Salva il testo di un PDF nella cache su disco; se la cartella non è scrivibile non fa nulla."""
+    if not PDF_CACHE_ENABLED:
+        return
+    try:
+        cache_path = _pdf_cache_path(pdf_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(text, encoding='utf-8')
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.debug(f"Cache del testo PDF non scrivibile: {e}")
+
+
+def _iter_pdf_pages(pdf_path: Path) -> Iterator[str]:
+    """
+    Restituisce il testo delle pagine di un PDF con il backend disponibile.
+    
+    Args:
+        pdf_path: Percorso al file PDF
+        
+    Yields:
+        Testo di ogni pagina, in ordine
+    """
+    if _PDF_BACKEND == "pdfium":
+        pdf = pdfium.PdfDocument(str(pdf_path))
+        try:
+            for page_index in range(len(pdf)):
+                page = pdf.get_page(page_index)
+                textpage = page.get_textpage()
+                try:
+                    yield textpage.get_text_range()
+                finally:
+                    textpage.close()
+                    page.close()
+        finally:
+            pdf.close()
+    elif _PDF_BACKEND == "mupdf":
+        with fitz.open(str(pdf_path)) as doc:
+            for page_index in range(doc.page_count):
+                yield doc.load_page(page_index).get_text('text')
+    else:
+        for page in PdfReader(pdf_path).pages:
+            yield page.extract_text()
 
 
 def extract_text_from_pdf(pdf_path: Path) -> str:
     """
     Estrae il testo da un file PDF.
     
+    Usa pypdfium2 o PyMuPDF se installati, altrimenti pypdf. Il testo estratto viene
+    salvato in una cache su disco (vedi PDF_CACHE_DIR): le esecuzioni successive non
+    rianalizzano il PDF finché il file non cambia.
+    
     Args:
         pdf_path: Percorso al file PDF
         
@@ -45,16 +188,20 @@ def extract_text_from_pdf(pdf_path: Path) -> str:
     if not PDF_AVAILABLE:
         return f"[ERRORE: pypdf non installato. Installa con: uv add pypdf]"
     
+    cached = _read_cached_pdf_text(pdf_path)
+    if cached is not None:
+        return cached
+    
     try:
-        reader = PdfReader(pdf_path)
         text_parts = []
         
-        for page_num, page in enumerate(reader.pages, 1):
-            text = page.extract_text()
+        for page_num, text in enumerate(_iter_pdf_pages(pdf_path), 1):
             if text.strip():
                 text_parts.append(f"--- Pagina {page_num} ---\n{text}")
         
-        return "\n\n".join(text_parts)
+        text = "\n\n".join(text_parts)
+        _write_cached_pdf_text(pdf_path, text)
+        return text
     except Exception as e:
         logger.error(f"Errore nell'estrazione del PDF {pdf_path.name}: {e}")
         return f"[ERRORE nell'estrazione del PDF {pdf_path.name}: {str(e)}]"
@@ -91,38 +238,86 @@ def split_into_sections(text: str, min_section_length: int = 100) -> List[Dict[s
     """
     sections = []
     
-    # Pattern per identificare titoli (Markdown: #, ##, ###, etc. o linee con testo in maiuscolo)
-    title_pattern = r'^(#{1,6}\s+.+?)$|^([A-Z][A-Z\s]{3,})$'
-    
     lines = text.split('\n')
-    current_section = {'title': 'Introduzione', 'content': []}
+    # 'len' è la lunghezza di '\n'.join(parts), aggiornata riga per riga: il testo della
+    # sezione viene unito una sola volta, e solo se la sezione viene tenuta
+    current_section = {'title': 'Introduzione', 'parts': [], 'len': 0}
     
     for line in lines:
+        stripped = line.strip()
         # Controlla se è un titolo
-        if re.match(title_pattern, line.strip()):
+        if _is_title(stripped):
             # Salva la sezione precedente se ha contenuto sufficiente
-            if len('\n'.join(current_section['content'])) >= min_section_length:
+            if current_section['len'] >= min_section_length:
                 sections.append({
                     'title': current_section['title'],
-                    'content': '\n'.join(current_section['content']).strip()
+                    'content': '\n'.join(current_section['parts']).strip()
                 })
             
             # Inizia una nuova sezione
-            title = line.strip().lstrip('#').strip()
-            current_section = {'title': title, 'content': []}
+            title = stripped.lstrip('#').strip()
+            current_section = {'title': title, 'parts': [], 'len': 0}
         else:
-            current_section['content'].append(line)
+            if current_section['parts']:
+                current_section['len'] += 1
+            current_section['parts'].append(line)
+            current_section['len'] += len(line)
     
     # Aggiungi l'ultima sezione
-    if len('\n'.join(current_section['content'])) >= min_section_length:
+    if current_section['len'] >= min_section_length:
         sections.append({
             'title': current_section['title'],
-            'content': '\n'.join(current_section['content']).strip()
+            'content': '\n'.join(current_section['parts']).strip()
         })
     
     return sections
 
 
+def _build_keyword_automaton(keywords: List[str]) -> Optional[Any]:
+    """
+    Costruisce l'automa Aho-Corasick per le keyword (None se pyahocorasick non è disponibile).
+    
+    Args:
+        keywords: Keyword già in minuscolo
+        
+    Returns:
+        Automa pronto per la ricerca, o None
+    """
+    if not AHOCORASICK_AVAILABLE or not all(keywords):
+        return None
+    automaton = ahocorasick.Automaton()
+    for keyword in set(keywords):
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+
+def _count_keywords(text: str, keywords: List[str], automaton: Optional[Any]) -> Dict[str, int]:
+    """
+    Conta le occorrenze non sovrapposte di ogni keyword nel testo (come str.count).
+    
+    Args:
+        text: Testo in minuscolo
+        keywords: Keyword in minuscolo
+        automaton: Automa da _build_keyword_automaton (None: una str.count per keyword)
+        
+    Returns:
+        Dizionario keyword -> occorrenze
+    """
+    if automaton is None:
+        return {keyword: text.count(keyword) for keyword in keywords}
+    counts = dict.fromkeys(keywords, 0)
+    next_start: Dict[str, int] = {}
+    # Le occorrenze arrivano in ordine di posizione finale: si tengono solo quelle che
+    # iniziano dopo l'ultima contata per la stessa keyword
+    for end, keyword in automaton.iter(text):
+        start = end - len(keyword) + 1
+        if start >= next_start.get(keyword, 0):
+            counts[keyword] += 1
+            next_start[keyword] = end + 1
+    return counts
+
+
 def find_relevant_sections(sections: List[Dict[str, str]], 
                           keywords: List[str],
                           max_sections: int = 5) -> List[Dict[str, str]]:
@@ -143,17 +338,20 @@ def find_relevant_sections(sections: List[Dict[str, str]],
     # Calcola score di rilevanza per ogni sezione
     scored_sections = []
     keywords_lower = [kw.lower() for kw in keywords]
+    automaton = _build_keyword_automaton(keywords_lower)
     
     for section in sections:
         score = 0
+        title_lower = section['title'].lower()
         text_lower = (section['title'] + ' ' + section['content']).lower()
+        counts = _count_keywords(text_lower, keywords_lower, automaton)
         
         for keyword in keywords_lower:
             # Punteggio più alto se la keyword è nel titolo
-            if keyword in section['title'].lower():
+            if keyword in title_lower:
                 score += 3
             # Punteggio medio se è nel contenuto
-            score += text_lower.count(keyword)
+            score += counts[keyword]
         
         scored_sections.append((score, section))
     
@@ -172,82 +370,197 @@ def find_relevant_sections(sections: List[Dict[str, str]],
     return relevant
 
 
-def load_context_files(context_dir: str = "context",
-                       keywords: Optional[List[str]] = None,
-                       max_sections_per_file: int = 5) -> str:
+def _context_dir_signature(context_path: Path) -> Tuple[Tuple[str, int, int], ...]:
     """
-    Carica tutti i file di contesto dalla cartella context e restituisce un testo formattato.
+    Restituisce (nome, mtime, dimensione) dei file della cartella: cambia se un file cambia.
     
     Args:
-        context_dir: Percorso alla cartella context
-        keywords: Keyword opzionali per filtrare sezioni rilevanti
-        max_sections_per_file: Numero massimo di sezioni da includere per file
+        context_path: Cartella context
         
     Returns:
-        str: Testo formattato con tutto il contesto caricato
+        Tupla ordinata per nome
     """
-    context_path = Path(context_dir)
+    signature = []
+    for file_path in context_path.iterdir():
+        if file_path.is_file():
+            stat = file_path.stat()
+            signature.append((file_path.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(signature))
+
+
+def _extract_pdfs(pdf_paths: List[Path]) -> Dict[Path, str]:
+    """
+    Estrae il testo di più PDF, in parallelo su processi separati quando serve.
     
-    if not context_path.exists():
-        return ""
+    I PDF già presenti nella cache su disco vengono letti direttamente; gli altri
+    vengono estratti con un ProcessPoolExecutor (pypdf è CPU-bound) se sono più di uno.
+    Se il pool non è utilizzabile si ripiega sull'estrazione sequenziale.
     
-    context_parts = []
-    keywords = keywords or []
+    Args:
+        pdf_paths: Percorsi dei file PDF
+        
+    Returns:
+        Dizionario percorso -> testo estratto (o messaggio di errore)
+    """
+    texts = {}
+    pending = []
+    for pdf_path in pdf_paths:
+        cached = _read_cached_pdf_text(pdf_path)
+        if cached is not None:
+            texts[pdf_path] = cached
+        else:
+            pending.append(pdf_path)
     
-    # Processa tutti i file nella cartella
-    for file_path in sorted(context_path.iterdir()):
+    if len(pending) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(pending))) as pool:
+                texts.update(zip(pending, pool.map(extract_text_from_pdf, pending)))
+        except Exception as e:
+            logger.warning(f"Estrazione parallela dei PDF non riuscita: {e}. Procedo in sequenza.")
+    
+    for pdf_path in pending:
+        if pdf_path not in texts:
+            try:
+                texts[pdf_path] = extract_text_from_pdf(pdf_path)
+            except Exception as e:
+                logger.warning(f"Errore durante il caricamento del file {pdf_path.name}: {e}. Continuo con altri file.")
+    return texts
+
+
+@lru_cache(maxsize=4)
+def _load_all_sections(context_dir: str,
+                       signature: Tuple[Tuple[str, int, int], ...]) -> Tuple[Tuple[str, str, List[Dict[str, str]]], ...]:
+    """
+    Legge tutti i file di contesto e li divide in sezioni (memorizzato).
+    
+    Estrazione dei PDF e divisione in sezioni vengono eseguite una sola volta per
+    stato della cartella (`signature`); il filtro per keyword resta a carico del chiamante.
+    
+    Args:
+        context_dir: Percorso alla cartella context
+        signature: Firma dei file da _context_dir_signature (chiave della cache)
+        
+    Returns:
+        Tupla di (tipo file, nome file, sezioni) nell'ordine dei nomi dei file
+    """
+    # Raccogli i file candidati nell'ordine dei nomi
+    candidates = []
+    for file_path in sorted(Path(context_dir).iterdir()):
         if file_path.is_file():
-            file_name = file_path.name
+            lower_name = file_path.name.lower()
             
             # Salta file nascosti e README
-            if file_name.startswith('.') or file_name.lower() == 'readme.md':
+            if lower_name.startswith('.') or lower_name in _SKIP_NAMES:
                 continue
             
-            try:
-                if file_path.suffix.lower() == '.pdf':
-                    if not PDF_AVAILABLE:
-                        continue
-                    text = extract_text_from_pdf(file_path)
-                    file_type = "PDF"
-                elif file_path.suffix.lower() in ['.md', '.markdown']:
-                    text = extract_text_from_markdown(file_path)
-                    file_type = "Markdown"
-                else:
-                    continue
-                
-                if not text or text.startswith("[ERRORE"):
-                    continue
-                
-                # Dividi in sezioni
-                sections = split_into_sections(text)
-                
-                # Se ci sono keyword, filtra sezioni rilevanti
-                if keywords and sections:
-                    relevant_sections = find_relevant_sections(
-                        sections, keywords, max_sections_per_file
-                    )
-                else:
-                    # Se non ci sono keyword o il file è piccolo, includi tutto
-                    if len(sections) <= max_sections_per_file:
-                        relevant_sections = sections
-                    else:
-                        # Prendi le prime sezioni
-                        relevant_sections = sections[:max_sections_per_file]
-                
-                # Formatta il contenuto
-                if relevant_sections:
-                    context_parts.append(f"\n=== CONTESTO DA {file_type}: {file_name} ===\n")
-                    for section in relevant_sections:
-                        context_parts.append(f"\n## {section['title']}\n")
-                        context_parts.append(section['content'])
-                        context_parts.append("\n")
+            suffix = file_path.suffix.lower()
+            if suffix == '.pdf':
+                if PDF_AVAILABLE:
+                    candidates.append((file_path, "PDF"))
+            elif suffix in _MD_EXTS:
+                candidates.append((file_path, "Markdown"))
+    
+    pdf_texts = _extract_pdfs([file_path for file_path, file_type in candidates if file_type == "PDF"])
+    
+    files = []
+    for file_path, file_type in candidates:
+        file_name = file_path.name
+        try:
+            if file_type == "PDF":
+                text = pdf_texts.get(file_path)
+            else:
+                text = extract_text_from_markdown(file_path)
             
-            except Exception as e:
-                # Continua con altri file anche se uno fallisce
-                logger.warning(f"Errore durante il caricamento del file {file_name}: {e}. Continuo con altri file.")
+            if not text or text.startswith("[ERRORE"):
                 continue
+            
+            # Dividi in sezioni
+            files.append((file_type, file_name, split_into_sections(text)))
+        
+        except Exception as e:
+            # Continua con altri file anche se uno fallisce
+            logger.warning(f"Errore durante il caricamento del file {file_name}: {e}. Continuo con altri file.")
+            continue
     
-    return "\n".join(context_parts)
+    return tuple(files)
+
+
+def _iter_context_sections(context_dir: str,
+                           keywords: Optional[List[str]] = None,
+                           max_sections_per_file: int = 5) -> Iterator[Tuple[str, str, Dict[str, str]]]:
+    """
+    Restituisce una a una le sezioni di contesto rilevanti, file per file.
+    
+    Args:
+        context_dir: Percorso alla cartella context
+        keywords: Keyword opzionali per filtrare sezioni rilevanti
+        max_sections_per_file: Numero massimo di sezioni da includere per file
+        
+    Yields:
+        Tupla (tipo file, nome file, sezione) nell'ordine dei nomi dei file
+    """
+    context_path = Path(context_dir)
+    
+    if not context_path.exists():
+        return
+    
+    for file_type, file_name, sections in _load_all_sections(context_dir, _context_dir_signature(context_path)):
+        # Se ci sono keyword, filtra sezioni rilevanti
+        if keywords and sections:
+            relevant_sections = find_relevant_sections(
+                sections, keywords, max_sections_per_file
+            )
+        else:
+            # Se non ci sono keyword o il file è piccolo, includi tutto
+            if len(sections) <= max_sections_per_file:
+                relevant_sections = sections
+            else:
+                # Prendi le prime sezioni
+                relevant_sections = sections[:max_sections_per_file]
+        
+        for section in relevant_sections:
+            yield file_type, file_name, section
+
+
+def load_context_files(context_dir: str = "context",
+                       keywords: Optional[List[str]] = None,
+                       max_sections_per_file: int = 5,
+                       max_chars: Optional[int] = None) -> str:
+    """
+    Carica tutti i file di contesto dalla cartella context e restituisce un testo formattato.
+    
+    I file vengono letti e divisi in sezioni una sola volta finché la cartella non cambia;
+    ogni chiamata applica solo il filtro per keyword. Con `max_chars` le sezioni vengono
+    consumate solo fino al budget: la sezione che lo supera viene troncata e le successive
+    non vengono formattate.
+    
+    Args:
+        context_dir: Percorso alla cartella context
+        keywords: Keyword opzionali per filtrare sezioni rilevanti
+        max_sections_per_file: Numero massimo di sezioni da includere per file
+        max_chars: Lunghezza massima del testo restituito (None: nessun limite)
+        
+    Returns:
+        str: Testo formattato con tutto il contesto caricato
+    """
+    buffer = io.StringIO()
+    written = 0
+    current_file = None
+    
+    for file_type, file_name, section in _iter_context_sections(context_dir, keywords or [], max_sections_per_file):
+        # Formatta il contenuto
+        chunk = f"\n## {section['title']}\n{section['content']}\n"
+        if file_name != current_file:
+            chunk = f"\n=== CONTESTO DA {file_type}: {file_name} ===\n{chunk}"
+            current_file = file_name
+        
+        if max_chars is not None and written + len(chunk) > max_chars:
+            buffer.write(chunk[:max_chars - written])
+            break
+        buffer.write(chunk)
+        written += len(chunk)
+    
+    return buffer.getvalue()
 
 
 def get_context_for_analysis(analysis_type: str = "general",
@@ -255,6 +568,8 @@ def get_context_for_analysis(analysis_type: str = "general",
     """
     Ottiene il contesto rilevante per un tipo specifico di analisi.
     
+    Il testo è limitato a MAX_CONTEXT_CHARS caratteri (variabile d'ambiente MAX_CONTEXT_CHARS).
+    
     Args:
         analysis_type: Tipo di analisi ('data_summary', 'error_patterns', 'chart_commentary', 'general')
         field_name: Nome del campo specifico (opzionale)
@@ -278,4 +593,4 @@ def get_context_for_analysis(analysis_type: str = "general",
         keywords.append('campo')
         keywords.append('field')
     
-    return load_context_files(keywords=keywords if keywords else None)
+    return load_context_files(keywords=keywords if keywords else None, max_chars=MAX_CONTEXT_CHARS)
@@ -1,6 +1,9 @@
 """
 Modulo per il caricamento e la preparazione dei dati.
 """
+import os
+from functools import lru_cache
+
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional, Tuple
@@ -11,6 +14,16 @@ METHOD_TYPE_ML = 'ML'
 METHOD_TYPE_QUERY = 'Query'
 METHOD_TYPE_OTHER = 'Other'
 METHOD_TYPE_UNKNOWN = 'Unknown'
+CONFUSION_LABELS = ['TP', 'FP', 'FN', 'TN']
+CATEGORICAL_COLUMNS = ['method_pred', 'field_name', 'comparison', 'country', 'region', 'method_type', 'day_of_week']
+# Tipi delle colonne Lucy applicati già in lettura del CSV
+LUCY_DTYPES = {'field_name': 'category', 'method_pred': 'category', 'comparison': 'category', 'country': 'category'}
+# Motore di read_csv: 'c' (default) o 'pyarrow' (multi-thread, richiede pyarrow; i valori
+# mancanti nelle colonne di testo diventano None e i float possono differire nell'ultima cifra)
+CSV_ENGINE = os.getenv("REPORT_AI_CSV_ENGINE", "c")
+# Riduzione dei float64 a float32 dopo la preparazione (metà memoria; medie e metriche
+# possono cambiare nelle ultime cifre, per questo è disattivata di default)
+DOWNCAST_FLOATS = os.getenv("REPORT_AI_FLOAT32", "0") == "1"
 
 
 def calculate_percentage(part: int, total: int, decimal_places: int = 1) -> float:
@@ -30,37 +43,106 @@ def calculate_percentage(part: int, total: int, decimal_places: int = 1) -> floa
     return round((part / total) * 100, decimal_places)
 
 
+def _parse_datetime(values: pd.Series) -> pd.Series:
+    """
+    Converte una colonna in datetime evitando l'inferenza del formato riga per riga.
+    
+    Il formato dell'export Lucy ('2025-12-10 07:22:04.000000 UTC') viene letto come
+    ISO 8601 in UTC; altri formati ISO passano da format='ISO8601', il resto
+    dall'inferenza di pandas. cache=True riusa il risultato per i timestamp ripetuti.
+    
+    Args:
+        values: Colonna da convertire
+        
+    Returns:
+        Colonna datetime (invariata se lo è già)
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    
+    text = values.astype('string')
+    try:
+        utc_suffix = text.str.endswith(' UTC')
+        if utc_suffix.any() and utc_suffix.all():
+            return pd.to_datetime(text.str.removesuffix(' UTC'), format='ISO8601', utc=True, cache=True)
+        return pd.to_datetime(values, format='ISO8601', cache=True)
+    except (ValueError, TypeError):
+        return pd.to_datetime(values, cache=True)
+
+
+def _downcast_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Riduce le colonne float64 a float32 se DOWNCAST_FLOATS è attivo.
+    
+    Gli interi restano int64: ridurli al tipo minimo farebbe traboccare i calcoli
+    successivi (es. id_company in int16 moltiplicato per 1000).
+    
+    Args:
+        df: DataFrame da modificare (le colonne vengono sostituite per intero)
+        
+    Returns:
+        Lo stesso DataFrame
+    """
+    if not DOWNCAST_FLOATS:
+        return df
+    for column in df.columns:
+        if df[column].dtype == np.float64:
+            df[column] = df[column].astype(np.float32)
+    return df
+
+
 def _prepare_lucy_base(df: pd.DataFrame) -> pd.DataFrame:
     """
     Prepara base dati Lucy (datetime, flags, categorizzazione).
     
+    Le colonne derivate già presenti non vengono ricalcolate: su un sottoinsieme di un
+    DataFrame già preparato (es. filter_by_field_name) resta solo la copia.
+    
+    La copia è superficiale: le colonne nuove o convertite vengono sostituite per intero,
+    le altre restano condivise con `df` (da non modificare sul posto in nessuno dei due).
+    
     Args:
         df: DataFrame con dati Lucy
         
     Returns:
         DataFrame preparato con colonne aggiuntive
     """
-    df = df.copy()
+    df = df.copy(deep=False)
     
     # Converti datetime se presente
     if 'datetime_sent' in df.columns:
-        df['datetime_sent'] = pd.to_datetime(df['datetime_sent'])
-        df['date'] = df['datetime_sent'].dt.date
-        df['hour'] = df['datetime_sent'].dt.hour
-        df['day_of_week'] = df['datetime_sent'].dt.day_name()
+        df['datetime_sent'] = _parse_datetime(df['datetime_sent'])
+        sent = df['datetime_sent'].dt
+        if 'date' not in df.columns:
+            # Giorno come datetime64 (mezzanotte, senza fuso) invece di oggetti datetime.date
+            day = sent.floor('D')
+            df['date'] = day.dt.tz_localize(None) if day.dt.tz is not None else day
+        if 'hour' not in df.columns:
+            df['hour'] = sent.hour
+        if 'day_of_week' not in df.columns:
+            df['day_of_week'] = sent.day_name()
     
     # Crea flag per record validati
     if 'comparison' in df.columns:
-        df['is_validated'] = df['comparison'].notna()
-        df['is_correct'] = df['comparison'].apply(
-            lambda x: x == 'TP' if pd.notna(x) else None
-        )
+        if 'is_validated' not in df.columns:
+            df['is_validated'] = df['comparison'].notna()
+        if 'is_correct' not in df.columns:
+            df['is_correct'] = df['comparison'].eq('TP').astype('boolean').mask(~df['is_validated'])
     
     # Categorizza metodi (ML vs Query)
-    if 'method_pred' in df.columns:
-        df['method_type'] = df['method_pred'].apply(categorize_method)
-    
-    return df
+    if 'method_pred' in df.columns and 'method_type' not in df.columns:
+        df['method_type'] = _categorize_methods(df['method_pred'])
+    
+    # Colonne a bassa cardinalità come categorie: confronti e groupby lavorano sui codici interi.
+    # Su un sottoinsieme già preparato restano solo le categorie effettivamente presenti.
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].cat.remove_unused_categories()
+            else:
+                df[column] = df[column].astype('category')
+    
+    return _downcast_numeric(df)
 
 
 def _calculate_metrics_from_confusion(tp: int, fp: int, fn: int, tn: int) -> Dict[str, float]:
@@ -99,6 +181,87 @@ def _calculate_metrics_from_confusion(tp: int, fp: int, fn: int, tn: int) -> Dic
     }
 
 
+def _confusion_counts(validated: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """
+    Conta TP, FP, FN, TN per gruppo con un'unica passata sui codici interi.
+    
+    Ogni chiave viene fattorizzata (codici in ordine di prima apparizione, -1 se mancante),
+    i codici vengono combinati in un identificativo di gruppo e i conteggi escono da un
+    solo np.bincount su (gruppo, esito). I gruppi sono nell'ordine di prima apparizione,
+    ordinati in modo stabile per la prima chiave: lo stesso ordine dei cicli sui valori
+    `.unique()` di ogni chiave. Le righe con una chiave mancante sono escluse.
+    
+    Args:
+        validated: DataFrame con i soli record validati
+        keys: Colonne di raggruppamento (es. ['method_pred'] o ['field_name', 'method_pred'])
+        
+    Returns:
+        DataFrame con le colonne di `keys`, 'tp', 'fp', 'fn', 'tn' e 'total'
+    """
+    combined = np.zeros(len(validated), dtype=np.int64)
+    has_keys = np.ones(len(validated), dtype=bool)
+    key_codes = []
+    for key in keys:
+        codes, uniques = pd.factorize(validated[key], sort=False)
+        has_keys &= codes >= 0
+        combined = combined * max(len(uniques), 1) + codes
+        key_codes.append((codes, uniques))
+    
+    group_ids, groups = pd.factorize(combined[has_keys], sort=False)
+    n_groups = len(groups)
+    # Prima riga di ogni gruppo (gli identificativi seguono l'ordine di prima apparizione)
+    first_rows = np.unique(group_ids, return_index=True)[1]
+    
+    outcome = pd.Categorical(validated['comparison'], categories=CONFUSION_LABELS).codes[has_keys]
+    counted = outcome >= 0
+    matrix = np.bincount(
+        group_ids[counted] * len(CONFUSION_LABELS) + outcome[counted],
+        minlength=n_groups * len(CONFUSION_LABELS)
+    ).reshape(n_groups, len(CONFUSION_LABELS))
+    
+    # Le chiavi tornano stringhe semplici: le tabelle di metriche non ereditano le categorie
+    counts = pd.DataFrame({
+        key: np.asarray(uniques, dtype=object)[codes[has_keys][first_rows]]
+        for key, (codes, uniques) in zip(keys, key_codes)
+    })
+    for position, label in enumerate(CONFUSION_LABELS):
+        counts[label.lower()] = matrix[:, position].astype(np.int64)
+    if len(keys) > 1:
+        order = key_codes[0][0][has_keys][first_rows]
+        counts = counts.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+    counts['total'] = counts['tp'] + counts['fp'] + counts['fn'] + counts['tn']
+    return counts
+
+
+def _safe_ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Divisione elemento per elemento, 0.0 dove il denominatore è 0 (senza warning)."""
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+
+
+def _metrics_from_counts(counts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Versione vettoriale di _calculate_metrics_from_confusion su un DataFrame di conteggi.
+    
+    I calcoli avvengono su array NumPy: su poche decine di gruppi l'aritmetica tra
+    Series (allineamento degli indici, .where) costerebbe più delle operazioni stesse.
+    
+    Args:
+        counts: DataFrame con colonne 'tp', 'fp', 'fn', 'tn' e 'total'
+        
+    Returns:
+        DataFrame con colonne 'precision', 'recall', 'f1', 'accuracy' (0.0 dove non definite)
+    """
+    tp, fp, fn, tn, total = (counts[column].to_numpy(dtype=np.int64) for column in ('tp', 'fp', 'fn', 'tn', 'total'))
+    precision = _safe_ratio(tp, tp + fp)
+    recall = _safe_ratio(tp, tp + fn)
+    f1 = _safe_ratio(2 * (precision * recall), precision + recall)
+    accuracy = _safe_ratio(tp + tn, total)
+    return pd.DataFrame(
+        {'precision': precision, 'recall': recall, 'f1': f1, 'accuracy': accuracy},
+        index=counts.index
+    )
+
+
 def load_sample_data() -> pd.DataFrame:
     """
     Carica un dataset di esempio per dimostrazione con dati più realistici.
@@ -124,19 +287,24 @@ def load_sample_data() -> pd.DataFrame:
     customers = customers_base + np.random.poisson(10, n_samples)
     
     # Regioni con distribuzione non uniforme
+    region_names = ['Nord', 'Centro', 'Sud']
     region_weights = [0.4, 0.35, 0.25]  # Nord più popoloso
-    regions = np.random.choice(['Nord', 'Centro', 'Sud'], n_samples, p=region_weights)
-    
-    # Categorie prodotto con preferenze per regione
-    categories = []
-    for region in regions:
-        if region == 'Nord':
-            cat_probs = [0.5, 0.3, 0.2]  # Categoria A preferita
-        elif region == 'Centro':
-            cat_probs = [0.3, 0.4, 0.3]  # Categoria B preferita
-        else:
-            cat_probs = [0.2, 0.3, 0.5]  # Categoria C preferita
-        categories.append(np.random.choice(['A', 'B', 'C'], p=cat_probs))
+    region_idx = np.random.choice(len(region_names), n_samples, p=region_weights)
+    regions = np.array(region_names)[region_idx]
+    
+    # Categorie prodotto con preferenze per regione (righe nell'ordine di region_names)
+    cat_probs = np.array([
+        [0.5, 0.3, 0.2],  # Nord: categoria A preferita
+        [0.3, 0.4, 0.3],  # Centro: categoria B preferita
+        [0.2, 0.3, 0.5],  # Sud: categoria C preferita
+    ])
+    # Stessa estrazione di np.random.choice(p=...) per riga: un uniforme per campione
+    # confrontato con la distribuzione cumulata della sua regione
+    cat_cdf = cat_probs.cumsum(axis=1)
+    cat_cdf /= cat_cdf[:, -1:]
+    uniform = np.random.random_sample(n_samples)
+    cat_idx = (uniform[:, None] >= cat_cdf[region_idx]).sum(axis=1)
+    categories = np.array(['A', 'B', 'C'])[cat_idx]
     
     # Aggiungi metriche aggiuntive
     revenue = sales * (1 + np.random.normal(0, 0.1, n_samples))
@@ -161,17 +329,70 @@ def load_sample_data() -> pd.DataFrame:
     return pd.DataFrame(data)
 
 
-def load_csv_data(filepath: str) -> pd.DataFrame:
+def _load_csv_chunked(filepath: str, read_options: Dict, chunksize: int) -> pd.DataFrame:
     """
-    Carica dati da un file CSV.
+    Legge un CSV a blocchi, preparando ogni blocco appena letto.
+    
+    In memoria non convivono mai il file grezzo intero e la sua copia preparata: il
+    picco resta vicino alla dimensione del risultato finale.
     
     Args:
         filepath: Percorso al file CSV
+        read_options: Opzioni per read_csv (usecols, dtype)
+        chunksize: Righe per blocco
         
     Returns:
-        Dati caricati e preparati se necessario
+        DataFrame letto e preparato, uguale a quello della lettura in un colpo solo
+    """
+    is_lucy = 'lucy_data' in filepath.lower()
+    chunks = []
+    for chunk in pd.read_csv(filepath, chunksize=chunksize, **read_options):
+        if is_lucy or 'datetime_sent' in chunk.columns:
+            chunk = prepare_lucy_data(chunk)
+        chunks.append(chunk)
+    
+    if not chunks:
+        return pd.read_csv(filepath, **read_options)
+    
+    df = pd.concat(chunks, ignore_index=True)
+    # Blocchi con categorie diverse tornano object nella concatenazione: si ricostruiscono
+    categorical = set(CATEGORICAL_COLUMNS) | {column for column, kind in read_options['dtype'].items() if kind == 'category'}
+    for column in categorical:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
+
+
+@lru_cache(maxsize=8)
+def _load_csv_cached(filepath: str,
+                     signature: Tuple[int, int],
+                     usecols: Optional[Tuple[str, ...]],
+                     dtype: Tuple[Tuple[str, str], ...],
+                     chunksize: Optional[int] = None) -> pd.DataFrame:
+    """
+    Legge e prepara un CSV (memorizzato per file, stato del file e opzioni di lettura).
+    
+    Args:
+        filepath: Percorso al file CSV
+        signature: (mtime, dimensione) del file, invalida la cache se il file cambia
+        usecols: Colonne da leggere (None: tutte)
+        dtype: Coppie (colonna, tipo) da passare a read_csv
+        chunksize: Righe per blocco (None: lettura in un colpo solo)
+        
+    Returns:
+        DataFrame letto e preparato; non va modificato (è condiviso tra le chiamate)
     """
-    df = pd.read_csv(filepath)
+    read_options = {'usecols': list(usecols) if usecols is not None else None, 'dtype': dict(dtype)}
+    if chunksize:
+        return _load_csv_chunked(filepath, read_options, chunksize)
+    
+    if CSV_ENGINE == 'pyarrow':
+        try:
+            df = pd.read_csv(filepath, engine='pyarrow', **read_options)
+        except ImportError:
+            df = pd.read_csv(filepath, **read_options)
+    else:
+        df = pd.read_csv(filepath, **read_options)
     
     # Se è il dataset Lucy, prepara i dati
     if 'lucy_data' in filepath.lower() or 'datetime_sent' in df.columns:
@@ -180,6 +401,38 @@ def load_csv_data(filepath: str) -> pd.DataFrame:
     return df
 
 
+def load_csv_data(filepath: str,
+                  usecols: Optional[List[str]] = None,
+                  dtype: Optional[Dict[str, str]] = None,
+                  chunksize: Optional[int] = None) -> pd.DataFrame:
+    """
+    Carica dati da un file CSV.
+    
+    Le colonne Lucy a bassa cardinalità vengono lette direttamente come categorie
+    (LUCY_DTYPES; le colonne assenti nel file vengono ignorate). Lettura e preparazione
+    avvengono una sola volta finché il file non cambia; ogni chiamata riceve una copia.
+    
+    Args:
+        filepath: Percorso al file CSV
+        usecols: Colonne da leggere (default: tutte)
+        dtype: Tipi aggiuntivi per colonna, prevalgono su LUCY_DTYPES
+        chunksize: Se indicato, legge e prepara il file a blocchi di questo numero di righe
+            (riduce il picco di memoria su file molto grandi, stesso risultato)
+        
+    Returns:
+        Dati caricati e preparati se necessario
+    """
+    stat = os.stat(filepath)
+    df = _load_csv_cached(
+        filepath,
+        (stat.st_mtime_ns, stat.st_size),
+        tuple(usecols) if usecols is not None else None,
+        tuple({**LUCY_DTYPES, **(dtype or {})}.items()),
+        chunksize
+    )
+    return df.copy()
+
+
 def prepare_lucy_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Prepara i dati Lucy per l'analisi.
@@ -218,6 +471,35 @@ def categorize_method(method: str) -> str:
         return METHOD_TYPE_OTHER
 
 
+def _categorize_methods(methods: pd.Series) -> pd.Series:
+    """
+    Versione vettoriale di categorize_method per un'intera colonna.
+    
+    Args:
+        methods: Colonna method_pred
+        
+    Returns:
+        Serie con la categoria di ogni metodo (stesso indice di `methods`)
+    """
+    # Colonna categoriale: si classificano solo le categorie distinte e si espandono con i codici
+    if isinstance(methods.dtype, pd.CategoricalDtype):
+        # Il codice -1 (valore mancante) seleziona l'ultima etichetta, METHOD_TYPE_UNKNOWN
+        labels = np.append(_categorize_methods(pd.Series(methods.cat.categories)).to_numpy(), METHOD_TYPE_UNKNOWN)
+        return pd.Series(labels[methods.cat.codes.to_numpy()], index=methods.index, dtype=object)
+    
+    methods_lower = methods.astype('string').str.lower()
+    method_type = np.select(
+        [
+            methods.isna().to_numpy(),
+            methods_lower.str.contains('azure|model|ml', regex=True, na=False).to_numpy(dtype=bool),
+            methods_lower.str.contains('query', regex=False, na=False).to_numpy(dtype=bool)
+        ],
+        [METHOD_TYPE_UNKNOWN, METHOD_TYPE_ML, METHOD_TYPE_QUERY],
+        default=METHOD_TYPE_OTHER
+    )
+    return pd.Series(method_type, index=methods.index, dtype=object)
+
+
 def calculate_metrics_by_method(df: pd.DataFrame) -> pd.DataFrame:
     """
     Calcola metriche di performance per ogni metodo.
@@ -228,38 +510,32 @@ def calculate_metrics_by_method(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         Metriche per metodo (precision, recall, F1, accuracy)
     """
-    validated = df[df['is_validated']].copy() if 'is_validated' in df.columns else pd.DataFrame()
+    validated = df[df['is_validated']] if 'is_validated' in df.columns else pd.DataFrame()
     
     if len(validated) == 0:
         return pd.DataFrame()
     
-    metrics_list = []
-    
-    for method in validated['method_pred'].dropna().unique():
-        method_data = validated[validated['method_pred'] == method]
-        
-        # Conta TP, FP, FN, TN
-        tp = len(method_data[method_data['comparison'] == 'TP'])
-        fp = len(method_data[method_data['comparison'] == 'FP'])
-        fn = len(method_data[method_data['comparison'] == 'FN'])
-        tn = len(method_data[method_data['comparison'] == 'TN'])
-        
-        # Calcola metriche usando helper
-        metrics = _calculate_metrics_from_confusion(tp, fp, fn, tn)
-        
-        metrics_list.append({
-            'method': method,
-            'method_type': method_data['method_type'].iloc[0] if len(method_data) > 0 else METHOD_TYPE_UNKNOWN,
-            'total': tp + fp + fn + tn,
-            'tp': tp,
-            'fp': fp,
-            'fn': fn,
-            'tn': tn,
-            **metrics,
-            'avg_confidence': method_data['confidence'].mean() if 'confidence' in method_data.columns else None
-        })
+    counts = _confusion_counts(validated, ['method_pred'])
+    if len(counts) == 0:
+        return pd.DataFrame()
     
-    return pd.DataFrame(metrics_list)
+    # Tipo e confidence media per metodo, allineati ai conteggi per valore (non per posizione)
+    by_method = validated.groupby('method_pred', sort=False, observed=True)
+    methods = counts['method_pred']
+    metrics = pd.DataFrame({
+        'method': methods,
+        'method_type': by_method['method_type'].first().reindex(methods).to_numpy(),
+        'total': counts['total'],
+        'tp': counts['tp'],
+        'fp': counts['fp'],
+        'fn': counts['fn'],
+        'tn': counts['tn']
+    })
+    metrics = pd.concat([metrics, _metrics_from_counts(counts)], axis=1)
+    metrics['avg_confidence'] = (
+        by_method['confidence'].mean().reindex(methods).to_numpy() if 'confidence' in validated.columns else None
+    )
+    return metrics
 
 
 def get_field_names(df: pd.DataFrame) -> List[str]:
@@ -293,13 +569,14 @@ def filter_by_field_name(df: pd.DataFrame, field_name: str) -> pd.DataFrame:
     if 'field_name' not in df.columns:
         return df.copy()
     
-    filtered_df = df[df['field_name'] == field_name].copy()
+    filtered_df = df[df['field_name'] == field_name]
     
-    # Usa helper comune invece di duplicare logica
+    # Usa helper comune invece di duplicare logica. La selezione booleana crea già nuovi
+    # array: il risultato è indipendente da `df` anche se i chiamanti lo modificano
     if len(filtered_df) > 0:
-        filtered_df = _prepare_lucy_base(filtered_df)
+        return _prepare_lucy_base(filtered_df)
     
-    return filtered_df
+    return filtered_df.copy()
 
 
 def calculate_metrics_by_field_and_method(df: pd.DataFrame) -> pd.DataFrame:
@@ -315,53 +592,38 @@ def calculate_metrics_by_field_and_method(df: pd.DataFrame) -> pd.DataFrame:
     if 'field_name' not in df.columns:
         return pd.DataFrame()
     
-    validated = df[df['is_validated']].copy() if 'is_validated' in df.columns else pd.DataFrame()
+    validated = df[df['is_validated']] if 'is_validated' in df.columns else pd.DataFrame()
     
     if len(validated) == 0:
         return pd.DataFrame()
     
-    metrics_list = []
+    counts = _confusion_counts(validated, ['field_name', 'method_pred'])
+    counts = counts[counts['total'] > 0].reset_index(drop=True)
+    if len(counts) == 0:
+        return pd.DataFrame()
     
-    for field_name in validated['field_name'].dropna().unique():
-        field_data = validated[validated['field_name'] == field_name]
-        
-        for method in field_data['method_pred'].dropna().unique():
-            method_data = field_data[field_data['method_pred'] == method]
-            
-            # Conta TP, FP, FN, TN
-            tp = len(method_data[method_data['comparison'] == 'TP'])
-            fp = len(method_data[method_data['comparison'] == 'FP'])
-            fn = len(method_data[method_data['comparison'] == 'FN'])
-            tn = len(method_data[method_data['comparison'] == 'TN'])
-            
-            total = tp + fp + fn + tn
-            
-            if total > 0:
-                # Calcola metriche usando helper
-                metrics = _calculate_metrics_from_confusion(tp, fp, fn, tn)
-                
-                metrics_list.append({
-                    'field_name': field_name,
-                    'method': method,
-                    'total': total,
-                    'tp': tp,
-                    'fp': fp,
-                    'fn': fn,
-                    'tn': tn,
-                    **metrics
-                })
-    
-    return pd.DataFrame(metrics_list)
+    metrics = pd.DataFrame({
+        'field_name': counts['field_name'],
+        'method': counts['method_pred'],
+        'total': counts['total'],
+        'tp': counts['tp'],
+        'fp': counts['fp'],
+        'fn': counts['fn'],
+        'tn': counts['tn']
+    })
+    return pd.concat([metrics, _metrics_from_counts(counts)], axis=1)
 
 
 def prepare_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Prepara i dati per l'analisi (pulizia, trasformazioni base).
     
+    Non esegue trasformazioni e non copia: restituisce lo stesso DataFrame.
+    
     Args:
         df: DataFrame da preparare
         
     Returns:
         DataFrame preparato
     """
-    return df.copy()
+    return df
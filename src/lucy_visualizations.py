@@ -1,17 +1,23 @@
 """
 Modulo per visualizzazioni specifiche dei dati Lucy.
+
+matplotlib e seaborn vengono importati al primo grafico (vedi _ensure_mpl), così le
+celle del report che non disegnano non ne pagano il costo di import.
 """
-import matplotlib.pyplot as plt
-import seaborn as sns
+from __future__ import annotations
+
 import pandas as pd
 import numpy as np
-from typing import Optional, Tuple, List
-from matplotlib.figure import Figure
-from matplotlib.axes import Axes
+import weakref
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple, List
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+    from matplotlib.axes import Axes
 
-# Configurazione stile
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (10, 6)
+# Moduli grafici, impostati da _ensure_mpl al primo utilizzo
+plt = None
+sns = None
 
 # Costanti dimensioni figure
 DEFAULT_FIGSIZE = (10, 6)
@@ -25,6 +31,42 @@ BAR_ALPHA = 0.8
 GRID_ALPHA = 0.3
 BAR_WIDTH = 0.2
 Y_LIM_MAX = 1.1
+# Etichette dei valori sulle barre orizzontali: distanza dalla barra (frazione del valore
+# massimo) e numero massimo di barre oltre il quale non vengono disegnate
+BAR_LABEL_OFFSET = 0.01
+MAX_BAR_LABELS = 50
+# Barre mostrate nei grafici di distribuzione; le altre categorie confluiscono in OTHER_LABEL
+DEFAULT_TOP_N = 30
+OTHER_LABEL = 'Altro'
+
+# Soglie heatmap: oltre questo numero di celle niente annotazioni (un testo per cella)
+# e si escludono i country con meno di HEATMAP_MIN_SUPPORT record validati
+HEATMAP_MAX_ANNOTATED_CELLS = 400
+HEATMAP_MIN_SUPPORT = 10
+
+# Esiti della matrice di confusione
+CONFUSION_LABELS = ['TP', 'FP', 'FN', 'TN']
+CONFUSION_CACHE_SIZE = 8
+
+# Conteggi per metodo già calcolati: chiave (id, shape) -> (weakref al DataFrame, conteggi)
+_confusion_cache: Dict[Tuple[Any, ...], Tuple[Any, pd.DataFrame]] = {}
+
+
+def _ensure_mpl() -> None:
+    """
+    Importa matplotlib e seaborn (una sola volta) e applica lo stile dei grafici.
+    """
+    global plt, sns
+    if plt is not None:
+        return
+    import matplotlib.pyplot as pyplot
+    import seaborn
+    
+    # Configurazione stile
+    seaborn.set_style("whitegrid")
+    pyplot.rcParams['figure.figsize'] = (10, 6)
+    sns = seaborn
+    plt = pyplot
 
 
 def _setup_figure(
@@ -83,6 +125,45 @@ def _plot_metrics_bars(
             ax.bar(x + offset, metrics_data[metric], width, label=label, alpha=BAR_ALPHA)
 
 
+def _top_counts(counts: pd.Series, top_n: int) -> pd.Series:
+    """
+    Limita dei conteggi ai `top_n` valori più frequenti, sommando il resto in OTHER_LABEL.
+    
+    Args:
+        counts: Conteggi per categoria
+        top_n: Numero massimo di categorie mostrate singolarmente
+        
+    Returns:
+        Conteggi in ordine decrescente, con indice di stringhe semplici
+    """
+    # Le categorie inutilizzate di un sottoinsieme (colonne categoriali) hanno conteggio 0
+    counts = counts[counts > 0]
+    top = counts.nlargest(top_n)
+    top.index = top.index.astype(object)
+    if len(counts) > top_n:
+        top[OTHER_LABEL] = counts.sum() - top.sum()
+    return top
+
+
+def _label_barh_values(ax: Axes, values: np.ndarray) -> None:
+    """
+    Scrive il valore accanto a ogni barra orizzontale.
+    
+    La distanza dalla barra è proporzionale al valore massimo, così resta leggibile sia
+    con conteggi piccoli sia con conteggi grandi. Oltre MAX_BAR_LABELS barre le etichette
+    non vengono disegnate (sarebbero illeggibili).
+    
+    Args:
+        ax: Axes con le barre
+        values: Valori delle barre, nell'ordine in cui sono disegnate
+    """
+    if len(values) == 0 or len(values) > MAX_BAR_LABELS:
+        return
+    offset = values.max() * BAR_LABEL_OFFSET
+    for i, v in enumerate(values):
+        ax.text(v + offset, i, str(v), va='center', fontsize=9)
+
+
 def plot_metrics_by_method(metrics_df: pd.DataFrame, figsize: Optional[Tuple[float, float]] = None) -> Figure:
     """
     Crea un grafico a barre delle metriche per metodo.
@@ -94,6 +175,8 @@ def plot_metrics_by_method(metrics_df: pd.DataFrame, figsize: Optional[Tuple[flo
     Returns:
         Figura del grafico
     """
+    _ensure_mpl()
+    
     if figsize is None:
         figsize = METRICS_FIGSIZE
     
@@ -116,14 +199,68 @@ def plot_metrics_by_method(metrics_df: pd.DataFrame, figsize: Optional[Tuple[flo
     ax.legend()
     ax.set_ylim([0, Y_LIM_MAX])
     
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
 
+def compute_confusion_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Conta TP, FP, FN, TN dei record validati per ogni metodo in un'unica passata.
+    
+    Il risultato può essere calcolato una volta per DataFrame e passato a ogni chiamata
+    di plot_confusion_matrix_by_method.
+    
+    Args:
+        df: DataFrame con dati validati
+        
+    Returns:
+        DataFrame indicizzato per metodo con le colonne 'TP', 'FP', 'FN', 'TN'
+        (i metodi senza record validati non compaiono)
+    """
+    # Un metodo con soli record senza esito compare con tutte le celle a zero;
+    # i record senza metodo non appartengono a nessuna matrice
+    validated = df[df['is_validated'] & df['method_pred'].notna()]
+    return (
+        validated.groupby(['method_pred', 'comparison'], observed=True, dropna=False)
+        .size()
+        .unstack(fill_value=0)
+        .reindex(columns=CONFUSION_LABELS, fill_value=0)
+    )
+
+
+def _cached_confusion_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Restituisce i conteggi per metodo di un DataFrame, calcolandoli una sola volta.
+    
+    Le chiamate successive sullo stesso DataFrame (es. una matrice per ogni metodo)
+    riusano il risultato. Un riferimento debole verifica che l'oggetto sia ancora lo
+    stesso; il DataFrame non deve essere modificato in-place tra due chiamate. Oltre
+    CONFUSION_CACHE_SIZE voci vengono eliminate le più vecchie (FIFO).
+    
+    Args:
+        df: DataFrame con dati validati
+        
+    Returns:
+        Conteggi come da compute_confusion_counts
+    """
+    key = (id(df), df.shape)
+    entry = _confusion_cache.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    
+    counts = compute_confusion_counts(df)
+    _confusion_cache.pop(key, None)
+    _confusion_cache[key] = (weakref.ref(df), counts)
+    while len(_confusion_cache) > CONFUSION_CACHE_SIZE:
+        del _confusion_cache[next(iter(_confusion_cache))]
+    return counts
+
+
 def plot_confusion_matrix_by_method(
     df: pd.DataFrame,
     method: str,
-    figsize: Optional[Tuple[float, float]] = None
+    figsize: Optional[Tuple[float, float]] = None,
+    counts: Optional[pd.DataFrame] = None
 ) -> Figure:
     """
     Crea una matrice di confusione per un metodo specifico.
@@ -132,28 +269,28 @@ def plot_confusion_matrix_by_method(
         df: DataFrame con dati validati
         method: Nome del metodo
         figsize: Tuple (width, height) per le dimensioni
+        counts: Conteggi per metodo da compute_confusion_counts (se None, calcolati da df
+            e riusati per le chiamate successive sullo stesso DataFrame)
         
     Returns:
         Figura del grafico
     """
+    _ensure_mpl()
+    
     if figsize is None:
         figsize = CONFUSION_FIGSIZE
     
-    method_data = df[(df['method_pred'] == method) & (df['is_validated'])]
+    if counts is None:
+        counts = _cached_confusion_counts(df)
     
-    if len(method_data) == 0:
+    if method not in counts.index:
         fig, ax = plt.subplots(figsize=figsize)
         ax.text(0.5, 0.5, 'Nessun dato disponibile', ha='center', va='center')
         return fig
     
-    # Conta TP, FP, FN, TN
-    tp = len(method_data[method_data['comparison'] == 'TP'])
-    fp = len(method_data[method_data['comparison'] == 'FP'])
-    fn = len(method_data[method_data['comparison'] == 'FN'])
-    tn = len(method_data[method_data['comparison'] == 'TN'])
-    
     # Crea matrice di confusione
-    cm = np.array([[tn, fp], [fn, tp]])
+    row = counts.loc[method]
+    cm = np.array([[row['TN'], row['FP']], [row['FN'], row['TP']]], dtype=int)
     
     fig, ax = plt.subplots(figsize=figsize)
     sns.heatmap(
@@ -165,7 +302,7 @@ def plot_confusion_matrix_by_method(
     ax.set_xlabel('Predetto', fontsize=11)
     ax.set_ylabel('Reale', fontsize=11)
     ax.set_title(f'Matrice di Confusione: {method}', fontsize=12, fontweight='bold')
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
 
@@ -183,6 +320,8 @@ def plot_confidence_distribution(
     Returns:
         Figura del grafico
     """
+    _ensure_mpl()
+    
     if figsize is None:
         figsize = METRICS_FIGSIZE
     
@@ -194,15 +333,14 @@ def plot_confidence_distribution(
     )
     
     # Filtra solo record con confidence
-    df_with_conf = df[df['confidence'].notna()].copy()
+    df_with_conf = df[df['confidence'].notna()]
     
     if len(df_with_conf) > 0:
-        # Box plot per metodo
-        methods = df_with_conf['method_pred'].dropna().unique()
-        data_to_plot = [
-            df_with_conf[df_with_conf['method_pred'] == m]['confidence'].values 
-            for m in methods
-        ]
+        # Box plot per metodo: un solo raggruppamento, metodi in ordine di prima apparizione
+        methods, data_to_plot = [], []
+        for method, values in df_with_conf.groupby('method_pred', sort=False, observed=True)['confidence']:
+            methods.append(method)
+            data_to_plot.append(values.to_numpy())
         
         bp = ax.boxplot(data_to_plot, labels=methods, patch_artist=True)
         
@@ -211,9 +349,13 @@ def plot_confidence_distribution(
         for patch, color in zip(bp['boxes'], colors):
             patch.set_facecolor(color)
         
-        plt.xticks(rotation=45, ha='right')
+        # Gli outlier possono essere migliaia di marker: nei PDF/SVG vanno come immagine
+        for fliers in bp['fliers']:
+            fliers.set_rasterized(True)
+        
+        plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
     
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
 
@@ -231,12 +373,17 @@ def plot_timeline_predictions(
     Returns:
         Figura del grafico
     """
+    _ensure_mpl()
+    
     if figsize is None:
         figsize = TIMELINE_FIGSIZE
     
-    # Raggruppa per data e metodo
-    daily_counts = df.groupby([df['datetime_sent'].dt.date, 'method_pred']).size().reset_index(name='count')
-    daily_counts['date'] = pd.to_datetime(daily_counts['datetime_sent'])
+    # Raggruppa per giorno (datetime64 a mezzanotte, senza fuso) e metodo; l'ordinamento
+    # resta attivo perché le linee vanno tracciate in ordine di data
+    day = df['datetime_sent'].dt.floor('D')
+    if day.dt.tz is not None:
+        day = day.dt.tz_localize(None)
+    daily_counts = df.groupby([day.rename('date'), 'method_pred'], observed=True).size().reset_index(name='count')
     
     fig, ax = _setup_figure(
         figsize,
@@ -246,70 +393,77 @@ def plot_timeline_predictions(
         grid_axis='both'
     )
     
-    # Plot per ogni metodo
+    # Una colonna per metodo (in ordine di prima apparizione, come i colori della legenda)
+    # e un solo ax.plot per tutte le serie; nei giorni senza predizioni il conteggio è 0
     methods = daily_counts['method_pred'].dropna().unique()
-    for method in methods:
-        method_data = daily_counts[daily_counts['method_pred'] == method]
-        ax.plot(method_data['date'], method_data['count'], marker='o', label=method, linewidth=2)
-    
-    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
+    timeline = (
+        daily_counts.pivot(index='date', columns='method_pred', values='count')
+        .reindex(columns=methods)
+        .fillna(0)
+    )
+    if len(methods) > 0:
+        lines = ax.plot(timeline.index, timeline.to_numpy(), marker='o', linewidth=2)
+        ax.legend(lines, [str(method) for method in methods], bbox_to_anchor=(1.05, 1), loc='upper left')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    fig.tight_layout()
     return fig
 
 
 def plot_accuracy_heatmap(
     df: pd.DataFrame,
-    figsize: Optional[Tuple[float, float]] = None
+    figsize: Optional[Tuple[float, float]] = None,
+    min_support: int = HEATMAP_MIN_SUPPORT
 ) -> Figure:
     """
     Crea una heatmap dell'accuratezza per country e metodo.
     
+    Le heatmap con più di HEATMAP_MAX_ANNOTATED_CELLS celle escludono i country con
+    meno di `min_support` record validati e, se restano grandi, non mostrano i valori.
+    
     Args:
         df: DataFrame con dati validati
         figsize: Tuple (width, height) per le dimensioni
+        min_support: Record validati minimi per country nelle heatmap grandi
         
     Returns:
         Figura del grafico
     """
+    _ensure_mpl()
+    
     if figsize is None:
         figsize = HEATMAP_FIGSIZE
     
-    validated = df[df['is_validated']].copy() if 'is_validated' in df.columns else pd.DataFrame()
+    validated = df[df['is_validated']] if 'is_validated' in df.columns else pd.DataFrame()
     
     if len(validated) == 0:
         fig, ax = plt.subplots(figsize=figsize)
         ax.text(0.5, 0.5, 'Nessun dato validato disponibile', ha='center', va='center', fontsize=14)
         return fig
     
-    # Calcola accuracy per country e metodo
-    accuracy_data = []
-    for country in validated['country'].dropna().unique():
-        for method in validated['method_pred'].dropna().unique():
-            subset = validated[(validated['country'] == country) & 
-                              (validated['method_pred'] == method)]
-            if len(subset) > 0:
-                correct = len(subset[subset['comparison'] == 'TP'])
-                total = len(subset)
-                accuracy = correct / total if total > 0 else 0
-                accuracy_data.append({
-                    'country': country,
-                    'method': method,
-                    'accuracy': accuracy,
-                    'count': total
-                })
-    
-    if len(accuracy_data) == 0:
+    # Calcola accuracy per country e metodo: quota di TP per ogni coppia presente nei dati
+    by_country_method = validated['comparison'].eq('TP').groupby(
+        [validated['country'], validated['method_pred'].rename('method')], observed=True
+    )
+    accuracy = by_country_method.mean()
+    
+    if len(accuracy) == 0:
         fig, ax = plt.subplots(figsize=figsize)
         ax.text(0.5, 0.5, 'Dati insufficienti per heatmap', ha='center', va='center', fontsize=14)
         return fig
     
-    accuracy_df = pd.DataFrame(accuracy_data)
-    pivot_table = accuracy_df.pivot(index='country', columns='method', values='accuracy')
+    pivot_table = accuracy.unstack('method')
+    if pivot_table.size > HEATMAP_MAX_ANNOTATED_CELLS:
+        support = by_country_method.size().groupby(level='country', observed=True).sum()
+        supported = support.index[support >= min_support]
+        if len(supported) > 0:
+            pivot_table = pivot_table[pivot_table.index.isin(supported)]
+    # Etichette come stringhe semplici anche se le colonne sono categoriali
+    pivot_table.index = pivot_table.index.astype(object)
+    pivot_table.columns = pivot_table.columns.astype(object)
     
     fig, ax = plt.subplots(figsize=figsize)
     sns.heatmap(
-        pivot_table, annot=True, fmt='.2f', cmap='RdYlGn', center=0.5,
+        pivot_table, annot=pivot_table.size <= HEATMAP_MAX_ANNOTATED_CELLS, fmt='.2f', cmap='RdYlGn', center=0.5,
         vmin=0, vmax=1, ax=ax, cbar_kws={"shrink": 0.8},
         annot_kws={'size': 12, 'weight': 'bold'}
     )
@@ -318,7 +472,7 @@ def plot_accuracy_heatmap(
     ax.set_title('Accuracy per Country e Metodo', fontsize=16, fontweight='bold')
     plt.xticks(rotation=45, ha='right', fontsize=12)
     plt.yticks(fontsize=12)
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
 
@@ -336,11 +490,13 @@ def plot_ml_vs_query_comparison(
     Returns:
         Figura del grafico
     """
+    _ensure_mpl()
+    
     if figsize is None:
         figsize = DEFAULT_FIGSIZE
     
     # Raggruppa per tipo di metodo
-    type_metrics = metrics_df.groupby('method_type').agg({
+    type_metrics = metrics_df.groupby('method_type', observed=True).agg({
         'precision': 'mean',
         'recall': 'mean',
         'f1': 'mean',
@@ -365,13 +521,14 @@ def plot_ml_vs_query_comparison(
     ax.legend()
     ax.set_ylim([0, Y_LIM_MAX])
     
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
 
 def plot_method_usage(
     df: pd.DataFrame,
-    figsize: Optional[Tuple[float, float]] = None
+    figsize: Optional[Tuple[float, float]] = None,
+    top_n: int = DEFAULT_TOP_N
 ) -> Figure:
     """
     Mostra la distribuzione dell'uso dei metodi.
@@ -379,14 +536,17 @@ def plot_method_usage(
     Args:
         df: DataFrame con dati
         figsize: Tuple (width, height) per le dimensioni
+        top_n: Metodi mostrati singolarmente (gli altri sono sommati in una barra)
         
     Returns:
         Figura del grafico
     """
+    _ensure_mpl()
+    
     if figsize is None:
         figsize = DEFAULT_FIGSIZE
     
-    method_counts = df['method_pred'].value_counts()
+    method_counts = _top_counts(df['method_pred'].value_counts(), top_n)
     
     fig, ax = _setup_figure(
         figsize,
@@ -397,12 +557,9 @@ def plot_method_usage(
     )
     
     ax.barh(method_counts.index, method_counts.values, color='steelblue', alpha=BAR_ALPHA)
+    _label_barh_values(ax, method_counts.values)
     
-    # Aggiungi valori sulle barre
-    for i, v in enumerate(method_counts.values):
-        ax.text(v + 100, i, str(v), va='center', fontsize=9)
-    
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
 
@@ -420,6 +577,8 @@ def plot_metrics_by_field_name(
     Returns:
         Figura del grafico
     """
+    _ensure_mpl()
+    
     if figsize is None:
         figsize = METRICS_FIGSIZE
     
@@ -429,7 +588,7 @@ def plot_metrics_by_field_name(
         return fig
     
     # Aggrega per field_name
-    field_metrics = metrics_df.groupby('field_name').agg({
+    field_metrics = metrics_df.groupby('field_name', observed=True).agg({
         'precision': 'mean',
         'recall': 'mean',
         'f1': 'mean',
@@ -454,13 +613,14 @@ def plot_metrics_by_field_name(
     ax.legend()
     ax.set_ylim([0, Y_LIM_MAX])
     
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
 
 def plot_field_name_distribution(
     df: pd.DataFrame,
-    figsize: Optional[Tuple[float, float]] = None
+    figsize: Optional[Tuple[float, float]] = None,
+    top_n: int = DEFAULT_TOP_N
 ) -> Figure:
     """
     Crea un grafico della distribuzione dei field_name.
@@ -468,10 +628,13 @@ def plot_field_name_distribution(
     Args:
         df: DataFrame con dati
         figsize: Tuple (width, height) per le dimensioni
+        top_n: Campi mostrati singolarmente (gli altri sono sommati in una barra)
         
     Returns:
         Figura del grafico
     """
+    _ensure_mpl()
+    
     if figsize is None:
         figsize = DEFAULT_FIGSIZE
     
@@ -480,7 +643,7 @@ def plot_field_name_distribution(
         ax.text(0.5, 0.5, 'Colonna field_name non presente', ha='center', va='center')
         return fig
     
-    field_counts = df['field_name'].value_counts()
+    field_counts = _top_counts(df['field_name'].value_counts(), top_n)
     
     fig, ax = _setup_figure(
         figsize,
@@ -491,10 +654,7 @@ def plot_field_name_distribution(
     )
     
     ax.barh(field_counts.index, field_counts.values, color='steelblue', alpha=BAR_ALPHA)
+    _label_barh_values(ax, field_counts.values)
     
-    # Aggiungi valori sulle barre
-    for i, v in enumerate(field_counts.values):
-        ax.text(v + max(field_counts.values) * 0.01, i, str(v), va='center', fontsize=9)
-    
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
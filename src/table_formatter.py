@@ -1,13 +1,43 @@
 """
 Modulo per formattare tabelle per Quarto.
 """
+import hashlib
+import numbers
 import pandas as pd
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, Tuple, Union
 from IPython.display import Markdown, display
 
 # Costanti
 DEFAULT_DIGITS = 3
 EMPTY_DATA_MESSAGE = "*Nessun dato disponibile*"
+MARKDOWN_CACHE_SIZE = 128
+MAX_CACHED_TABLE_CELLS = 50_000
+SUMMARY_HEADERS = ('Metrica', 'Valore')
+
+# Tabelle markdown già generate: chiave (hash del contenuto, colonne, dtype, cifre) -> testo
+_markdown_cache: Dict[Tuple[Any, ...], str] = {}
+
+
+def _markdown_key(df: pd.DataFrame, digits: int) -> Optional[Tuple[Any, ...]]:
+    """
+    Calcola la chiave di cache di una tabella a partire dal suo contenuto.
+    
+    Args:
+        df: DataFrame da formattare
+        digits: Numero di cifre decimali
+        
+    Returns:
+        Chiave della tabella, o None se la tabella è troppo grande o contiene valori
+        non hashabili (in quel caso non viene messa in cache)
+    """
+    if df.size > MAX_CACHED_TABLE_CELLS:
+        return None
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    except TypeError:
+        return None
+    content = hashlib.sha1(row_hashes.tobytes()).hexdigest()
+    return (content, tuple(df.columns), tuple(str(dtype) for dtype in df.dtypes), digits)
 
 
 def format_table(
@@ -31,14 +61,26 @@ def format_table(
     if df is None or len(df) == 0:
         return EMPTY_DATA_MESSAGE if return_string else Markdown(EMPTY_DATA_MESSAGE)
     
-    # Arrotonda valori numerici
-    df_formatted = df.copy()
-    numeric_cols = df_formatted.select_dtypes(include=['float64', 'float32']).columns
-    for col in numeric_cols:
-        df_formatted[col] = df_formatted[col].round(digits)
+    # La stessa tabella formattata più volte nel report viene generata una sola volta
+    key = _markdown_key(df, digits)
+    markdown_str = _markdown_cache.get(key) if key is not None else None
     
-    # Converti in markdown
-    markdown_str = df_formatted.to_markdown(index=False)
+    if markdown_str is None:
+        # Arrotonda valori numerici (nessuna copia se non ci sono colonne float)
+        numeric_cols = df.select_dtypes(include=['float64', 'float32']).columns
+        df_formatted = df
+        if len(numeric_cols) > 0:
+            # Copia superficiale: le colonne arrotondate sostituiscono quelle originali senza modificarle
+            df_formatted = df.copy(deep=False)
+            for col in numeric_cols:
+                df_formatted[col] = df[col].round(digits)
+        
+        # Converti in markdown
+        markdown_str = df_formatted.to_markdown(index=False)
+        if key is not None:
+            _markdown_cache[key] = markdown_str
+            while len(_markdown_cache) > MARKDOWN_CACHE_SIZE:
+                del _markdown_cache[next(iter(_markdown_cache))]
     
     if caption:
         markdown_str = f"**{caption}**\n\n{markdown_str}"
@@ -46,6 +88,25 @@ def format_table(
     return markdown_str if return_string else Markdown(markdown_str)
 
 
+def _is_number(value: Any) -> bool:
+    """
+    Verifica se un valore (anche testuale, es. "1,234") rappresenta un numero.
+    
+    Args:
+        value: Valore da verificare
+        
+    Returns:
+        True se il valore è numerico
+    """
+    if isinstance(value, numbers.Number):
+        return True
+    try:
+        float(str(value).replace(',', ''))
+    except ValueError:
+        return False
+    return True
+
+
 def format_summary_dict(
     data_dict: Dict[str, Any],
     title: Optional[str] = None,
@@ -62,8 +123,32 @@ def format_summary_dict(
     Returns:
         Markdown object o stringa da visualizzare
     """
-    df = pd.DataFrame(list(data_dict.items()), columns=['Metrica', 'Valore'])
-    return format_table(df, caption=title, return_string=return_string)
+    if not data_dict:
+        return EMPTY_DATA_MESSAGE if return_string else Markdown(EMPTY_DATA_MESSAGE)
+    
+    # Poche righe: la tabella pipe viene scritta direttamente, senza DataFrame né tabulate
+    rows = [
+        (str(key), str(round(value, DEFAULT_DIGITS)) if isinstance(value, float) else str(value))
+        for key, value in data_dict.items()
+    ]
+    key_width = max(len(SUMMARY_HEADERS[0]), *(len(key) for key, _ in rows))
+    value_width = max(len(SUMMARY_HEADERS[1]), *(len(value) for _, value in rows))
+    # Come in format_table, i valori tutti numerici sono allineati a destra
+    right_align = all(_is_number(value) for _, value in rows if value != '')
+    align_value = str.rjust if right_align else str.ljust
+    value_rule = '-' * (value_width + 1) + ':' if right_align else ':' + '-' * (value_width + 1)
+    
+    lines = [
+        f"| {SUMMARY_HEADERS[0].ljust(key_width)} | {align_value(SUMMARY_HEADERS[1], value_width)} |",
+        f"|:{'-' * (key_width + 1)}|{value_rule}|"
+    ]
+    lines.extend(f"| {key.ljust(key_width)} | {align_value(value, value_width)} |" for key, value in rows)
+    markdown_str = "\n".join(lines)
+    
+    if title:
+        markdown_str = f"**{title}**\n\n{markdown_str}"
+    
+    return markdown_str if return_string else Markdown(markdown_str)
 
 
 def display_table(